@@ -0,0 +1,329 @@
+'''
+访问记录异步批量写入 2026.10
+- 请求开始时只在内存中登记，请求结束时一次写入完整记录(不再 INSERT 后再按 request_id UPDATE)
+- 请求钩子只把访问记录放入有界队列，立即返回
+- 单独的写线程按条数或时间间隔批量写库，一个事务内 executemany
+- 队列满时按策略丢弃(drop_new 丢弃新记录 / drop_oldest 丢弃最旧记录)
+- 统计入队、写入、丢弃数量，程序退出时把剩余记录写完
+- 写入时在同一事务内增量更新按小时/按天的汇总表，访问统计接口只查汇总表
+- 路径和 User-Agent 保存为字典表ID，写线程用 LRU 缓存 文本 -> ID，命中时不需要额外查询
+'''
+import queue
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from dbconn import get_connection, release_connection, transaction
+
+logger = logging.getLogger('FishTankMonitor')
+
+_STOP = object()
+
+# 记录中各字段的位置
+_IP = 1
+_PATH = 2
+_USER_AGENT = 4
+_START_TIME = 5
+
+
+class DictionaryCache:
+    """
+    字典表（access_paths / access_user_agents）的 文本 -> ID 缓存，按最近使用淘汰
+    只在访问记录写线程中使用，不加锁
+    """
+    def __init__(self, table, column, max_size=1024):
+        self.table = table
+        self.column = column
+        self.max_size = max(1, int(max_size))
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, conn, value, pending):
+        """
+        获取文本的ID，缓存中没有时查询，字典表中也没有时插入
+        事务内新查到的ID先放在 pending 中，事务提交后再用 commit() 放入缓存，
+        事务回滚时新插入的ID作废，不会进入缓存
+        """
+        if value is None:
+            return None
+        value_id = self._cache.get(value)
+        if value_id is not None:
+            self._cache.move_to_end(value)
+            self.hits += 1
+            return value_id
+        value_id = pending.get(value)
+        if value_id is not None:
+            return value_id
+        self.misses += 1
+        row = conn.execute(f'SELECT id FROM {self.table} WHERE {self.column} = ?', (value,)).fetchone()
+        if row is None:
+            value_id = conn.execute(f'INSERT INTO {self.table} ({self.column}) VALUES (?)', (value,)).lastrowid
+        else:
+            value_id = row[0]
+        pending[value] = value_id
+        return value_id
+
+    def commit(self, pending):
+        for value, value_id in pending.items():
+            self._cache[value] = value_id
+            self._cache.move_to_end(value)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+def hour_bucket(ts):
+    """时间戳所在的本地整点时间戳"""
+    lt = time.localtime(ts)
+    return int(ts) - lt.tm_min * 60 - lt.tm_sec
+
+
+def day_bucket(ts):
+    """时间戳所在的本地日期 YYYY-MM-DD"""
+    return time.strftime('%Y-%m-%d', time.localtime(ts))
+
+
+def update_rollups(conn, records):
+    """
+    按小时和按天累加请求数及每个IP的访问次数
+    :param records: 与 access_records 插入顺序一致的记录元组
+    """
+    hourly, daily = {}, {}
+    ip_hourly, ip_daily = {}, {}
+    for record in records:
+        ip, start_time = record[_IP], record[_START_TIME]
+        hour, day = hour_bucket(start_time), day_bucket(start_time)
+        hourly[hour] = hourly.get(hour, 0) + 1
+        daily[day] = daily.get(day, 0) + 1
+        for table, key in ((ip_hourly, (hour, ip)), (ip_daily, (day, ip))):
+            count, last = table.get(key, (0, start_time))
+            table[key] = (count + 1, max(last, start_time))
+
+    conn.executemany('''
+        INSERT INTO access_rollup_hourly (bucket, requests) VALUES (?, ?)
+        ON CONFLICT(bucket) DO UPDATE SET requests = requests + excluded.requests
+    ''', hourly.items())
+    conn.executemany('''
+        INSERT INTO access_rollup_daily (bucket, requests) VALUES (?, ?)
+        ON CONFLICT(bucket) DO UPDATE SET requests = requests + excluded.requests
+    ''', daily.items())
+    conn.executemany('''
+        INSERT INTO access_ip_hourly (bucket, ip_address, requests, last_visit) VALUES (?, ?, ?, ?)
+        ON CONFLICT(bucket, ip_address) DO UPDATE SET
+            requests = requests + excluded.requests,
+            last_visit = MAX(last_visit, excluded.last_visit)
+    ''', [(b, ip, n, last) for (b, ip), (n, last) in ip_hourly.items()])
+    conn.executemany('''
+        INSERT INTO access_ip_daily (bucket, ip_address, requests, last_visit) VALUES (?, ?, ?, ?)
+        ON CONFLICT(bucket, ip_address) DO UPDATE SET
+            requests = requests + excluded.requests,
+            last_visit = MAX(last_visit, excluded.last_visit)
+    ''', [(b, ip, n, last) for (b, ip), (n, last) in ip_daily.items()])
+
+
+def rebuild_rollups(conn, chunk_size=5000):
+    """
+    根据 access_records 重建汇总表，用于首次启用或数据修复
+    先在一个事务内清空汇总表并记下当前最大ID，之后分块累加，
+    写线程同时写入的新记录（ID更大）由写线程自己累加，不会重复或遗漏
+    :return: 处理的记录数
+    """
+    with transaction(conn):
+        conn.execute('DELETE FROM access_rollup_hourly')
+        conn.execute('DELETE FROM access_rollup_daily')
+        conn.execute('DELETE FROM access_ip_hourly')
+        conn.execute('DELETE FROM access_ip_daily')
+        max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM access_records').fetchone()[0]
+
+    last_id = 0
+    total = 0
+    while last_id < max_id:
+        rows = conn.execute('''
+            SELECT id, ip_address, start_time FROM access_records
+            WHERE id > ? AND id <= ? AND end_time IS NOT NULL
+            ORDER BY id LIMIT ?
+        ''', (last_id, max_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        # 转换成与写入记录相同的字段位置
+        records = [(None, ip, None, None, None, start_time) for _, ip, start_time in rows]
+        with transaction(conn):
+            update_rollups(conn, records)
+        total += len(rows)
+    return total
+
+
+class AccessLogger:
+    def __init__(self, database_path, batch_size=50, flush_interval=2.0,
+                 max_queue=2000, overflow='drop_new', max_inflight=1000, cache_size=1024):
+        """
+        :param database_path: 数据库路径
+        :param batch_size: 累计多少条记录写一次库
+        :param flush_interval: 最长多少秒写一次库
+        :param max_queue: 队列最大长度
+        :param overflow: 队列满时的策略 drop_new / drop_oldest
+        :param max_inflight: 内存中最多登记多少个未完成的请求
+        :param cache_size: 路径 / User-Agent 的ID缓存条数
+        """
+        self.database_path = database_path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.05, float(flush_interval))
+        self.overflow = overflow
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        # 未完成的请求 request_id -> (ip, path, method, user_agent, start_time)
+        self.max_inflight = max(1, int(max_inflight))
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._paths = DictionaryCache('access_paths', 'path', cache_size)
+        self._user_agents = DictionaryCache('access_user_agents', 'user_agent', cache_size)
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'queued': 0,     # 成功入队
+            'flushed': 0,    # 已写入数据库
+            'dropped': 0,    # 队列满被丢弃
+            'failed': 0,     # 写库失败丢失
+            'abandoned': 0,  # 未完成请求超出上限被丢弃
+            'batches': 0     # 写库批次
+        }
+
+    def _count(self, key, num=1):
+        with self._stats_lock:
+            self._stats[key] += num
+
+    def start(self):
+        """启动写线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='AccessLogWriter', daemon=True)
+        self._thread.start()
+        logger.info(f"访问记录写线程已启动: 批量{self.batch_size}条/{self.flush_interval}秒")
+
+    def begin(self, request_id, ip_address, path, method, user_agent, start_time):
+        """登记请求开始，只保存在内存中"""
+        with self._inflight_lock:
+            if len(self._inflight) >= self.max_inflight:
+                # 丢弃最早登记的请求（dict 保持插入顺序）
+                self._inflight.pop(next(iter(self._inflight)))
+                self._count('abandoned')
+            self._inflight[request_id] = (ip_address, path, method, user_agent, start_time)
+
+    def finish(self, request_id, end_time, status_code):
+        """请求结束，生成完整记录放入写入队列"""
+        with self._inflight_lock:
+            started = self._inflight.pop(request_id, None)
+        if started is None:
+            return False
+        ip_address, path, method, user_agent, start_time = started
+        self._put((request_id, ip_address, path, method, user_agent,
+                   start_time, end_time, end_time - start_time, status_code))
+        return True
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow == 'drop_oldest':
+                try:
+                    self._queue.get_nowait()
+                    self._count('dropped')
+                    self._queue.put_nowait(item)
+                except (queue.Empty, queue.Full):
+                    self._count('dropped')
+                    return
+            else:
+                self._count('dropped')
+                return
+        self._count('queued')
+
+    def _run(self):
+        conn = get_connection(self.database_path)
+        try:
+            while True:
+                batch = []
+                stopping = False
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                if stopping:
+                    # 退出前把队列中剩余的记录取完
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is not _STOP:
+                            batch.append(item)
+
+                if batch:
+                    self._flush(conn, batch)
+                if stopping:
+                    return
+        finally:
+            release_connection(self.database_path)
+
+    def _flush(self, conn, batch):
+        """一个事务内批量写入"""
+        new_paths, new_agents = {}, {}
+        try:
+            with transaction(conn):
+                rows = []
+                for record in batch:
+                    row = list(record)
+                    row[_PATH] = self._paths.resolve(conn, record[_PATH], new_paths)
+                    row[_USER_AGENT] = self._user_agents.resolve(conn, record[_USER_AGENT], new_agents)
+                    rows.append(row)
+                conn.executemany('''
+                    INSERT INTO access_records
+                    (request_id, ip_address, path_id, method, ua_id,
+                     start_time, end_time, duration, status_code)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                update_rollups(conn, batch)
+            self._paths.commit(new_paths)
+            self._user_agents.commit(new_agents)
+            self._count('flushed', len(batch))
+            self._count('batches')
+        except Exception as e:
+            self._count('failed', len(batch))
+            logger.error(f"批量写入访问记录失败: {str(e)}")
+
+    def stop(self, timeout=5):
+        """停止写线程并写完剩余记录"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("访问记录队列已满，无法发送停止信号")
+            return
+        self._thread.join(timeout)
+        logger.info(f"访问记录写线程已停止: {self.get_stats()}")
+
+    def get_stats(self):
+        """获取统计数据"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        with self._inflight_lock:
+            stats['inflight'] = len(self._inflight)
+        # 缓存只由写线程修改，这里读取的是近似值
+        for name, cache in (('path_cache', self._paths), ('ua_cache', self._user_agents)):
+            stats[name] = {'size': len(cache), 'hits': cache.hits, 'misses': cache.misses}
+        return stats
@@ -0,0 +1,127 @@
+'''
+访问记录全文检索 2026.10
+- access_fts 为 FTS5 外部内容表，只保存 access_records 的 path、user_agent 索引，不重复保存内容，
+  内容从视图 access_records_text（关联路径和 User-Agent 字典表）读取
+- 由 access_records 上的触发器同步（插入/删除/修改），访问记录写线程不需要改动
+- 使用 trigram 分词，检索任意子串，与 LIKE '%...%' 结果一致（不区分大小写），
+  检索词少于3个字符时 trigram 无法使用，改用 LIKE 扫描
+- SQLite 不支持 FTS5 时（没有 access_fts 表）也改用 LIKE 扫描
+- 结果按 id 从新到旧，before_id 为上一页最后一条的 id，用于翻页
+'''
+import logging
+
+from dbconn import transaction
+
+logger = logging.getLogger('FishTankMonitor')
+
+FIELDS = ('path', 'user_agent')
+
+# trigram 分词器最短可检索长度
+MIN_TERM_LENGTH = 3
+
+_SELECT = '''
+    SELECT id, datetime(start_time, 'unixepoch', 'localtime'), ip_address,
+           method, path, status_code, duration, user_agent
+    FROM access_records_text
+'''
+
+# 检索字段对应的字典表和 access_records 中的ID列
+_DICTIONARIES = {
+    'path': ('access_paths', 'path_id'),
+    'user_agent': ('access_user_agents', 'ua_id'),
+}
+
+
+def fts_available(conn):
+    """数据库中是否已建立全文索引"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'access_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def match_query(term, field=None):
+    """
+    把检索词转换为 FTS5 查询语句，整体作为一个短语，双引号转义
+    :param field: path / user_agent，为空时检索两列
+    """
+    phrase = '"' + term.replace('"', '""') + '"'
+    if field:
+        return f'{field} : {phrase}'
+    return phrase
+
+
+def _to_dict(row):
+    return {
+        'id': row[0],
+        'time': row[1],
+        'ip': row[2],
+        'method': row[3],
+        'path': row[4],
+        'status_code': row[5],
+        'duration': row[6],
+        'user_agent': row[7]
+    }
+
+
+def search_like(conn, term, field=None, limit=50, before_id=None):
+    """
+    LIKE 扫描检索，用于对比和不支持全文索引的情况
+    先在字典表中匹配文本，再按整数ID扫描访问记录
+    """
+    fields = [field] if field else list(FIELDS)
+    where = ' OR '.join(
+        f'{_DICTIONARIES[f][1]} IN (SELECT id FROM {_DICTIONARIES[f][0]} WHERE {f} LIKE ?)'
+        for f in fields
+    )
+    params = [f'%{term}%'] * len(fields)
+    sql = f'{_SELECT} WHERE ({where})'
+    if before_id is not None:
+        sql += ' AND id < ?'
+        params.append(before_id)
+    sql += ' ORDER BY id DESC LIMIT ?'
+    params.append(limit)
+    return [_to_dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def search_fts(conn, term, field=None, limit=50, before_id=None):
+    """全文索引检索，先在索引中按 rowid 倒序取出一页 id，再按 id 读取记录"""
+    params = [match_query(term, field)]
+    inner = 'SELECT rowid FROM access_fts WHERE access_fts MATCH ?'
+    if before_id is not None:
+        inner += ' AND rowid < ?'
+        params.append(before_id)
+    inner += ' ORDER BY rowid DESC LIMIT ?'
+    params.append(limit)
+    sql = f'{_SELECT} WHERE id IN ({inner}) ORDER BY id DESC'
+    return [_to_dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def search_access(conn, term, field=None, limit=50, before_id=None):
+    """
+    检索访问记录的路径和 User-Agent（子串匹配）
+    :return: (记录列表, 检索方式 fts / like)
+    """
+    term = (term or '').strip()
+    if not term:
+        raise ValueError("检索词不能为空")
+    if field and field not in FIELDS:
+        raise ValueError(f"不支持的检索字段: {field}")
+    if len(term) >= MIN_TERM_LENGTH and fts_available(conn):
+        return search_fts(conn, term, field, limit, before_id), 'fts'
+    return search_like(conn, term, field, limit, before_id), 'like'
+
+
+def rebuild_fts(conn):
+    """
+    根据 access_records 重建全文索引并合并索引段（数据修复时使用）
+    在一个事务内完成，期间访问记录写线程的记录留在队列中，完成后再写入
+    :return: 索引的记录数
+    """
+    if not fts_available(conn):
+        raise RuntimeError("数据库中没有全文索引表 access_fts（SQLite 不支持 FTS5？）")
+    with transaction(conn):
+        conn.execute("INSERT INTO access_fts(access_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO access_fts(access_fts) VALUES ('optimize')")
+        total = conn.execute('SELECT COUNT(*) FROM access_records').fetchone()[0]
+    return total
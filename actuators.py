@@ -0,0 +1,177 @@
+'''
+执行器队列 2026.10
+- 每个设备（舵机、风扇继电器、气泵继电器、水泵继电器）一个执行队列和一个执行线程，
+  同一设备的动作依次执行、不会重叠，不同设备的动作并行执行，
+  喂食计划转动舵机时，同一分钟的风扇、气泵、灌溉计划不用再等待
+- 队列按优先级排序（手动操作 > 定时计划 > 自动控制），同优先级先进先出
+- submit() 立即返回任务对象，需要结果时调用 wait()；call() 提交并等待结果
+- 统计每个设备的队列长度、排队等待时间和执行耗时
+'''
+import itertools
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger('FishTankMonitor')
+
+# 优先级，数值小的先执行
+PRIORITY_MANUAL = 0    # 网页手动操作
+PRIORITY_SCHEDULE = 1  # 定时计划
+PRIORITY_AUTO = 2      # 温控等自动控制
+
+_STOP = object()
+
+
+class ActuatorJob:
+    """提交到执行队列的一个动作"""
+    def __init__(self, device, name, func, args, kwargs, priority):
+        self.device = device
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        等待动作执行完成
+        :return: 动作的返回值，动作出错时抛出原异常，超时抛出 TimeoutError
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.device} 动作 {self.name} 等待超时")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _run(self):
+        self.started = time.time()
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.error = e
+        self.finished = time.time()
+        self._done.set()
+
+
+class _Device:
+    def __init__(self, name):
+        self.name = name
+        self.queue = queue.PriorityQueue()
+        self.thread = None
+        self.running = None  # 正在执行的动作名称
+        self.stats = {
+            'submitted': 0,
+            'executed': 0,
+            'failed': 0,
+            'wait_ms_total': 0.0,   # 排队等待时间
+            'wait_ms_max': 0.0,
+            'run_ms_total': 0.0,    # 执行耗时
+            'run_ms_max': 0.0
+        }
+
+
+class ActuatorExecutor:
+    def __init__(self, devices=('servo', 'fan', 'air_pump', 'water_pump')):
+        self._devices = {name: _Device(name) for name in devices}
+        self._seq = itertools.count()  # 同优先级按提交顺序执行
+        self._stats_lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """启动各设备的执行线程"""
+        for device in self._devices.values():
+            if device.thread is not None and device.thread.is_alive():
+                continue
+            device.thread = threading.Thread(target=self._run, args=(device,),
+                                             name=f'Actuator-{device.name}', daemon=True)
+            device.thread.start()
+        self._started = True
+        logger.info(f"执行器队列已启动: {', '.join(self._devices)}")
+
+    def submit(self, device, func, *args, priority=PRIORITY_MANUAL, name=None, **kwargs):
+        """
+        把动作放入设备的执行队列，立即返回
+        :return: ActuatorJob
+        """
+        if device not in self._devices:
+            raise ValueError(f"未知的设备: {device}")
+        job = ActuatorJob(device, name or getattr(func, '__name__', 'action'), func, args, kwargs, priority)
+        d = self._devices[device]
+        with self._stats_lock:
+            d.stats['submitted'] += 1
+        if not self._started:
+            # 执行线程未启动时（如维护脚本中）直接在当前线程执行
+            job._run()
+            self._record(d, job)
+            return job
+        d.queue.put((priority, next(self._seq), job))
+        return job
+
+    def call(self, device, func, *args, priority=PRIORITY_MANUAL, timeout=None, **kwargs):
+        """提交动作并等待结果"""
+        return self.submit(device, func, *args, priority=priority, **kwargs).wait(timeout)
+
+    def _run(self, device):
+        while True:
+            _, _, job = device.queue.get()
+            if job is _STOP:
+                return
+            device.running = job.name
+            job._run()
+            device.running = None
+            self._record(device, job)
+
+    def _record(self, device, job):
+        wait_ms = (job.started - job.submitted) * 1000
+        run_ms = (job.finished - job.started) * 1000
+        with self._stats_lock:
+            s = device.stats
+            s['executed'] += 1
+            s['wait_ms_total'] += wait_ms
+            s['wait_ms_max'] = max(s['wait_ms_max'], wait_ms)
+            s['run_ms_total'] += run_ms
+            s['run_ms_max'] = max(s['run_ms_max'], run_ms)
+            if job.error is not None:
+                s['failed'] += 1
+        if job.error is not None:
+            logger.error(f"{device.name} 动作 {job.name} 执行失败: {str(job.error)}")
+
+    def stop(self, timeout=5):
+        """排在停止信号之前的动作执行完后退出"""
+        for device in self._devices.values():
+            # 优先级最低，已在队列中的动作先执行完
+            device.queue.put((float('inf'), next(self._seq), _STOP))
+        for device in self._devices.values():
+            if device.thread is not None:
+                device.thread.join(timeout)
+        self._started = False
+
+    def get_stats(self):
+        """获取各设备的统计数据"""
+        result = {}
+        with self._stats_lock:
+            for name, device in self._devices.items():
+                s = dict(device.stats)
+                executed = s['executed'] or 1
+                result[name] = {
+                    'queue_depth': device.queue.qsize(),
+                    'running': device.running,
+                    'submitted': s['submitted'],
+                    'executed': s['executed'],
+                    'failed': s['failed'],
+                    'wait_ms_avg': round(s['wait_ms_total'] / executed, 2),
+                    'wait_ms_max': round(s['wait_ms_max'], 2),
+                    'run_ms_avg': round(s['run_ms_total'] / executed, 2),
+                    'run_ms_max': round(s['run_ms_max'], 2)
+                }
+        return result
@@ -16,17 +16,33 @@ import threading
 import logging
 import traceback
 import socket
-import psutil
 from flask import Flask, render_template, jsonify, request, g
 from rpi_ws281x import PixelStrip, Color
 import RPi.GPIO as GPIO
 import glob
 import Adafruit_DHT
-from datetime import datetime, timedelta
+from datetime import datetime
 import sqlite3
 import atexit
 import uuid
 import pytz
+import dbconn
+import opendb
+from dbconn import get_connection
+from accesslog import AccessLogger, hour_bucket, day_bucket
+from accesssearch import search_access
+from actuators import ActuatorExecutor, PRIORITY_MANUAL, PRIORITY_SCHEDULE, PRIORITY_AUTO
+from jobs import JobTable, CANCELLED
+from sysmetrics import SystemSampler
+from statestore import StateStore, sse_stream
+from connwatch import ConnectionWatcher
+from buzzer import BuzzerPlayer, beeps
+from ledengine import LedEngine
+from retention import RetentionManager
+from scheduler import Scheduler
+from sensorstore import TIERS, bucket_start, query_series, query_raw, query_tier, parse_local_time
+from ringbuffer import ReadingRing
+from downsample import lttb_rows
 
 # 配置日志
 logging.basicConfig(
@@ -70,11 +86,22 @@ def load_config():
             # 设置默认值
             config.setdefault('led_count', 10)
             config.setdefault('led_brightness', 230)
+            config.setdefault('led_fps', 30)  # 灯带最高帧率
+            config.setdefault('led_fade_seconds', 0.5)  # 激活/关闭灯带时的渐变时长
             config.setdefault('buzzer_pin', 17)
             config.setdefault('buzzer_beep_duration', 0.2)
             config.setdefault('buzzer_beep_interval', 0.1)
             config.setdefault('fan_pin', 24)  # 添加风扇引脚
             config.setdefault('fan_enabled', False)  # 添加风扇状态
+            config.setdefault('access_log_batch_size', 50)  # 访问记录批量写入条数
+            config.setdefault('access_log_flush_ms', 2000)  # 访问记录最长写入间隔(毫秒)
+            config.setdefault('access_log_queue_size', 2000)  # 访问记录队列长度
+            config.setdefault('access_log_overflow', 'drop_new')  # 队列满时策略 drop_new/drop_oldest
+            config.setdefault('access_log_cache_size', 1024)  # 路径/User-Agent 的ID缓存条数
+            config.setdefault('retention_days', {  # 各表保留天数，0为永久保留，汇总表一直保留
+                'access_records': 30, 'signin_records': 0, 'feeding_logs': 0})
+            config.setdefault('retention_interval_hours', 1)  # 每隔多少小时清理一次
+            config.setdefault('sensor_ring_hours', 48)  # 内存中保留最近多少小时的传感器读数
             
             logger.info(f"加载配置: {config}")
             return config
@@ -106,7 +133,14 @@ def create_default_config():
         "database_path": "/var/lib/fishtank/sensor_data.db", #数据库地址
         "timezone": "Asia/Shanghai", #时区
         "max_temperature": 30, #高温度阈值
-        "min_temperature": 27  #低温度阈值
+        "min_temperature": 27,  #低温度阈值
+        "access_log_batch_size": 50, #访问记录批量写入条数
+        "access_log_flush_ms": 2000, #访问记录最长写入间隔(毫秒)
+        "access_log_queue_size": 2000, #访问记录队列长度
+        "access_log_overflow": "drop_new", #队列满时策略 drop_new/drop_oldest
+        "sensor_ring_hours": 48, #内存中保留最近多少小时的传感器读数
+        "retention_days": {"access_records": 30, "signin_records": 0, "feeding_logs": 0}, #各表保留天数，0为永久保留
+        "retention_interval_hours": 1 #每隔多少小时清理一次
     }
     try:
         with open(CONFIG_PATH, 'w') as f:
@@ -152,7 +186,7 @@ def is_private_ip(ip):
 
 # 全局变量
 config = load_config()
-strip = None
+dbconn.configure(config['database_path'])
 is_active = False
 last_activity_time = 0
 active_connections = set()
@@ -161,6 +195,8 @@ fan_enabled = False  # 风扇状态
 pump_enabled = False  # 气泵状态
 water_pump_enabled = False  # 水泵状态
 water_pump_timer = None #执行时间（秒）
+water_pump_job = None  # 当前水泵定时运行的任务ID
+water_pump_run = 0  # 水泵运行序号，定时运行或手动开关时递增，之前的定时关闭不再执行
 water_level = "unknown"  # 水位状态：high/normal/low/unknown
 dht_sensor = Adafruit_DHT.DHT11
 current_temp = None #室温
@@ -168,7 +204,6 @@ current_humidity = None #湿度
 current_water_temp = None #鱼缸水温
 
 last_feed_time = 0  # 记录上次投喂时间（时间戳）
-feed_lock = threading.Lock()  # 投喂操作锁
 
 # 在全局配置中添加数据库路径
 config.setdefault('database_path', '/var/lib/fishtank/sensor_data.db')
@@ -177,6 +212,113 @@ config.setdefault('database_path', '/var/lib/fishtank/sensor_data.db')
 database_dir = os.path.dirname(config.get('database_path'))
 os.makedirs(database_dir, exist_ok=True)
 
+# 访问记录异步写入器
+access_logger = AccessLogger(
+    config['database_path'],
+    batch_size=config.get('access_log_batch_size', 50),
+    flush_interval=config.get('access_log_flush_ms', 2000) / 1000.0,
+    max_queue=config.get('access_log_queue_size', 2000),
+    overflow=config.get('access_log_overflow', 'drop_new'),
+    cache_size=config.get('access_log_cache_size', 1024)
+)
+
+# 过期数据清理和空间回收
+retention = RetentionManager(
+    config['database_path'],
+    policies=config.get('retention_days'),
+    interval=config.get('retention_interval_hours', 1) * 3600,
+    tz_name=config.get('timezone', 'Asia/Shanghai')
+)
+
+# 执行器队列，每个设备一个执行线程，同一设备的动作依次执行（代替原来的投喂锁）
+actuators = ActuatorExecutor()
+ACTUATOR_TIMEOUT = 10  # 开关类动作最长等待秒数
+
+# 后台任务表，投喂和水泵定时运行立即返回任务ID，通过 /api/jobs/<任务ID> 查询结果
+jobs = JobTable(config.get('job_history_size', 200))
+
+# 系统状态快照，各后台线程和执行器发布变化，/status 不加锁读取当前版本
+state = StateStore({
+    "active": is_active,
+    "connections": 0,
+    "last_activity": last_activity_time,
+    "water_temp": current_water_temp,
+    "fan_enabled": fan_enabled,
+    "pump_enabled": pump_enabled,
+    "water_pump_enabled": water_pump_enabled,
+    "water_level": water_level,
+    "temperature": current_temp,
+    "humidity": current_humidity,
+    "last_feed_time": None
+})
+
+def publish_feed_time():
+    """发布上次投喂时间（时间戳），只在投喂后变化，距今多久由页面计算"""
+    if last_feed_time > 0:
+        state.publish(last_feed_time=last_feed_time)
+
+# 系统指标后台采样（网速、CPU温度、内存、负载）
+# 每隔几秒就变化，不放入状态快照（否则 /status 几乎每次轮询都是新版本），
+# 由 /api/system 和推送的 system 事件读取，/status 的响应中合并最近一次的结果
+system_sampler = SystemSampler(
+    interfaces=config.get('metrics_interfaces', ['eth0']),
+    interval=config.get('metrics_interval', 2)
+)
+
+def system_status(metrics=None):
+    """最近一次系统指标采样结果，网速为第一个网卡的"""
+    metrics = metrics or system_sampler.snapshot()
+    network_info = metrics['network'].get(system_sampler.interfaces[0]) or {}
+    return {
+        'time': metrics['time'],
+        'cpu_temp': metrics['cpu_temp'],
+        'mem_usage': metrics['mem_usage'],
+        'load': metrics['load'],
+        'upload_speed': network_info.get('upload_speed'),
+        'download_speed': network_info.get('download_speed'),
+        'network': metrics['network']
+    }
+
+# /status 的响应内容：状态快照加上最近一次的系统指标和距上次投喂的小时数（保持原有字段），
+# 后两者不参与快照版本；同一快照版本、同一次采样只序列化一次
+_status_body_cache = (None, None, None)
+
+def status_body(snapshot):
+    """/status 的 JSON 内容"""
+    global _status_body_cache
+    system = system_status()
+    sample_time = system.pop('time')
+    version, cached_time, body = _status_body_cache
+    if version == snapshot.version and cached_time == sample_time:
+        return body
+    data = dict(snapshot.data)
+    data.update(system)
+    fed = data.get('last_feed_time')
+    data['feed_hours_ago'] = round((time.time() - fed) / 3600.0, 2) if fed else None
+    body = json.dumps(data, ensure_ascii=False)
+    _status_body_cache = (snapshot.version, sample_time, body)
+    return body
+
+_system_json = (None, None)  # (采样结果, JSON)
+
+def system_status_json():
+    """系统指标的 JSON，每次采样只序列化一次，推送给各连接时复用"""
+    global _system_json
+    metrics = system_sampler.snapshot()
+    if _system_json[0] is not metrics:
+        _system_json = (metrics, json.dumps(system_status(metrics), ensure_ascii=False))
+    return _system_json[1]
+
+# 视频观看连接检测，读取 /proc/net/tcp，没有连接时逐步放慢轮询
+motion_watcher = ConnectionWatcher(
+    port=config.get('motion_port', 8081),
+    min_interval=1,
+    max_interval=config.get('motion_poll_max', 3)
+)
+
+# 最近传感器读数环形缓冲区，每分钟一条
+sensor_ring = ReadingRing(int(config.get('sensor_ring_hours', 48) * 60))
+
 # 读取最大和最小水温温度阈值
 max_temperature = config['max_temperature']
 min_temperature = config['min_temperature']
@@ -275,6 +417,7 @@ def set_fan_state(enabled):
 
     #GPIO.output(config['fan_pin'], GPIO.HIGH if enabled else GPIO.LOW)
     GPIO.output(config['fan_pin'], GPIO.LOW if enabled else GPIO.HIGH)
+    state.publish(fan_enabled=enabled)
     logger.info(f"风扇状态已设置为: {'开启' if enabled else '关闭'}")
     return True
 
@@ -288,6 +431,7 @@ def set_pump_state(enabled):
     #GPIO.output(config['pump_pin'], GPIO.HIGH if enabled else GPIO.LOW) 
     # 继电器高电平触发    
     GPIO.output(config['pump_pin'], GPIO.LOW if enabled else GPIO.HIGH)   
+    state.publish(pump_enabled=enabled)
     logger.info(f"气泵状态已设置为: {'开启' if enabled else '关闭'}")
     return True
 
@@ -297,31 +441,99 @@ def set_water_pump_state(enabled):
     global water_pump_enabled
     water_pump_enabled = enabled
     GPIO.output(config['water_pump_pin'], GPIO.LOW if enabled else GPIO.HIGH)
+    state.publish(water_pump_enabled=enabled)
     logger.info(f"水泵状态已设置为: {'开启' if enabled else '关闭'}")
     return True
 
+def cancel_water_pump_timer(message):
+    """取消当前的水泵定时关闭（在水泵队列中调用），对应的任务标记为已取消，返回新的运行序号"""
+    global water_pump_timer, water_pump_job, water_pump_run
+    water_pump_run += 1
+    if water_pump_timer is not None:
+        water_pump_timer.cancel()
+        water_pump_timer = None
+    if water_pump_job is not None:
+        jobs.finish(water_pump_job, result={'message': message}, status=CANCELLED)
+        water_pump_job = None
+    return water_pump_run
+
+def set_water_pump_manual(enabled):
+    """手动开关水泵，取消之前的定时关闭"""
+    cancel_water_pump_timer('被手动开关取代')
+    return set_water_pump_state(enabled)
+
 # 水泵定时控制函数 20250816
-def run_water_pump_for_seconds(seconds):
-    """运行水泵指定秒数后自动关闭"""
-    global water_pump_timer
+def run_water_pump_for_seconds(seconds, job_id=None):
+    """运行水泵指定秒数后自动关闭，job_id 为对应的后台任务，关闭水泵后任务结束"""
+    global water_pump_timer, water_pump_job
     
     # 先取消之前的定时器（如果有）
-    if water_pump_timer is not None:
-        water_pump_timer.cancel()
+    run = cancel_water_pump_timer('被新的定时运行取代')
+    water_pump_job = job_id
     
     # 开启水泵
     set_water_pump_state(True)
     
     # 设置定时器关闭水泵
     def turn_off_pump():
+        global water_pump_timer, water_pump_job
+        # 定时器取消前已触发的关闭动作可能还在队列中，属于之前的运行时不执行
+        if run != water_pump_run:
+            logger.info(f"水泵第{run}次运行已被取代，忽略到时关闭")
+            return
+        water_pump_timer = None
+        water_pump_job = None
         set_water_pump_state(False)
         logger.info(f"水泵已运行{seconds}秒，自动关闭")
+        if job_id is not None:
+            jobs.finish(job_id, result={'seconds': seconds, 'message': f"水泵已运行{seconds}秒"})
     
-    water_pump_timer = threading.Timer(seconds, turn_off_pump)
+    # 到时后关闭动作也放入水泵队列，不与其他水泵动作重叠
+    water_pump_timer = threading.Timer(
+        seconds, lambda: actuators.submit('water_pump', turn_off_pump, priority=PRIORITY_MANUAL))
     water_pump_timer.start()
     logger.info(f"水泵已开启，将在{seconds}秒后自动关闭")
     return True
 
+def start_water_pump_job(job_id, seconds):
+    """水泵定时运行任务：开启水泵后任务保持执行中，到时关闭水泵后结束"""
+    jobs.mark_running(job_id)
+    try:
+        return run_water_pump_for_seconds(seconds, job_id)
+    except Exception as e:
+        jobs.finish(job_id, error=e)
+        raise
+
+def feed_portions(portion_size):
+    """转动舵机投喂 portion_size 次，在舵机队列中执行"""
+    for _ in range(portion_size):
+        servo.touwei()
+        time.sleep(2)  # 每次投喂间隔2秒
+    return True
+
+def feed_and_log(portion_size):
+    """手动投喂任务：投喂完成后记录投喂日志并更新最后投喂时间，返回任务结果"""
+    global last_feed_time
+    feed_portions(portion_size)
+    current_time = time.time()
+    conn = get_connection()
+    try:
+        conn.execute('''
+            INSERT INTO feeding_logs
+            (feed_time, portion_size)
+            VALUES (?, ?)
+        ''', (int(current_time), portion_size))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise RuntimeError(f"投喂完成，但记录投喂日志失败: {str(e)}")
+    last_feed_time = current_time
+    publish_feed_time()
+    return {
+        'message': f"成功投喂{portion_size}次",
+        'last_feed_time': last_feed_time
+    }
+
 # 水位检测函数
 def check_water_level():
     global water_level
@@ -346,6 +558,7 @@ def check_water_level():
     except Exception as e:
         logger.error(f"检测水位失败: {str(e)}")
         water_level = "error"
+    state.publish(water_level=water_level)
 
 # 读取DHT11温湿度传感器
 def read_dht11():
@@ -362,65 +575,45 @@ def read_dht11():
     except Exception as e:
         logger.error(f"读取温湿度传感器失败: {str(e)}")
 
-# 初始化LED灯带
-def init_led_strip():
-    global strip
-    try:
-        logger.info("初始化LED灯带...")
-        
-        # 从配置获取参数
-        led_count = config.get('led_count', 10)
-        led_brightness = config.get('led_brightness', 200)
-        
-        strip = PixelStrip(
-            led_count, 
-            18,           # GPIO引脚 (PWM0)
-            800000,       # LED信号频率 (通常800kHz)
-            10,           # DMA通道
-            False,        # 信号反转
-            led_brightness,
-            0             # 通道
-        )
-        strip.begin()
-        set_all_leds(Color(*config.get('idle_color', [0, 0, 0])))
-        logger.info(f"LED灯带初始化成功: {led_count}个灯珠, 亮度{led_brightness}")
-        return True
-    except Exception as e:
-        logger.error(f"LED灯带初始化失败: {str(e)}")
-        strip = None
-        return False
-
-# 设置所有LED颜色
-def set_all_leds(color):
-    if strip is None:
-        return
-    
-    try:
-        for i in range(strip.numPixels()):
-            strip.setPixelColor(i, color)
-        strip.show()
-    except Exception as e:
-        logger.error(f"设置LED时出错: {str(e)}")
-
-# 控制蜂鸣器 默认2声滴答
-def beep_buzzer(num=2):
-    try:
-        pin = config['buzzer_pin']
-        duration = config['buzzer_beep_duration']
-        interval = config['buzzer_beep_interval']
-        
-        # 默认滴滴两声
-        for _ in range(num):
-            GPIO.output(pin,GPIO.HIGH)
-            time.sleep(duration)
-            GPIO.output(pin,GPIO.LOW)
-            time.sleep(interval)
-        
-        logger.info("蜂鸣器已触发")
-        return True
-    except Exception as e:
-        logger.error(f"蜂鸣器控制失败: {str(e)}")
-        return False
+# 创建LED灯带（在灯带渲染线程中调用）
+def create_led_strip():
+    logger.info("初始化LED灯带...")
+        
+    # 从配置获取参数
+    led_count = config.get('led_count', 10)
+    led_brightness = config.get('led_brightness', 200)
+        
+    strip = PixelStrip(
+        led_count, 
+        18,           # GPIO引脚 (PWM0)
+        800000,       # LED信号频率 (通常800kHz)
+        10,           # DMA通道
+        False,        # 信号反转
+        led_brightness,
+        0             # 通道
+    )
+    strip.begin()
+    logger.info(f"LED灯带初始化成功: {led_count}个灯珠, 亮度{led_brightness}")
+    return strip
+
+# 灯带渲染线程独占灯带，调用方发送命令后立即返回；只在颜色变化时刷新灯带
+leds = LedEngine(create_led_strip, color=Color, fps=config.get('led_fps', 30))
+
+# 蜂鸣器提示音，有新的观看连接滴答两声，签到五声
+def buzzer_patterns():
+    """按配置的蜂鸣时长生成提示音"""
+    duration = config['buzzer_beep_duration']
+    interval = config['buzzer_beep_interval']
+    return {
+        'connect': beeps(2, duration, interval),
+        'signin': beeps(5, duration, interval)
+    }
+        
+def set_buzzer(on):
+    GPIO.output(config['buzzer_pin'], GPIO.HIGH if on else GPIO.LOW)
+        
+# 蜂鸣器播放线程，调用方放入队列后立即返回，短时间内重复的提示音合并
+buzzer = BuzzerPlayer(set_buzzer, buzzer_patterns(), cooldown=config.get('buzzer_cooldown', 3))
 
 # 监控Motion连接
 def monitor_motion_connections():
@@ -430,13 +623,8 @@ def monitor_motion_connections():
     
     while True:
         try:
-            current_connections = set()
-            
             # 查找所有连接到8081端口的连接
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.status == 'ESTABLISHED' and conn.laddr.port == 8081:
-                    ident = f"{conn.raddr.ip}:{conn.raddr.port}"
-                    current_connections.add(ident)
+            current_connections = motion_watcher.poll()
             
             # 使用线程锁保护共享变量
             with lock:
@@ -449,10 +637,10 @@ def monitor_motion_connections():
                     # 激活灯带
                     if not is_active:
                         is_active = True
-                        threading.Thread(target=activate_leds, daemon=True).start()
+                        activate_leds()
                     
                     # 触发蜂鸣器
-                    threading.Thread(target=beep_buzzer, daemon=True).start()
+                    buzzer.play('connect')
                 
                 # 检测断开连接
                 lost_connections = active_connections - current_connections
@@ -465,25 +653,31 @@ def monitor_motion_connections():
                 # 检查超时
                 if is_active and time.time() - last_activity_time > 60:
                     is_active = False
-                    threading.Thread(target=deactivate_leds, daemon=True).start()
+                    deactivate_leds()
                     logger.info("活动超时，关闭灯带")
+
+                state.publish(active=is_active, connections=len(active_connections),
+                              last_activity=last_activity_time)
+
+            # 水位和投喂时间也在这里刷新（与连接检测同一间隔），/status 只读取快照
+            check_water_level()
+            publish_feed_time()
         
         except Exception as e:
             logger.error(f"监控连接时出错: {str(e)}")
         
-        time.sleep(1)
+        # 有观看连接时每秒检测，没有时逐步放慢
+        time.sleep(motion_watcher.interval)
 
 # 激活灯带
 def activate_leds():
     logger.info("激活LED灯带")
-    if strip is not None:
-        set_all_leds(Color(*config.get('active_color', [0, 100, 0])))
+    leds.fade(config.get('active_color', [0, 100, 0]), config.get('led_fade_seconds', 0.5))
 
 # 关闭灯带
 def deactivate_leds():
     logger.info("关闭LED灯带")
-    if strip is not None:
-        set_all_leds(Color(*config.get('idle_color', [0, 0, 0])))
+    leds.fade(config.get('idle_color', [0, 0, 0]), config.get('led_fade_seconds', 0.5))
 
 # 获取本机IP
 def get_local_ip():
@@ -496,90 +690,17 @@ def get_local_ip():
     except:
         return "192.168.0.216"
 
-# 获取CPU温度
-def get_cpu_temp():
-    try:
-        temp = os.popen("vcgencmd measure_temp").readline()
-        return float(temp.replace("temp=", "").replace("'C\n", ""))
-    except:
-        return None
-
-# 获取内存使用率
-def get_memory_usage():
-    try:
-        return psutil.virtual_memory().percent
-    except:
-        return None
 
-# 2025.8.20 获取指定网络接口的带宽使用率
-def get_network_usage(interface='wlan0', interval=1):
-    """
-    获取指定网络接口的带宽使用率
-    
-    参数:
-    interface: 网络接口名称 (默认: 'wlan0'，树莓派常用无线网卡)
-    interval: 采样间隔时间(秒) (默认: 1秒)
-    
-    返回:
-    dict: 包含上传和下载速度(KB/s)和使用率信息
-    None: 如果出错则返回None
-    """
+def load_sensor_ring():
+    """启动时从数据库加载最近的传感器数据到内存缓冲区"""
     try:
-        # 获取第一次网络IO计数
-        net_io_start = psutil.net_io_counters(pernic=True).get(interface)
-        if not net_io_start:
-            return None
-            
-        time.sleep(interval)
-        
-        # 获取第二次网络IO计数
-        net_io_end = psutil.net_io_counters(pernic=True).get(interface)
-        if not net_io_end:
-            return None
-        
-        # 计算上传和下载速度 (字节/秒 -> KB/秒)
-        upload_speed = (net_io_end.bytes_sent - net_io_start.bytes_sent) / interval / 1024
-        download_speed = (net_io_end.bytes_recv - net_io_start.bytes_recv) / interval / 1024
-        
-        return {
-            'upload_speed': round(upload_speed, 2),  # KB/s
-            'download_speed': round(download_speed, 2),  # KB/s
-            'interface': interface
-        }
-        
+        now = time.time()
+        conn = get_connection()
+        rows = query_raw(conn, now - config.get('sensor_ring_hours', 48) * 3600, now)
+        sensor_ring.extend(rows)
+        logger.info(f"传感器缓冲区已加载 {len(sensor_ring)} 条数据，占用 {sensor_ring.memory_bytes() // 1024}KB")
     except Exception as e:
-        print(f"获取网络使用率出错: {e}")
-        return None
-
-# 2025.8.20 获取网络接口使用率百分比
-def get_network_usage_percent(interface='eth0', interval=1, max_speed=100000):
-    """
-    获取网络接口使用率百分比(相对于最大理论速度)
-    
-    参数:
-    interface: 网络接口名称
-    interval: 采样间隔
-    max_speed: 最大理论速度(KB/s)，默认100MBps ≈ 100000 KB/s
-
-    wlan0(无线), eth0(有线)
-    
-    返回:
-    float: 使用率百分比 (0-100)
-    None: 如果出错
-    """
-    try:
-        usage = get_network_usage(interface, interval)
-        if not usage:
-            return None
-            
-        # 计算总带宽使用率 (上传+下载)
-        total_speed = usage['upload_speed'] + usage['download_speed']
-        usage_percent = min((total_speed / max_speed) * 100, 100)
-        
-        return round(usage_percent, 2)
-        
-    except:
-        return None
+        logger.error(f"加载传感器缓冲区失败: {str(e)}")
 
 
 def sensor_reading_task():
@@ -588,6 +709,7 @@ def sensor_reading_task():
     logger.info("启动传感器读取任务...")
     
     while True:
+        temperature = humidity = water_temp = None
         try:
             # 读取室温湿度
             humidity, temperature = Adafruit_DHT.read_retry(dht_sensor, config['dht11_pin'])
@@ -605,10 +727,10 @@ def sensor_reading_task():
                 #水温低于27度，关闭风扇；水温高于30度，开启风扇 2025.8.19
                 if current_water_temp< min_temperature and fan_enabled: 
                     logger.info(f"温度低{current_water_temp}°C低于{min_temperature}°C,关闭风扇")
-                    set_fan_state(False)
+                    actuators.submit('fan', set_fan_state, False, priority=PRIORITY_AUTO)
                 if current_water_temp > max_temperature and not fan_enabled : 
                     logger.info(f"温度低{current_water_temp}°C高于{max_temperature}°C,开启风扇")
-                    set_fan_state(True)
+                    actuators.submit('fan', set_fan_state, True, priority=PRIORITY_AUTO)
                 
             else:
                 logger.warning("读取水温失败")
@@ -616,177 +738,156 @@ def sensor_reading_task():
         except Exception as e:
             logger.error(f"读取传感器数据时出错: {str(e)}")
         
-        # 每10秒读取一次
+        # 追加到内存缓冲区，读取失败的值记为空
+        sensor_ring.append(time.time(), temperature, humidity, water_temp)
+        state.publish(temperature=current_temp, humidity=current_humidity, water_temp=current_water_temp)
+        
+        # 每60秒读取一次
         time.sleep(60)
 
-# 定时任务检查
-def check_feeding_schedules():
+# 定时计划，由 Scheduler 按下次执行时间调度 2026.10
+def load_enabled_schedules():
+    """加载所有启用的计划（计划有变化时由调度线程调用）"""
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT id, schedule_name, feed_time, feed_days, portion_size, typeid
+        FROM feeding_schedules
+        WHERE enabled=1
+    ''')
+    return [{
+        'id': row[0],
+        'schedule_name': row[1],
+        'feed_time': row[2],
+        'feed_days': row[3],
+        'portion_size': row[4],
+        'typeid': row[5]
+    } for row in c.fetchall()]
+
+def save_next_feed_times(next_times):
+    """保存各计划的下次执行时间到 next_feed_time"""
+    conn = get_connection()
+    conn.executemany('UPDATE feeding_schedules SET next_feed_time=? WHERE id=?',
+                     [(int(ts), schedule_id) for schedule_id, ts in next_times.items()])
+    conn.commit()
+
+# 计划类别对应的执行器队列
+SCHEDULE_DEVICES = {0: 'servo', 1: 'fan', 2: 'air_pump', 3: 'water_pump'}
+
+def execute_schedule(schedule, fire_time):
+    """
+    把到期的计划放入对应设备的执行队列后立即返回，
+    喂食计划转动舵机时不会耽误同一时间的风扇、气泵、灌溉计划
+    """
+    device = SCHEDULE_DEVICES.get(schedule['typeid'])
+    if device is None:
+        logger.warning(f"未知的计划类别 {schedule['typeid']}: {schedule['schedule_name']}")
+        return
+    actuators.submit(device, run_schedule, schedule, fire_time,
+                     priority=PRIORITY_SCHEDULE, name=f"schedule:{schedule['schedule_name']}")
+
+def run_schedule(schedule, fire_time):
+    """执行计划（在设备的执行线程中），注意当风扇和气泵的，1、2这两个类别时，portion_size 1为开启，3为关闭"""
     global last_feed_time
-    """检查并执行计划的定时任务"""
-    while True:
-        logger.info(f"定时任务检查！")
-        conn = None
-        try:
-            conn = sqlite3.connect(config['database_path'])
-            c = conn.cursor()
-            
-            # 确保所有需要的表都存在
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS feeding_schedules (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    enabled INTEGER DEFAULT 1,
-                    schedule_name TEXT NOT NULL,
-                    feed_time TEXT NOT NULL,  -- 存储格式 HH:MM
-                    feed_days TEXT NOT NULL,  -- 存储格式 0,1,2,3,4,5,6 (0=周日)
-                    portion_size INTEGER DEFAULT 1,
-                    typeid INTEGER DEFAULT 0, -- 记录类型,0=喂食,1=风扇,2=气泵,3=灌溉蓄水
-                    last_feed_time INTEGER   -- 存储时间戳
-                )
-            ''')
+    schedule_id = schedule['id']
+    schedule_name = schedule['schedule_name']
+    portion_size = schedule['portion_size']
+    typeid_ = schedule['typeid']
+    conn = get_connection()
+    c = conn.cursor()
+    current_timestamp = int(time.time())
             
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS feeding_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    schedule_id INTEGER,
-                    feed_time INTEGER NOT NULL,
-                    portion_size INTEGER NOT NULL,
-                    typeid INTEGER DEFAULT 0, -- 记录类型,0=喂食,1=风扇,2=气泵,3=灌溉蓄水
-                    FOREIGN KEY(schedule_id) REFERENCES feeding_schedules(id)
-                )
-            ''')
+    # 仅喂食计划检查冷却时间
+    if typeid_ == 0:
+        c.execute('SELECT last_feed_time FROM feeding_schedules WHERE id=?', (schedule_id,))
+        row = c.fetchone()
+        if row and row[0] is not None:
+            time_diff = current_timestamp - row[0]
+            if time_diff < 10800:  # 3小时冷却
+                logger.info(f"喂食计划 {schedule_name} 冷却中，剩余 {((10800-time_diff)//60)}分钟")
+                return
             
-            now = datetime.now()
-            current_time = now.strftime('%H:%M')
-            current_weekday = str((now.weekday() + 1) % 7)  # 转换为 0=周日, 1=周一, ..., 6=周六  # 0=周日, 6=周六
-            logger.info(f"当前时间: {current_time}, 当前星期: {current_weekday}")  # 新增日志
-            current_timestamp = int(time.time())
+    try:
+        if typeid_ == 0:  # 喂食
+            logger.info(f"执行喂食计划: {schedule_name}")
+            if 'servo' in globals():
+                feed_portions(portion_size)
+                last_feed_time = time.time()  # 更新投喂时间
+                publish_feed_time()
+
+        elif typeid_ == 1:  # 风扇
+            logger.info(f"执行风扇计划: {schedule_name}")
+            set_fan_state(True)
+        elif typeid_ == 2:  # 气泵
+            logger.info(f"执行气泵计划: {schedule_name}")
+            if portion_size == 1 :
+                set_pump_state(True)
+            elif portion_size ==3 :
+                set_pump_state(False)
             
+        elif typeid_ == 3:  # 灌溉
+            logger.info(f"执行灌溉计划: {schedule_name}")
+            run_water_pump_for_seconds(30*portion_size)
 
-            # 获取所有符合条件的计划（优化查询）
-            c.execute('''
-                SELECT id, portion_size, last_feed_time, typeid, schedule_name
-                FROM feeding_schedules
-                WHERE enabled=1 AND feed_time=? AND feed_days LIKE ?
-                ORDER BY typeid  -- 按类型排序，先处理非喂食计划
-            ''', (current_time, f'%{current_weekday}%'))
-            
-            for schedule in c.fetchall():
-                schedule_id, portion_size, last_feed_time_,typeid_, schedule_name = schedule
-                should_execute = True
-
-                 # 仅喂食计划检查冷却时间
-                if typeid_ == 0 and last_feed_time_ is not None:
-                    time_diff = current_timestamp - last_feed_time_
-                    if time_diff < 10800:  # 3小时冷却
-                        logger.info(f"喂食计划 {schedule_name} 冷却中，剩余 {((10800-time_diff)//60)}分钟")
-                        should_execute = False
-
-                if should_execute:
-                    try:
-                        # 执行对应类型的计划，注意当风扇和气泵的，1、2这两个类别时，portion_size 1为开启，3为关闭
-                        if typeid_ == 0:  # 喂食
-                            logger.info(f"执行喂食计划: {schedule_name}")
-                            if 'servo' in globals():
-                                for _ in range(portion_size):
-                                    servo.touwei()
-                                    time.sleep(2)
-                                last_feed_time = time.time()  # 更新投喂时间
-
-                        elif typeid_ == 1:  # 风扇
-                            logger.info(f"执行风扇计划: {schedule_name}")
-                            set_fan_state(True)
-                        elif typeid_ == 2:  # 气泵
-                            logger.info(f"执行气泵计划: {schedule_name}")
-                            if portion_size == 1 :
-                                set_pump_state(True)
-                            elif portion_size ==3 :
-                                set_pump_state(False)
-
-                        elif typeid_ == 3:  # 灌溉
-                            logger.info(f"执行灌溉计划: {schedule_name}")
-                            run_water_pump_for_seconds(30*portion_size)
-                            
-                        
-                        # 更新最后执行时间和记录日志
-                        c.execute('''
-                            UPDATE feeding_schedules
-                            SET last_feed_time=?
-                            WHERE id=?
-                        ''', (current_timestamp, schedule_id))
-                        
-                        c.execute('''
-                            INSERT INTO feeding_logs 
-                            (schedule_id, feed_time, portion_size, typeid)
-                            VALUES (?, ?, ?, ?)
-                        ''', (schedule_id, current_timestamp, portion_size, typeid_))
-                        
-                        conn.commit()
-                        logger.info(f"计划执行成功: {schedule_name} (ID:{schedule_id})")
-                        
-                    except Exception as e:
-                        logger.error(f"执行计划失败 {schedule_name}: {str(e)}")
-                        conn.rollback()
-        
-        except Exception as e:
-            logger.error(f"计划检查出错: {str(e)}")
-            if conn:
-                conn.rollback()
-        
-        finally:
-            if conn:
-                conn.close()
-        
-        time.sleep(60) 
+        # 更新最后执行时间和记录日志
+        c.execute('''
+            UPDATE feeding_schedules
+            SET last_feed_time=?
+            WHERE id=?
+        ''', (current_timestamp, schedule_id))
 
- # 访问记录函数，写入数据库
+        c.execute('''
+            INSERT INTO feeding_logs 
+            (schedule_id, feed_time, portion_size, typeid)
+            VALUES (?, ?, ?, ?)
+        ''', (schedule_id, current_timestamp, portion_size, typeid_))
+
+        conn.commit()
+        logger.info(f"计划执行成功: {schedule_name} (ID:{schedule_id})，"
+                    f"计划时间 {datetime.fromtimestamp(fire_time).strftime('%H:%M')}")
+    except Exception:
+        conn.rollback()
+        raise
+
+schedule_runner = Scheduler(load_enabled_schedules, execute_schedule, save_next_feed_times)
+
+# 访问记录函数，请求结束时一次写入完整记录，由写线程批量写入数据库
 @app.before_request
 def track_access():
-    """记录每个请求的访问信息到数据库"""
+    """登记每个请求的访问信息"""
     try:
         g.start_time = time.time()
         g.request_id = str(uuid.uuid4())
-        client_ip = request.remote_addr
-        user_agent = request.headers.get('User-Agent', '')
-        path = request.path
-        method = request.method
-        
-        # 插入数据库
-        conn = sqlite3.connect(config['database_path'])
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO access_records 
-            (request_id, ip_address, path, method, user_agent, start_time)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (g.request_id, client_ip, path, method, user_agent, g.start_time))
-        conn.commit()
-        conn.close()
+        access_logger.begin(
+            g.request_id,
+            request.remote_addr,
+            request.path,
+            request.method,
+            request.headers.get('User-Agent', ''),
+            g.start_time
+        )
         
     except Exception as e:
         logger.error(f"记录访问开始失败: {str(e)}")
 
 @app.after_request
 def after_request(response):
-    """更新请求结束时间到数据库"""
+    """请求结束，写入完整访问记录"""
     try:
-        if hasattr(g, 'start_time') and hasattr(g, 'request_id'):
-            end_time = time.time()
-            duration = end_time - g.start_time
-            
-            # 更新数据库记录
-            conn = sqlite3.connect(config['database_path'])
-            c = conn.cursor()
-            c.execute('''
-                UPDATE access_records 
-                SET end_time = ?, duration = ?, status_code = ?
-                WHERE request_id = ?
-            ''', (end_time, duration, response.status_code, g.request_id))
-            conn.commit()
-            conn.close()
+        if hasattr(g, 'request_id'):
+            access_logger.finish(g.request_id, time.time(), response.status_code)
     
     except Exception as e:
-        logger.error(f"更新访问结束时间失败: {str(e)}")
+        logger.error(f"记录访问结束失败: {str(e)}")
     
     return response
+
+@app.teardown_request
+def teardown_access(exc):
+    """未处理异常时 after_request 不会执行，在这里补写记录"""
+    if exc is not None and hasattr(g, 'request_id'):
+        access_logger.finish(g.request_id, time.time(), 500)
+    # 请求线程用完的数据库连接归还到空闲池，供后续请求复用
+    dbconn.release_connection()
       
 
 # ======================
@@ -802,39 +903,67 @@ def index():
 
 @app.route('/status')
 def status():
-    """系统状态API"""
-    check_water_level()  # 每次请求时检测水位
-    feed_hours_ago = (time.time() - last_feed_time) / 3600.0 if last_feed_time > 0 else None
-    network_info = get_network_usage('eth0')
-    with lock:
-        return jsonify({
-            "active": is_active,
-            "connections": len(active_connections),
-            "last_activity": last_activity_time,
-            "cpu_temp": get_cpu_temp(),
-            "mem_usage": get_memory_usage(),
-            "upload_speed": network_info['upload_speed'],  # 上传速度
-            "download_speed": network_info['download_speed'], # 下载速度
-            "water_temp": current_water_temp,  # 水温
-            "fan_enabled": fan_enabled,  # 风扇状态
-            "pump_enabled": pump_enabled,  # 气泵状态
-            "water_pump_enabled": water_pump_enabled, # 水泵状态
-            "water_level": water_level,  # 水位状态
-            "temperature": current_temp,    # 使用后台线程更新的温度
-            "humidity": current_humidity,    # 使用后台线程更新的湿度
-            "feed_hours_ago": feed_hours_ago
-        })
+    """
+    系统状态API，返回当前状态快照，快照版本未变化时返回 304
+    系统指标和 feed_hours_ago 不参与版本（弱 ETag），返回 304 时调用方沿用之前的值，
+    需要最新的系统指标时读取 /api/system
+    """
+    snapshot = state.current()
+    if request.if_none_match.contains_weak(snapshot.etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(status_body(snapshot), mimetype='application/json')
+    response.set_etag(snapshot.etag, weak=True)
+    # 浏览器每次都带 If-None-Match 重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/system')
+def api_system():
+    """系统指标API（CPU温度、内存、负载、网速），直接读取最近一次采样结果，不参与 /status 的版本"""
+    response = jsonify(system_status())
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# 状态推送 2026.10
+@app.route('/events')
+def events():
+    """
+    Server-Sent Events 状态推送：连接后先发完整状态，之后只在状态变化（传感器、执行器等）时推送变化的字段，
+    断线重连时浏览器带上 Last-Event-ID，补发期间的变化；
+    系统指标不在状态中，作为 system 事件每 sse_system_interval 秒发送一次
+    """
+    if not state.subscribe(config.get('sse_max_clients', 20)):
+        return jsonify({"status": "error", "message": "推送连接数已满，请使用 /status"}), 503
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = app.response_class(
+        sse_stream(state, last_event_id, heartbeat=config.get('sse_heartbeat', 15),
+                   side=('system', system_status_json),
+                   side_interval=config.get('sse_system_interval', 10)),
+        mimetype='text/event-stream'
+    )
+    response.call_on_close(state.unsubscribe)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 经过代理时不缓冲
+    return response
+
+# 开关类接口：在设备队列中执行动作，排队或执行超时返回 504
+def actuator_response(device, func, *args):
+    try:
+        success = actuators.call(device, func, *args, timeout=ACTUATOR_TIMEOUT)
+    except TimeoutError as e:
+        logger.warning(str(e))
+        return jsonify({"status": "error", "message": f"{device} 动作超时，请稍后重试"}), 504
+    return jsonify({"status": "success" if success else "error"})
 
 # 添加风扇控制路由
 @app.route('/fan/<state>')
 def control_fan(state):
     """控制风扇API"""
     if state == 'on':
-        success = set_fan_state(True)
-        return jsonify({"status": "success" if success else "error"})
+        return actuator_response('fan', set_fan_state, True)
     elif state == 'off':
-        success = set_fan_state(False)
-        return jsonify({"status": "success" if success else "error"})
+        return actuator_response('fan', set_fan_state, False)
     else:
         return jsonify({"status": "error", "message": "无效的指令"}), 400
 
@@ -843,11 +972,9 @@ def control_fan(state):
 def control_pump(state):
     """控制气泵API"""
     if state == 'on':
-        success = set_pump_state(True)
-        return jsonify({"status": "success" if success else "error"})
+        return actuator_response('air_pump', set_pump_state, True)
     elif state == 'off':
-        success = set_pump_state(False)
-        return jsonify({"status": "success" if success else "error"})
+        return actuator_response('air_pump', set_pump_state, False)
     else:
         return jsonify({"status": "error", "message": "无效的指令"}), 400
 
@@ -857,11 +984,9 @@ def control_pump(state):
 def control_water_pump(state):
     """控制水泵API"""
     if state == 'on':
-        success = set_water_pump_state(True)
-        return jsonify({"status": "success" if success else "error"})
+        return actuator_response('water_pump', set_water_pump_manual, True)
     elif state == 'off':
-        success = set_water_pump_state(False)
-        return jsonify({"status": "success" if success else "error"})
+        return actuator_response('water_pump', set_water_pump_manual, False)
     else:
         return jsonify({"status": "error", "message": "无效的指令"}), 400
 
@@ -872,8 +997,15 @@ def control_water_pump_timer(seconds):
     if seconds <= 0:
         return jsonify({"status": "error", "message": "时间必须大于0"}), 400    
     try:
-        success = run_water_pump_for_seconds(seconds)
-        return jsonify({"status": "success" if success else "error"})
+        # 创建任务后立即返回，水泵到时关闭后任务结束
+        job = jobs.create('water_pump_timer', {'seconds': seconds})
+        actuators.submit('water_pump', start_water_pump_job, job['id'], seconds,
+                         priority=PRIORITY_MANUAL, name='manual:water_pump_timer')
+        return jsonify({
+            "status": "accepted",
+            "job_id": job['id'],
+            "status_url": f"/api/jobs/{job['id']}"
+        }), 202
     except Exception as e:
         logger.error(f"水泵定时控制失败: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -968,17 +1100,21 @@ def update_config():
         # 更新全局配置
         config.update(new_config)
 
+        # 应用蜂鸣时长
+        if 'buzzer_beep_duration' in new_config or 'buzzer_beep_interval' in new_config:
+            buzzer.set_patterns(buzzer_patterns())
+
         # 应用风扇状态
         if 'fan_enabled' in new_config:
-            set_fan_state(new_config['fan_enabled'])
+            actuators.call('fan', set_fan_state, new_config['fan_enabled'], timeout=ACTUATOR_TIMEOUT)
 
         # 应用气泵状态
         if 'pump_enabled' in new_config:
-            set_pump_state(new_config['pump_enabled'])
+            actuators.call('air_pump', set_pump_state, new_config['pump_enabled'], timeout=ACTUATOR_TIMEOUT)
 
         # 应用水泵状态
         if 'water_pump_enabled' in new_config:
-            set_pump_state(new_config['water_pump_enabled'])
+            actuators.call('air_pump', set_pump_state, new_config['water_pump_enabled'], timeout=ACTUATOR_TIMEOUT)
         
         # 保存到文件
         with open(CONFIG_PATH, 'w') as f:
@@ -998,15 +1134,8 @@ def update_config():
 
 @app.route('/reinit_leds')
 def reinit_leds():
-    """重新初始化LED灯带"""
-    global strip
-    if strip is not None:
-        try:
-            strip._cleanup()  # 清理现有灯带
-        except:
-            pass
-    
-    init_led_strip()
+    """重新初始化LED灯带（由灯带渲染线程清理并重新创建）"""
+    leds.reinit()
     if is_active:
         activate_leds()
     else:
@@ -1021,7 +1150,8 @@ def web_activate():
         global is_active, last_activity_time
         is_active = True
         last_activity_time = time.time()
-        threading.Thread(target=activate_leds, daemon=True).start()
+        state.publish(active=True, last_activity=last_activity_time)
+        activate_leds()
         return jsonify({"status": "activated"})
 
 @app.route('/deactivate')
@@ -1030,9 +1160,37 @@ def web_deactivate():
     with lock:
         global is_active
         is_active = False
-        threading.Thread(target=deactivate_leds, daemon=True).start()
+        state.publish(active=False)
+        deactivate_leds()
         return jsonify({"status": "deactivated"})
 
+# 灯带效果 2026.10
+@app.route('/api/leds', methods=['POST'])
+def set_led_effect():
+    """
+    设置灯带效果，发送给灯带渲染线程后立即返回
+    {"effect": "solid", "color": [r, g, b]}
+    {"effect": "fade", "color": [r, g, b], "duration": 秒}
+    {"effect": "breathe", "color": [r, g, b], "period": 秒}
+    {"effect": "pixels", "pixels": [[r, g, b], null, ...]}  null 的灯珠保持不变
+    """
+    data = request.get_json(silent=True) or {}
+    effect = data.get('effect')
+    try:
+        if effect == 'solid':
+            leds.solid(data['color'])
+        elif effect == 'fade':
+            leds.fade(data['color'], float(data.get('duration', 0.5)))
+        elif effect == 'breathe':
+            leds.breathe(data['color'], float(data.get('period', 3.0)))
+        elif effect == 'pixels':
+            leds.set_pixels(data['pixels'])
+        else:
+            return jsonify({'status': 'error', 'message': f'未知的效果: {effect}'}), 400
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': f'参数错误: {str(e)}'}), 400
+    return jsonify({'status': 'success', 'effect': effect})
+
 '''
 2025.8.19 废弃
 @app.route('/test_buzzer')
@@ -1056,27 +1214,12 @@ def charts():
 @app.route('/api/feeding/schedules', methods=['GET', 'POST', 'DELETE'])
 def manage_schedules():
     try:
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
-        # 确保表存在
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS feeding_schedules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                enabled INTEGER DEFAULT 1,
-                schedule_name TEXT NOT NULL,
-                feed_time TEXT NOT NULL,
-                feed_days TEXT NOT NULL,
-                portion_size INTEGER DEFAULT 1,
-                last_feed_time INTEGER,
-                next_feed_time INTEGER,
-                typeid INTEGER DEFAULT 0
-            )
-        ''')
-        
         if request.method == 'GET':
             # 获取所有喂食计划
-            c.execute('SELECT id, enabled, schedule_name, feed_time, feed_days, portion_size,typeid FROM feeding_schedules ORDER BY feed_time')
+            c.execute('SELECT id, enabled, schedule_name, feed_time, feed_days, portion_size,typeid,next_feed_time FROM feeding_schedules ORDER BY feed_time')
             schedules = []
             for row in c.fetchall():
                 schedules.append({
@@ -1086,7 +1229,8 @@ def manage_schedules():
                     'feed_time': row[3],
                     'feed_days': [int(d) for d in row[4].split(',') if d],
                     'portion_size': row[5],
-                    'typeid': row[6]
+                    'typeid': row[6],
+                    'next_feed_time': row[7] if row[1] else None  # 下次执行时间戳
 
                 })
             return jsonify(schedules)
@@ -1139,13 +1283,12 @@ def manage_schedules():
                 schedule_id = c.lastrowid
             
             conn.commit()
+            schedule_runner.reload()
             return jsonify({'status': 'success', 'id': schedule_id})
     
     except Exception as e:
         logger.error(f"计划管理错误: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/feeding/schedules/toggle', methods=['POST'])
 def toggle_schedule():
@@ -1157,7 +1300,7 @@ def toggle_schedule():
         if not schedule_id:
             return jsonify({"status": "error", "message": "缺少计划ID"}), 400
         
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
         c.execute('''
@@ -1170,21 +1313,17 @@ def toggle_schedule():
             return jsonify({"status": "error", "message": "计划不存在"}), 404
         
         conn.commit()
+        schedule_runner.reload()
         return jsonify({"status": "success", "id": schedule_id, "enabled": enabled})
     
     except Exception as e:
         logger.error(f"切换计划状态失败: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 #手动喂食
 @app.route('/feed', methods=['POST'])
 def feed_fish():
-    """立即投喂接口（带完整错误处理）"""
-    global last_feed_time
-    
+    """立即投喂接口（带完整错误处理），返回任务ID，投喂在后台执行"""
     try:
         # 1. 验证请求数据
         data = request.get_json()
@@ -1204,8 +1343,8 @@ def feed_fish():
                 return jsonify({"status": "error", "message": "舵机初始化失败"}), 500
 
         # 4. 检查冷却时间（带容错处理）
-        current_time = time.time()
         '''
+        current_time = time.time()
         if last_feed_time > 0 and (current_time - last_feed_time) < 3 * 3600:
             remaining = (3 * 3600 - (current_time - last_feed_time)) / 60
             return jsonify({
@@ -1214,51 +1353,18 @@ def feed_fish():
             }), 429
         '''
 
-        # 5. 执行投喂（带线程锁）
-        with feed_lock:
-            # 执行投喂动作
-            for _ in range(portion_size):
-                try:
-                    servo.touwei()
-                    time.sleep(2)  # 每次投喂间隔2秒
-                except Exception as e:
-                    logger.error(f"投喂动作执行失败: {str(e)}")
-                    return jsonify({
-                        "status": "error", 
-                        "message": f"投喂动作执行失败: {str(e)}"
-                    }), 500
-
-            # 6. 记录投喂日志
-            conn = None
-            try:
-                conn = sqlite3.connect(config['database_path'])
-                c = conn.cursor()
-                c.execute('''
-                    INSERT INTO feeding_logs 
-                    (feed_time, portion_size)
-                    VALUES (?, ?)
-                ''', (int(current_time), portion_size))
-                conn.commit()
-            except Exception as e:
-                logger.error(f"记录投喂日志失败: {str(e)}")
-                if conn:
-                    conn.rollback()
-                return jsonify({
-                    "status": "error",
-                    "message": "记录投喂日志失败"
-                }), 500
-            finally:
-                if conn:
-                    conn.close()
-
-            # 7. 更新最后投喂时间
-            last_feed_time = current_time
+        # 5. 创建投喂任务，放入舵机队列后立即返回（与喂食计划依次执行，手动投喂优先），
+        #    投喂完成后由任务记录投喂日志，客户端通过 /api/jobs/<任务ID> 查询结果
+        job = jobs.create('feed', {'portion_size': portion_size})
+        actuators.submit('servo', jobs.run, job['id'], feed_and_log, portion_size,
+                         priority=PRIORITY_MANUAL, name='manual:feed')
             
-            return jsonify({
-                "status": "success",
-                "message": f"成功投喂{portion_size}次",
-                "last_feed_time": last_feed_time
-            })
+        return jsonify({
+            "status": "accepted",
+            "message": f"投喂任务已提交（{portion_size}次）",
+            "job_id": job['id'],
+            "status_url": f"/api/jobs/{job['id']}"
+        }), 202
 
     except Exception as e:
         logger.error(f"投喂处理严重错误: {str(e)}\n{traceback.format_exc()}")
@@ -1272,7 +1378,7 @@ def feed_fish():
 def delete_schedule(schedule_id):
     
     try:
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
         # 先检查计划是否存在
@@ -1283,6 +1389,7 @@ def delete_schedule(schedule_id):
         # 删除计划
         c.execute('DELETE FROM feeding_schedules WHERE id = ?', (schedule_id,))
         conn.commit()
+        schedule_runner.reload()
         
         logger.info(f"成功删除计划: ID {schedule_id}")
         return jsonify({"status": "success", "id": schedule_id})
@@ -1295,16 +1402,13 @@ def delete_schedule(schedule_id):
     except Exception as e:
         logger.error(f"删除计划失败: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 # 获取喂食记录
 @app.route('/api/feeding/logs', methods=['GET'])
 def get_feeding_logs():
     limit = request.args.get('limit', 10)
-    conn = sqlite3.connect(config['database_path'])
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''
@@ -1335,7 +1439,7 @@ def get_feeding_logs():
 @app.route('/api/feeding/logs/<int:log_id>', methods=['DELETE'])
 def delete_feeding_log(log_id):
     try:
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
         # 检查记录是否存在
@@ -1352,8 +1456,6 @@ def delete_feeding_log(log_id):
     except Exception as e:
         conn.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        conn.close()
 
 @app.route('/feeding')
 def feeding():
@@ -1364,51 +1466,104 @@ def feeding():
 
 @app.route('/sensor_data')
 def get_sensor_data():
-    """获取传感器历史数据"""
+    """
+    获取传感器历史数据，按时间跨度自动选择原始数据或15分钟/每小时汇总数据
+    带 since 参数（上次返回的 cursor 或时间）时只返回之后的新数据，用于图表增量追加；
+    同时带 tier 参数（上次返回的汇总级别）时按同一级别返回 cursor 所在时段及之后的时段，
+    该时段可能在上次返回后又有新的读数，调用方需替换而不是追加
+    """
     time_range = request.args.get('range', 'day')  # day, week, month
+    since = request.args.get('since')
+    since_tier = request.args.get('tier')
+    if since_tier not in dict(TIERS):
+        since_tier = None
+    # 最多返回的点数，超过时用LTTB降采样（保留尖峰）
+    max_points = request.args.get('max_points', type=int)
+    if max_points is not None:
+        max_points = max(10, min(max_points, 5000))
     
     # 计算时间范围
-    now = datetime.now()
-    if time_range == 'day':
-        start_time = now - timedelta(days=1)
-    elif time_range == 'week':
-        start_time = now - timedelta(weeks=1)
+    now = time.time()
+    if time_range == 'week':
+        start_time = now - 7 * 24 * 3600
     elif time_range == 'month':
-        start_time = now - timedelta(days=30)
+        start_time = now - 30 * 24 * 3600
     else:
-        start_time = now - timedelta(days=1)
+        start_time = now - 24 * 3600
     
     try:
-        conn = sqlite3.connect(config['database_path'])
-        c = conn.cursor()
-        
-        # 查询数据
-        c.execute('''
-            SELECT strftime('%Y-%m-%d %H:%M', timestamp) as time,
-                   air_temp, humidity, water_temp
-            FROM sensor_data
-            WHERE timestamp >= ?
-            ORDER BY timestamp
-        ''', (start_time.strftime('%Y-%m-%d %H:%M:%S'),))
-        
-        data = c.fetchall()
-        conn.close()
+        tz_name = config.get('timezone', 'Asia/Shanghai')
+        oldest = sensor_ring.oldest_ts()
+        if since:
+            # 增量模式：cursor 为时间戳，也兼容 YYYY-MM-DD HH:MM:SS 格式
+            try:
+                since_ts = float(since)
+            except ValueError:
+                since_ts = parse_local_time(since, tz_name)
+            if since_tier:
+                # 汇总曲线只追加同一级别的时段，不混入原始数据
+                conn = get_connection()
+                tier, rows = since_tier, query_tier(conn, since_tier, since_ts, now)
+            elif oldest is not None and oldest <= since_ts:
+                tier, rows = 'memory', sensor_ring.since(since_ts, inclusive=False)
+            else:
+                # 按 idx_sensor_ts 索引范围查找，数据库时间精确到秒
+                conn = get_connection()
+                tier, rows = 'raw', query_raw(conn, int(since_ts) + 1, now)
+        elif time_range == 'day' and oldest is not None and oldest <= start_time + 3600:
+            # 24小时内的数据直接从内存缓冲区读取
+            tier, rows = 'memory', sensor_ring.since(start_time)
+        else:
+            conn = get_connection()
+            tier, rows = query_series(conn, start_time, now)
+        
+        if max_points:
+            rows = lttb_rows(rows, max_points)
+        
+        # 下次增量请求的起点：原始数据取最后一条的时间，汇总数据取最后一个时段的起点
+        # （该时段可能还未结束，下次请求时重新返回）
+        if rows:
+            cursor = rows[-1][0]
+        elif since:
+            cursor = since_ts
+        elif tier in ('raw', 'memory'):
+            cursor = now
+        else:
+            cursor = bucket_start(now, dict(TIERS)[tier])
         
         # 格式化数据
-        times = [row[0] for row in data]
-        air_temps = [row[1] for row in data]
-        humidities = [row[2] for row in data]
-        water_temps = [row[3] for row in data]
+        tz = pytz.timezone(tz_name)
+        times, air_temps, humidities, water_temps = [], [], [], []
+        for ts, air_temp, humidity, water_temp in rows:
+            times.append(datetime.fromtimestamp(ts, tz).strftime('%Y-%m-%d %H:%M'))
+            air_temps.append(air_temp)
+            humidities.append(humidity)
+            water_temps.append(water_temp)
         
         return jsonify({
             "times": times,
             "air_temps": air_temps,
             "humidities": humidities,
-            "water_temps": water_temps
+            "water_temps": water_temps,
+            "tier": tier,
+            "cursor": cursor
         })
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# 最近N条传感器读数，从内存缓冲区读取 2026.10
+@app.route('/api/sensor/latest')
+def get_latest_sensor_data():
+    """获取最近N条传感器读数"""
+    n = max(1, min(request.args.get('n', 10, type=int), sensor_ring.capacity))
+    tz = pytz.timezone(config.get('timezone', 'Asia/Shanghai'))
+    return jsonify([{
+        'time': datetime.fromtimestamp(ts, tz).strftime('%Y-%m-%d %H:%M:%S'),
+        'air_temp': air_temp,
+        'humidity': humidity,
+        'water_temp': water_temp
+    } for ts, air_temp, humidity, water_temp in sensor_ring.latest(n)])
+
 @app.route('/api/check_network')
 def check_network():
     """检查当前是否是内网访问"""
@@ -1439,7 +1594,7 @@ def signin():
         signin_time = get_local_time()
         
         # 插入数据库
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         c.execute('''
             INSERT INTO signin_records 
@@ -1447,106 +1602,91 @@ def signin():
             VALUES (?, ?, ?)
         ''', (client_ip, user_agent, signin_time))
         conn.commit()
-        conn.close()
 
         
-        if beep_buzzer(5):
-            logger.info(f"签到记录: IP={client_ip}, Time={signin_time}")        
-            return jsonify({
-                'status': 'success',
-                'message': '签到成功',
-                'ip': client_ip,
-                'time': signin_time
-            })
+        # 蜂鸣提示放入队列，不等待
+        buzzer.play('signin')
+        logger.info(f"签到记录: IP={client_ip}, Time={signin_time}")        
+        return jsonify({
+            'status': 'success',
+            'message': '签到成功',
+            'ip': client_ip,
+            'time': signin_time
+        })
     
     except Exception as e:
         logger.error(f"签到失败: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# 修改访问统计函数，从数据库查询
+# 访问统计，只查询按小时/按天的汇总表 2026.10
 @app.route('/api/access/stats')
 def get_access_stats():
     """获取访问统计数据（按独立IP统计）"""
     try:
         time_range = request.args.get('range', 'day')  # day, week, month
         
-        # 计算时间范围
+        # 计算时间范围，最后一个时段为当前未结束的时段，由写线程实时累加
         now = time.time()
-        if time_range == 'day':
-            start_time = now - 24 * 3600
-        elif time_range == 'week':
-            start_time = now - 7 * 24 * 3600
+        if time_range == 'week':
+            days = 7
         elif time_range == 'month':
-            start_time = now - 30 * 24 * 3600
+            days = 30
         else:
-            start_time = now - 24 * 3600
+            time_range = 'day'
+            days = 0
         
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
+        if time_range == 'day':
+            # 最近24个整点时段
+            start_bucket = hour_bucket(now) - 23 * 3600
+            total_table, ip_table = 'access_rollup_hourly', 'access_ip_hourly'
+        else:
+            start_bucket = day_bucket(now - (days - 1) * 24 * 3600)
+            total_table, ip_table = 'access_rollup_daily', 'access_ip_daily'
+        
         # 查询总访问量（按独立IP）
-        c.execute('''
-            SELECT COUNT(DISTINCT ip_address) FROM access_records 
-            WHERE start_time >= ? AND end_time IS NOT NULL
-        ''', (start_time,))
+        c.execute(f'''
+            SELECT COUNT(DISTINCT ip_address) FROM {ip_table}
+            WHERE bucket >= ?
+        ''', (start_bucket,))
         unique_ips = c.fetchone()[0]
         
         # 查询总请求数
-        c.execute('''
-            SELECT COUNT(*) FROM access_records 
-            WHERE start_time >= ? AND end_time IS NOT NULL
-        ''', (start_time,))
+        c.execute(f'''
+            SELECT COALESCE(SUM(requests), 0) FROM {total_table}
+            WHERE bucket >= ?
+        ''', (start_bucket,))
         total_requests = c.fetchone()[0]
         
-        # 按时间分组统计独立IP数量
-        if time_range == 'day':
-            # 按小时统计独立IP
-            c.execute('''
-                SELECT strftime('%H:00', datetime(start_time, 'unixepoch', 'localtime')) as hour,
-                       COUNT(DISTINCT ip_address) as unique_ips
-                FROM access_records 
-                WHERE start_time >= ? AND end_time IS NOT NULL
-                GROUP BY hour
-                ORDER BY hour
-            ''', (start_time,))
-        elif time_range == 'week':
-            # 按天统计独立IP
-            c.execute('''
-                SELECT date(datetime(start_time, 'unixepoch', 'localtime')) as day,
-                       COUNT(DISTINCT ip_address) as unique_ips
-                FROM access_records 
-                WHERE start_time >= ? AND end_time IS NOT NULL
-                GROUP BY day
-                ORDER BY day
-            ''', (start_time,))
-        else:  # month
-            # 按天统计独立IP
-            c.execute('''
-                SELECT date(datetime(start_time, 'unixepoch', 'localtime')) as day,
-                       COUNT(DISTINCT ip_address) as unique_ips
-                FROM access_records 
-                WHERE start_time >= ? AND end_time IS NOT NULL
-                GROUP BY day
-                ORDER BY day
-            ''', (start_time,))
-        
+        # 按时段统计独立IP数量
+        c.execute(f'''
+            SELECT bucket, COUNT(*) as unique_ips
+            FROM {ip_table}
+            WHERE bucket >= ?
+            GROUP BY bucket
+            ORDER BY bucket
+        ''', (start_bucket,))
         stats_data = c.fetchall()
         
         # 获取最活跃的IP地址（前10个）
-        c.execute('''
-            SELECT ip_address, COUNT(*) as visit_count,
-                   MAX(datetime(start_time, 'unixepoch', 'localtime')) as last_visit
-            FROM access_records 
-            WHERE start_time >= ? AND end_time IS NOT NULL
+        c.execute(f'''
+            SELECT ip_address, SUM(requests) as visit_count,
+                   datetime(MAX(last_visit), 'unixepoch', 'localtime') as last_visit
+            FROM {ip_table}
+            WHERE bucket >= ?
             GROUP BY ip_address
             ORDER BY visit_count DESC
             LIMIT 10
-        ''', (start_time,))
+        ''', (start_bucket,))
         top_ips = c.fetchall()
         
-        conn.close()
         
-        labels = [item[0] for item in stats_data]
+        if time_range == 'day':
+            labels = [time.strftime('%H:00', time.localtime(item[0])) for item in stats_data]
+        else:
+            labels = [item[0] for item in stats_data]
         values = [item[1] for item in stats_data]
         
         # 格式化最活跃IP数据
@@ -1576,7 +1716,7 @@ def get_access_stats():
 def get_ip_details(ip_address):
     """获取特定IP的详细访问信息"""
     try:
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
         # 获取IP基本信息
@@ -1591,14 +1731,17 @@ def get_ip_details(ip_address):
         
         ip_info = c.fetchone()
         
-        # 获取访问路径统计
+        # 获取访问路径统计，先按整数 path_id 分组，再取路径文本
         c.execute('''
-            SELECT path, COUNT(*) as visit_count,
-                   MAX(datetime(start_time, 'unixepoch', 'localtime')) as last_visit
-            FROM access_records 
-            WHERE ip_address = ? AND end_time IS NOT NULL
-            GROUP BY path
-            ORDER BY visit_count DESC
+            SELECT p.path, s.visit_count, datetime(s.last_visit, 'unixepoch', 'localtime')
+            FROM (
+                SELECT path_id, COUNT(*) as visit_count, MAX(start_time) as last_visit
+                FROM access_records
+                WHERE ip_address = ? AND end_time IS NOT NULL
+                GROUP BY path_id
+            ) s
+            JOIN access_paths p ON p.id = s.path_id
+            ORDER BY s.visit_count DESC
         ''', (ip_address,))
         
         path_stats = []
@@ -1613,7 +1756,7 @@ def get_ip_details(ip_address):
         c.execute('''
             SELECT datetime(start_time, 'unixepoch', 'localtime') as access_time,
                    path, method, duration, status_code
-            FROM access_records 
+            FROM access_records_text
             WHERE ip_address = ? AND end_time IS NOT NULL
             ORDER BY start_time DESC
             LIMIT 20
@@ -1629,7 +1772,6 @@ def get_ip_details(ip_address):
                 'status_code': row[4]
             })
         
-        conn.close()
         
         return jsonify({
             'ip_address': ip_address,
@@ -1645,6 +1787,68 @@ def get_ip_details(ip_address):
         logger.error(f"获取IP详情失败: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# 访问记录全文检索，按路径和 User-Agent 子串检索 2026.10
+@app.route('/api/access/search')
+def search_access_records():
+    """检索访问记录，field 为 path / user_agent / 空(两列)，before 为上一页最后一条的 id"""
+    try:
+        term = request.args.get('q', '')
+        field = request.args.get('field') or None
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        before_id = request.args.get('before', type=int)
+        
+        begin = time.perf_counter()
+        records, engine = search_access(get_connection(), term, field, limit, before_id)
+        return jsonify({
+            'records': records,
+            'engine': engine,
+            'next_before': records[-1]['id'] if len(records) == limit else None,
+            'elapsed_ms': round((time.perf_counter() - begin) * 1000, 2)
+        })
+    
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"检索访问记录失败: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# 后台任务查询 2026.10
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """查询投喂、水泵定时运行等后台任务的状态和结果"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': '任务不存在或已过期'}), 404
+    return jsonify({'status': 'success', 'job': job})
+
+@app.route('/api/jobs')
+def list_jobs():
+    """最近的后台任务，可按类型过滤"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 200))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit 必须是整数'}), 400
+    return jsonify({'status': 'success', 'jobs': jobs.recent(limit, request.args.get('kind'))})
+
+# 运行指标查询 2026.10
+@app.route('/api/metrics')
+def get_metrics():
+    """获取后台组件的运行统计"""
+    return jsonify({
+        'access_log': access_logger.get_stats(),
+        'retention': retention.get_stats(),
+        'scheduler': schedule_runner.get_stats(),
+        'actuators': actuators.get_stats(),
+        'jobs': jobs.get_stats(),
+        'system_sampler': system_sampler.get_stats(),
+        'state': state.get_stats(),
+        'motion_watcher': motion_watcher.get_stats(),
+        'buzzer': buzzer.get_stats(),
+        'leds': leds.get_stats(),
+        'sensor_ring': sensor_ring.get_stats(),
+        'db': dbconn.get_stats()
+    })
+
 # 签到记录查询，从数据库获取 2025.8.20
 @app.route('/api/signin/records')
 def get_signin_records():
@@ -1652,7 +1856,7 @@ def get_signin_records():
     try:
         limit = min(int(request.args.get('limit', 20)), 100)
         
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
         c.execute('''
@@ -1670,7 +1874,6 @@ def get_signin_records():
                 'time': row[2]  # 格式化后的时间
             })
         
-        conn.close()
         return jsonify(records)
     
     except Exception as e:
@@ -1682,7 +1885,7 @@ def get_signin_records():
 def get_signin_stats():
     """获取签到统计数据"""
     try:
-        conn = sqlite3.connect(config['database_path'])
+        conn = get_connection()
         c = conn.cursor()
         
         # 总签到次数
@@ -1701,7 +1904,6 @@ def get_signin_stats():
         ''')
         today_signins = c.fetchone()[0]
         
-        conn.close()
         
         return jsonify({
             'total_signins': total_signins,
@@ -1724,7 +1926,9 @@ def main():
     
     # 初始化硬件
     init_gpio()
-    init_led_strip()
+    # 启动灯带渲染线程，灯带初始化后显示闲置颜色
+    leds.start()
+    leds.solid(config.get('idle_color', [0, 0, 0]))
     
     #read_dht11() # 首次读取温湿度
     # 初始化舵机
@@ -1732,8 +1936,22 @@ def main():
      # 注册退出清理函数
     atexit.register(cleanup_resources)
 
+    # 升级数据库结构（只执行尚未执行的迁移）
+    opendb.migrate_until_current()
 
-    # 启动传感器读取线程
+    # 启动访问记录写线程
+    access_logger.start()
+
+    # 启动过期数据清理线程
+    retention.start()
+
+    # 启动系统指标采样线程和蜂鸣器播放线程
+    system_sampler.start()
+    buzzer.start()
+
+
+    # 加载最近的传感器数据到内存，再启动传感器读取线程
+    load_sensor_ring()
     sensor_thread = threading.Thread(target=sensor_reading_task, daemon=True)
     sensor_thread.start()
     
@@ -1741,15 +1959,30 @@ def main():
     monitor_thread = threading.Thread(target=monitor_motion_connections, daemon=True)
     monitor_thread.start()
 
-    # 启动计划检查线程
-    feeding_thread = threading.Thread(target=check_feeding_schedules, daemon=True)
-    feeding_thread.start()
+    # 启动执行器队列和定时计划调度线程
+    actuators.start()
+    schedule_runner.start()
     
     # 启动Web服务
     app.run(host='0.0.0.0', port=5000, threaded=True)
 
+_cleaned_up = False
+
 def cleanup_resources():
-    """清理资源"""
+    """清理资源，只执行一次；蜂鸣器、灯带、执行器等用到引脚的线程在这里停止，须在 GPIO.cleanup() 之前调用"""
+    global _cleaned_up
+    if _cleaned_up:
+        return
+    _cleaned_up = True
+    # 写完队列中剩余的访问记录
+    access_logger.stop()
+    retention.stop()
+    schedule_runner.stop()
+    actuators.stop()
+    system_sampler.stop()
+    buzzer.stop()
+    leds.stop()  # 熄灭灯带
+    dbconn.close_all()
     if 'servo' in globals():
         try:
             servo.cleanup()
@@ -1763,9 +1996,8 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info("程序终止")
     finally:
-        # 清理资源
-        if strip is not None:
-            set_all_leds(Color(0, 0, 0))
+        # 先停止用到引脚的线程（蜂鸣器停止时会再关闭一次引脚），再释放 GPIO，atexit 时不再重复清理
+        cleanup_resources()
         GPIO.cleanup()
 
 
@@ -0,0 +1,1193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能测试脚本
+不依赖树莓派硬件，在临时数据库上生成模拟数据后计时
+
+用法：
+python3 bench.py access_write [--sizes 0,100000,300000] [--requests 200]
+python3 bench.py sensor_range [--days 90]
+python3 bench.py lttb_check [--cases 50]
+python3 bench.py access_search [--rows 300000]
+python3 bench.py access_dict [--rows 300000]
+python3 bench.py migrate_lock [--rows 300000]
+python3 bench.py schedule_week [--seed 1]
+python3 bench.py actuator_queue [--scale 0.1]
+python3 bench.py status_poll [--clients 20] [--seconds 60] [--interval 5]
+python3 bench.py sse_events [--seconds 30]
+python3 bench.py conn_watch [--extra 2000]
+python3 bench.py led_frames [--pixels 60] [--seconds 3]
+"""
+
+import os
+import json
+import sys
+import time
+import uuid
+import sqlite3
+import random
+import argparse
+import socket
+import http.client
+import multiprocessing
+import threading
+import tempfile
+import statistics
+from datetime import datetime
+
+import pytz
+import psutil
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from sensorstore import query_raw, migrate_epoch
+import dbconn
+import downsample
+from accesssearch import search_like, search_fts
+from opendb import migrate
+from scheduler import Scheduler
+from actuators import ActuatorExecutor, PRIORITY_MANUAL, PRIORITY_SCHEDULE
+from statestore import StateStore, sse_stream
+from connwatch import parse_established, read_established, psutil_established
+from ledengine import LedEngine
+
+ACCESS_RECORDS_DDL = '''
+    CREATE TABLE IF NOT EXISTS access_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id TEXT NOT NULL,
+        ip_address TEXT NOT NULL,
+        path TEXT NOT NULL,
+        method TEXT NOT NULL,
+        user_agent TEXT,
+        start_time REAL NOT NULL,
+        end_time REAL,
+        duration REAL,
+        status_code INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+USER_AGENT = ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 '
+              '(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1')
+
+
+def create_access_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute(ACCESS_RECORDS_DDL)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_access_ip ON access_records(ip_address)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_access_time ON access_records(start_time)')
+    conn.commit()
+    conn.close()
+
+
+def fill_access_records(path, count, start_time=None):
+    """批量生成模拟访问记录"""
+    if count <= 0:
+        return
+    now = start_time or time.time() - count * 5
+    conn = sqlite3.connect(path)
+    batch = []
+    for i in range(count):
+        t = now + i * 5
+        batch.append((str(uuid.uuid4()), f"192.168.0.{i % 50}", '/status', 'GET',
+                      USER_AGENT, t, t + 0.02, 0.02, 200))
+        if len(batch) >= 10000:
+            conn.executemany('''
+                INSERT INTO access_records
+                (request_id, ip_address, path, method, user_agent, start_time, end_time, duration, status_code)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+            batch = []
+    if batch:
+        conn.executemany('''
+            INSERT INTO access_records
+            (request_id, ip_address, path, method, user_agent, start_time, end_time, duration, status_code)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+    conn.commit()
+    conn.close()
+
+
+def bench_access_write(args):
+    """对比旧的 INSERT+UPDATE 写法和现在的单次批量写入，每请求耗时是否随表增大而增长"""
+    sizes = [int(s) for s in args.sizes.split(',')]
+    requests = args.requests
+    print(f"{'表行数':>10} | {'INSERT+UPDATE(ms/请求)':>22} | {'单次批量写入(ms/请求)':>22}")
+    print("-" * 62)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        create_access_db(path)
+        current = 0
+        for size in sizes:
+            fill_access_records(path, size - current)
+            current = size
+
+            # 旧写法：每个请求两个连接，先 INSERT 再按 request_id UPDATE（无索引，全表扫描）
+            begin = time.perf_counter()
+            for _ in range(requests):
+                request_id = str(uuid.uuid4())
+                t = time.time()
+                conn = sqlite3.connect(path)
+                conn.execute('''
+                    INSERT INTO access_records
+                    (request_id, ip_address, path, method, user_agent, start_time)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (request_id, '192.168.0.1', '/status', 'GET', USER_AGENT, t))
+                conn.commit()
+                conn.close()
+                conn = sqlite3.connect(path)
+                conn.execute('''
+                    UPDATE access_records
+                    SET end_time = ?, duration = ?, status_code = ?
+                    WHERE request_id = ?
+                ''', (t + 0.02, 0.02, 200, request_id))
+                conn.commit()
+                conn.close()
+            old_cost = (time.perf_counter() - begin) * 1000 / requests
+
+            # 新写法：请求结束时生成完整记录，写线程一个事务批量写入
+            rows = []
+            for _ in range(requests):
+                t = time.time()
+                rows.append((str(uuid.uuid4()), '192.168.0.1', '/status', 'GET',
+                             USER_AGENT, t, t + 0.02, 0.02, 200))
+            begin = time.perf_counter()
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.executemany('''
+                    INSERT INTO access_records
+                    (request_id, ip_address, path, method, user_agent,
+                     start_time, end_time, duration, status_code)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            conn.close()
+            new_cost = (time.perf_counter() - begin) * 1000 / requests
+            current += requests * 2
+
+            print(f"{size:>10} | {old_cost:>22.3f} | {new_cost:>22.3f}")
+
+
+SENSOR_DATA_DDL = '''
+    CREATE TABLE IF NOT EXISTS sensor_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+        air_temp REAL,
+        humidity REAL,
+        water_temp REAL,
+        ts INTEGER
+    )
+'''
+
+
+def _median_ms(func, repeat):
+    costs = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        costs.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(costs)
+
+
+def bench_sensor_range(args):
+    """对比文本时间列 + strftime 与整数时间戳列的一个月范围查询，以及旧数据迁移速度"""
+    tz_name = 'Asia/Shanghai'
+    tz = pytz.timezone(tz_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(path)
+        conn.execute(SENSOR_DATA_DDL)
+        conn.execute('CREATE INDEX idx_timestamp ON sensor_data (timestamp)')
+        conn.execute('CREATE INDEX idx_sensor_ts ON sensor_data (ts)')
+
+        # 每分钟一条模拟数据，先只写文本时间（旧格式）
+        now = int(time.time())
+        count = args.days * 24 * 60
+        start = now - count * 60
+        rows = []
+        for i in range(count):
+            ts = start + i * 60
+            rows.append((datetime.fromtimestamp(ts, tz).strftime('%Y-%m-%d %H:%M:%S'),
+                         25 + (i % 100) / 100, 60.0, 27 + (i % 50) / 100))
+        conn.executemany('''
+            INSERT INTO sensor_data (timestamp, air_temp, humidity, water_temp)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        print(f"模拟数据: {count} 条 ({args.days} 天)")
+
+        # 在线迁移速度
+        begin = time.perf_counter()
+        migrated = migrate_epoch(conn, tz_name, batch_size=2000, pause=0)
+        cost = time.perf_counter() - begin
+        print(f"时间戳迁移: {migrated} 条，{cost:.2f} 秒，{migrated / cost:.0f} 条/秒")
+
+        month_start = now - 30 * 24 * 3600
+
+        def old_query():
+            text_start = datetime.fromtimestamp(month_start, tz).strftime('%Y-%m-%d %H:%M:%S')
+            data = conn.execute('''
+                SELECT strftime('%Y-%m-%d %H:%M', timestamp) as time,
+                       air_temp, humidity, water_temp
+                FROM sensor_data
+                WHERE timestamp >= ?
+                ORDER BY timestamp
+            ''', (text_start,)).fetchall()
+            return [row[0] for row in data]
+
+        def new_query():
+            return query_raw(conn, month_start, now)
+
+        old_cost = _median_ms(old_query, args.repeat)
+        new_cost = _median_ms(new_query, args.repeat)
+        print(f"一个月范围查询（{len(new_query())} 条）:")
+        print(f"  文本时间 + strftime: {old_cost:.1f} ms")
+        print(f"  整数时间戳:          {new_cost:.1f} ms")
+        conn.close()
+
+
+def _spiky_series(rng, length, threshold):
+    """
+    每分钟一点的水温曲线：小幅噪声上有一个升高尖峰和一个下降尖峰，
+    两个尖峰在 LTTB 的不同分段中（同一分段只能保留一个点）
+    """
+    start = 1760000000
+    xs = [start + i * 60 for i in range(length)]
+    ys = [25 + rng.uniform(-0.05, 0.05) for _ in range(length)]
+    buckets = downsample._bucket_bounds(length, threshold)
+    if len(buckets) >= 2:
+        high, low = rng.sample(buckets, 2)
+        ys[rng.randrange(high[0], high[1])] = 25 + rng.uniform(5, 10)
+        ys[rng.randrange(low[0], low[1])] = 25 - rng.uniform(5, 10)
+    return xs, ys
+
+
+def bench_lttb_check(args):
+    """
+    检查 LTTB 降采样：返回点数正好为 threshold、保留首尾点、保留尖峰曲线的最大最小值，
+    NumPy 与纯 Python 实现的结果相同；再对比两种实现的耗时
+    """
+    rng = random.Random(args.seed)
+    failed = 0
+    cases = [(10, 4), (100, 99), (1441, 300), (5000, 7), (10080, 500), (43200, 1000)]
+    for _ in range(args.cases):
+        length = rng.randrange(10, 20000)
+        cases.append((length, rng.randrange(4, length)))
+
+    for length, threshold in cases:
+        xs, ys = _spiky_series(rng, length, threshold)
+        picked = downsample._lttb_python(xs, ys, threshold)
+        errors = []
+        if len(picked) != threshold:
+            errors.append(f"点数 {len(picked)}")
+        if picked[0] != 0 or picked[-1] != length - 1:
+            errors.append("首尾点")
+        if any(b <= a for a, b in zip(picked, picked[1:])):
+            errors.append("下标不递增")
+        if ys.index(max(ys)) not in picked or ys.index(min(ys)) not in picked:
+            errors.append("最大/最小值")
+        if downsample.np is not None and downsample._lttb_numpy(xs, ys, threshold) != picked:
+            errors.append("NumPy 结果不同")
+
+        # lttb_rows：单条曲线与 lttb_indices 相同（正好 max_points 行）
+        rows = [(x, y) for x, y in zip(xs, ys)]
+        if downsample.lttb_rows(rows, threshold) != [rows[i] for i in picked]:
+            errors.append("lttb_rows 单曲线")
+        # 多条曲线（含空值）：不超过 max_points 行，包含每条曲线在非空值上 LTTB 选中的行
+        rows = [(x, y, None if i % 7 == 0 else -y) for i, (x, y) in enumerate(zip(xs, ys))]
+        merged = downsample.lttb_rows(rows, threshold)
+        if len(merged) > threshold:
+            errors.append(f"lttb_rows 多曲线 {len(merged)} 行")
+        budget = threshold // 2
+        if budget >= 3:
+            for col in (1, 2):
+                valid = [r for r in rows if r[col] is not None]
+                chosen = downsample.lttb_indices([r[0] for r in valid], [r[col] for r in valid], budget)
+                if not {valid[k] for k in chosen} <= set(merged):
+                    errors.append(f"lttb_rows 第{col}条曲线")
+
+        failed += bool(errors)
+        if errors or args.verbose:
+            print(f"{length:>6} -> {threshold:>5}: {'，'.join(errors) or '通过'}")
+
+    # 平坦曲线（所有三角形面积相同）两种实现也要选同样的点
+    flat = [25.0] * 1000
+    flat_xs = list(range(1000))
+    if downsample.np is not None and (downsample._lttb_numpy(flat_xs, flat, 50)
+                                      != downsample._lttb_python(flat_xs, flat, 50)):
+        failed += 1
+        print("平坦曲线: NumPy 结果不同")
+
+    print(f"检查 {len(cases)} 组，失败 {failed} 组"
+          f"{'' if downsample.np is not None else '（未安装 NumPy，只检查纯 Python 实现）'}")
+
+    xs, ys = _spiky_series(rng, 43200, 1000)
+    python_ms = _median_ms(lambda: downsample._lttb_python(xs, ys, 1000), args.repeat)
+    print(f"一个月每分钟数据 43200 点 -> 1000 点: 纯 Python {python_ms:.1f} ms", end='')
+    if downsample.np is not None:
+        numpy_ms = _median_ms(lambda: downsample._lttb_numpy(xs, ys, 1000), args.repeat)
+        print(f"，NumPy {numpy_ms:.1f} ms", end='')
+    print()
+    if failed:
+        sys.exit(1)
+
+
+SEARCH_USER_AGENTS = [
+    USER_AGENT,
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/118.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/118.0.0.0 Mobile Safari/537.36',
+    'python-requests/2.31.0',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+]
+SEARCH_PATHS = ['/status', '/sensor_data', '/api/access/stats', '/feed', '/', '/api/metrics']
+
+
+def fill_mixed_access_records(conn, count):
+    """旧表结构下生成模拟访问记录：大部分是仪表盘轮询，少量爬虫和扫描器"""
+    now = time.time() - count * 5
+    rows = []
+    for i in range(count):
+        t = now + i * 5
+        if i % 997 == 0:
+            ua, req_path = 'Mozilla/5.0 zgrab/0.x', f'/wp-login.php?id={i}'
+        else:
+            ua, req_path = SEARCH_USER_AGENTS[i % len(SEARCH_USER_AGENTS)], SEARCH_PATHS[i % len(SEARCH_PATHS)]
+        rows.append((str(uuid.uuid4()), f"192.168.0.{i % 50}", req_path, 'GET',
+                     ua, t, t + 0.02, 0.02, 200))
+    conn.executemany('''
+        INSERT INTO access_records
+        (request_id, ip_address, path, method, user_agent, start_time, end_time, duration, status_code)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+
+
+def migrate_bench_db(path):
+    """在临时数据库上执行全部结构迁移，返回耗时（秒）"""
+    begin = time.perf_counter()
+    migrate(path)
+    dbconn.close_all()
+    return time.perf_counter() - begin
+
+
+def _timed_writer(path, stop, waits, errors, busy_timeout):
+    """模拟 fishtank.py：每50毫秒写一条传感器数据，记录每次写入的等待时间和失败次数"""
+    conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+    while not stop.is_set():
+        begin = time.perf_counter()
+        try:
+            conn.execute('INSERT INTO sensor_data (ts, air_temp, humidity, water_temp) VALUES (?, 25, 60, 27)',
+                         (int(time.time()),))
+            waits.append((time.perf_counter() - begin) * 1000)
+        except sqlite3.OperationalError:
+            errors.append(time.perf_counter())
+        time.sleep(0.05)
+    conn.close()
+
+
+def bench_migrate_lock(args):
+    """
+    版本5的数据库（--rows 条旧格式访问记录）升级到最新版本时，另一个进程写入传感器数据的等待时间
+    对比分批转换（默认每批 opendb.BACKFILL_BATCH 条）与一次转换全部记录（相当于整个迁移一个事务）
+    """
+    import opendb
+    results = []
+    for label, batch in (('一次转换', 10 ** 9), ('分批转换', opendb.BACKFILL_BATCH)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            create_access_db(path)
+            conn = sqlite3.connect(path)
+            fill_mixed_access_records(conn, args.rows)
+            for target, _, func, _ in opendb.MIGRATIONS[:5]:
+                func(conn.cursor())
+            conn.execute('PRAGMA user_version = 5')
+            conn.commit()
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.close()
+
+            stop = threading.Event()
+            waits, errors = [], []
+            writer = threading.Thread(target=_timed_writer, args=(path, stop, waits, errors, args.busy_timeout))
+            writer.start()
+            opendb.BACKFILL_BATCH = batch
+            try:
+                cost = migrate_bench_db(path)
+            finally:
+                stop.set()
+                writer.join()
+                opendb.BACKFILL_BATCH = batch
+            conn = sqlite3.connect(path)
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            count = conn.execute('SELECT COUNT(*) FROM access_records').fetchone()[0]
+            fts = conn.execute("SELECT COUNT(*) FROM access_fts WHERE access_fts MATCH '\"login\"'").fetchone()[0]
+            conn.close()
+            results.append((label, cost, max(waits or [0]), len(errors), version, count, fts))
+
+    print(f"{args.rows} 条访问记录，写入方 busy_timeout {args.busy_timeout} 秒")
+    print(f"{'方式':>8} | {'迁移秒':>7} | {'写入最长等待ms':>14} | {'写入失败':>8} | 版本 | 记录数 | 全文检索 login")
+    print("-" * 80)
+    for label, cost, wait, failed, version, count, fts in results:
+        print(f"{label:>8} | {cost:>7.2f} | {wait:>14.1f} | {failed:>8} | {version:>4} | {count:>6} | {fts}")
+    if any(r[4:] != results[0][4:] for r in results) or results[-1][3]:
+        sys.exit(1)
+
+
+def _vacuum_size(conn, path):
+    """VACUUM 后的数据库文件大小（MB）"""
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(path) / 1024 / 1024
+
+
+def bench_access_search(args):
+    """对比 LIKE '%...%' 扫描和 FTS5 trigram 全文索引检索路径 / User-Agent"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        create_access_db(path)
+        conn = sqlite3.connect(path)
+        fill_mixed_access_records(conn, args.rows)
+        conn.close()
+        cost = migrate_bench_db(path)
+        print(f"模拟数据: {args.rows} 条，迁移（含建立全文索引）{cost:.2f} 秒")
+        conn = sqlite3.connect(path)
+        print(f"数据库大小: {_vacuum_size(conn, path):.1f}MB")
+
+        print(f"{'检索词':>16} | {'字段':>10} | {'LIKE(ms)':>10} | {'FTS5(ms)':>10} | {'结果':>6}")
+        print("-" * 66)
+        for term, field in (('zgrab', 'user_agent'), ('wp-login', 'path'), ('Googlebot', None),
+                            ('python-requests', 'user_agent'), ('Pixel 7', None)):
+            like_rows = search_like(conn, term, field, args.limit)
+            fts_rows = search_fts(conn, term, field, args.limit)
+            assert [r['id'] for r in like_rows] == [r['id'] for r in fts_rows]
+            like_cost = _median_ms(lambda: search_like(conn, term, field, args.limit), args.repeat)
+            fts_cost = _median_ms(lambda: search_fts(conn, term, field, args.limit), args.repeat)
+            print(f"{term:>16} | {field or '全部':>10} | {like_cost:>10.1f} | {fts_cost:>10.1f} | {len(fts_rows):>6}")
+        conn.close()
+
+
+def bench_access_dictionary(args):
+    """路径和 User-Agent 改为字典表ID前后的数据库大小，以及按IP统计路径的查询耗时"""
+    ip = '192.168.0.7'
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        create_access_db(path)
+        conn = sqlite3.connect(path)
+        fill_mixed_access_records(conn, args.rows)
+        before_size = _vacuum_size(conn, path)
+
+        def old_query():
+            return conn.execute('''
+                SELECT path, COUNT(*) as visit_count,
+                       MAX(datetime(start_time, 'unixepoch', 'localtime')) as last_visit
+                FROM access_records
+                WHERE ip_address = ? AND end_time IS NOT NULL
+                GROUP BY path
+                ORDER BY visit_count DESC
+            ''', (ip,)).fetchall()
+
+        def old_scan():
+            return conn.execute('''
+                SELECT user_agent, COUNT(*) FROM access_records GROUP BY user_agent
+            ''').fetchall()
+
+        old_cost = _median_ms(old_query, args.repeat)
+        old_scan_cost = _median_ms(old_scan, args.repeat)
+        expected = sorted(old_query())
+        conn.close()
+
+        cost = migrate_bench_db(path)
+        conn = sqlite3.connect(path)
+        if not args.keep_fts:
+            # 只比较字典编码本身，去掉全文索引
+            for trigger in ('access_fts_insert', 'access_fts_delete', 'access_fts_update'):
+                conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            conn.execute('DROP TABLE IF EXISTS access_fts')
+            conn.commit()
+        after_size = _vacuum_size(conn, path)
+
+        def new_query():
+            return conn.execute('''
+                SELECT p.path, s.visit_count, datetime(s.last_visit, 'unixepoch', 'localtime')
+                FROM (
+                    SELECT path_id, COUNT(*) as visit_count, MAX(start_time) as last_visit
+                    FROM access_records
+                    WHERE ip_address = ? AND end_time IS NOT NULL
+                    GROUP BY path_id
+                ) s
+                JOIN access_paths p ON p.id = s.path_id
+                ORDER BY s.visit_count DESC
+            ''', (ip,)).fetchall()
+
+        def new_scan():
+            return conn.execute('''
+                SELECT u.user_agent, s.n
+                FROM (SELECT ua_id, COUNT(*) as n FROM access_records GROUP BY ua_id) s
+                LEFT JOIN access_user_agents u ON u.id = s.ua_id
+            ''').fetchall()
+
+        assert sorted(new_query()) == expected
+        new_cost = _median_ms(new_query, args.repeat)
+        new_scan_cost = _median_ms(new_scan, args.repeat)
+        conn.close()
+
+        print(f"模拟数据: {args.rows} 条，迁移耗时 {cost:.2f} 秒")
+        print(f"{'':>24} | {'文本列':>10} | {'字典ID':>10}")
+        print("-" * 52)
+        print(f"{'数据库大小(MB)':>24} | {before_size:>10.1f} | {after_size:>10.1f}")
+        print(f"{'IP路径统计(ms)':>24} | {old_cost:>10.1f} | {new_cost:>10.1f}")
+        print(f"{'全表按UA分组(ms)':>24} | {old_scan_cost:>10.1f} | {new_scan_cost:>10.1f}")
+
+
+class FakeClock:
+    """模拟时钟，执行计划和睡眠只推进时间，不真正等待"""
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+BENCH_SCHEDULES = [
+    {'id': 1, 'schedule_name': '早上喂食', 'feed_time': '08:00', 'feed_days': '0,1,2,3,4,5,6', 'cost': 15},
+    {'id': 2, 'schedule_name': '开风扇', 'feed_time': '08:00', 'feed_days': '1,2,3,4,5', 'cost': 0.1},
+    {'id': 3, 'schedule_name': '开气泵', 'feed_time': '08:01', 'feed_days': '0,1,2,3,4,5,6', 'cost': 0.1},
+    {'id': 4, 'schedule_name': '灌溉', 'feed_time': '12:30', 'feed_days': '0,3,6', 'cost': 60},
+    {'id': 5, 'schedule_name': '晚上喂食', 'feed_time': '20:00', 'feed_days': '0,1,2,3,4,5,6', 'cost': 15},
+    {'id': 6, 'schedule_name': '关气泵', 'feed_time': '23:59', 'feed_days': '0,6', 'cost': 0.1},
+    {'id': 7, 'schedule_name': '午夜', 'feed_time': '00:00', 'feed_days': '1,4', 'cost': 0.1},
+]
+
+
+def expected_fires(schedules, start, end):
+    """逐分钟枚举 (start, end] 内应执行的计划"""
+    fires = []
+    t = int(start) - int(start) % 60 + 60
+    while t <= end:
+        lt = datetime.fromtimestamp(t)
+        hm = lt.strftime('%H:%M')
+        weekday = str((lt.weekday() + 1) % 7)
+        for s in schedules:
+            if s['feed_time'] == hm and weekday in s['feed_days'].split(','):
+                fires.append((s['id'], t))
+        t += 60
+    return sorted(fires)
+
+
+def bench_schedule_week(args):
+    """用模拟时钟运行一周，检查堆调度没有漏执行或重复执行，并与旧的每60秒轮询对比"""
+    rng = random.Random(args.seed)
+    start = datetime(2026, 10, 5, 7, 58, 30).timestamp()
+    end = start + 7 * 24 * 3600
+    expected = expected_fires(BENCH_SCHEDULES, start, end)
+
+    # 堆调度：唤醒时间随机推迟，计划执行耗时推进时钟，中途随机修改计划（重建堆）
+    clock = FakeClock(start)
+    fired = []
+
+    def execute(schedule, fire_time):
+        fired.append((schedule['id'], fire_time))
+        clock.advance(schedule['cost'])
+
+    scheduler = Scheduler(lambda: list(BENCH_SCHEDULES), execute, clock=clock)
+    reloads = 0
+    while clock.now < end:
+        timeout = scheduler.run_pending()
+        clock.advance(timeout + rng.choice([0, 0, 0, 0.5, 3, 45, 90]))
+        if rng.random() < 0.05:
+            scheduler.reload()
+            reloads += 1
+    scheduler.run_pending()
+    fired = sorted(f for f in fired if f[1] <= end)
+    missed = len(set(expected) - set(fired))
+    doubled = len(fired) - len(set(fired))
+    extra = len(set(fired) - set(expected))
+
+    # 旧写法：每次循环匹配当前 HH:MM，执行完再 sleep(60)
+    clock = FakeClock(start)
+    old_fired = []
+    while clock.now < end:
+        lt = datetime.fromtimestamp(clock.now)
+        hm, weekday = lt.strftime('%H:%M'), str((lt.weekday() + 1) % 7)
+        minute = int(clock.now) - int(clock.now) % 60
+        for s in BENCH_SCHEDULES:
+            if s['feed_time'] == hm and weekday in s['feed_days']:
+                old_fired.append((s['id'], minute))
+                clock.advance(s['cost'])
+        clock.advance(60 + rng.choice([0, 0, 0, 0.5, 3]))
+    old_missed = len(set(expected) - set(old_fired))
+    old_doubled = len(old_fired) - len(set(old_fired))
+
+    print(f"模拟一周，应执行 {len(expected)} 次，堆调度期间重建 {reloads} 次")
+    print(f"{'':>12} | {'执行':>6} | {'漏执行':>6} | {'重复':>6}")
+    print("-" * 42)
+    print(f"{'每60秒轮询':>12} | {len(old_fired):>6} | {old_missed:>6} | {old_doubled:>6}")
+    print(f"{'堆调度':>12} | {len(fired):>6} | {missed:>6} | {doubled + extra:>6}")
+    print(f"堆调度最大延迟 {scheduler.get_stats()['max_delay']} 秒")
+    if missed or doubled or extra:
+        sys.exit(1)
+
+
+def bench_actuator_queue(args):
+    """
+    同一分钟到期的喂食、风扇、气泵、灌溉计划，加一次手动投喂和一次手动开风扇，
+    对比在调度线程中依次执行与按设备队列并行执行的等待时间，并检查同一设备的动作没有重叠
+    动作耗时按 --scale 缩放（舵机每份约2秒）
+    """
+    feed = 2.0 * args.scale * args.portions
+    switch = 0.01 * args.scale
+    # (设备, 动作名, 耗时, 优先级)
+    actions = [
+        ('servo', 'schedule:feed', feed, PRIORITY_SCHEDULE),
+        ('fan', 'schedule:fan', switch, PRIORITY_SCHEDULE),
+        ('air_pump', 'schedule:air_pump', switch, PRIORITY_SCHEDULE),
+        ('water_pump', 'schedule:water', switch, PRIORITY_SCHEDULE),
+        ('servo', 'manual:feed', feed, PRIORITY_MANUAL),
+        ('fan', 'manual:fan', switch, PRIORITY_MANUAL),
+    ]
+
+    active = {}
+    overlaps = [0]
+
+    def make_action(device, duration):
+        def action():
+            active[device] = active.get(device, 0) + 1
+            if active[device] > 1:
+                overlaps[0] += 1
+            time.sleep(duration)
+            active[device] -= 1
+        return action
+
+    # 依次执行：后面的动作要等前面的全部完成
+    begin = time.perf_counter()
+    serial = {}
+    for device, name, duration, _ in actions:
+        serial[name] = time.perf_counter() - begin
+        make_action(device, duration)()
+    serial_total = time.perf_counter() - begin
+
+    # 按设备队列执行
+    executor = ActuatorExecutor()
+    executor.start()
+    begin = time.perf_counter()
+    jobs = [(name, executor.submit(device, make_action(device, duration), priority=priority, name=name))
+            for device, name, duration, priority in actions]
+    for _, job in jobs:
+        job.wait()
+    queued_total = time.perf_counter() - begin
+    queued = {name: job.started - job.submitted for name, job in jobs}
+    stats = executor.get_stats()
+    executor.stop()
+
+    print(f"{'动作':>18} | {'依次执行等待ms':>14} | {'设备队列等待ms':>14}")
+    print("-" * 54)
+    for _, name, _, _ in actions:
+        print(f"{name:>18} | {serial[name] * 1000:>14.1f} | {queued[name] * 1000:>14.1f}")
+    print(f"全部完成耗时: 依次执行 {serial_total * 1000:.1f}ms，设备队列 {queued_total * 1000:.1f}ms")
+    for device, s in stats.items():
+        print(f"{device:>12}: 执行 {s['executed']}，平均等待 {s['wait_ms_avg']}ms，"
+              f"最大等待 {s['wait_ms_max']}ms，平均耗时 {s['run_ms_avg']}ms")
+    print(f"同一设备动作重叠次数: {overlaps[0]}")
+    if overlaps[0]:
+        sys.exit(1)
+
+
+def _status_fields(rng):
+    """模拟 /status 的各字段"""
+    return {
+        "active": False, "connections": 0, "last_activity": time.time(),
+        "cpu_temp": round(rng.uniform(45, 55), 1), "mem_usage": round(rng.uniform(30, 40), 1),
+        "load": [0.3, 0.25, 0.2], "upload_speed": 1.2, "download_speed": 3.4,
+        "network": {"eth0": {"upload_speed": 1.2, "download_speed": 3.4}},
+        "water_temp": 28.1, "fan_enabled": False, "pump_enabled": True,
+        "water_pump_enabled": False, "water_level": "normal",
+        "temperature": 26.0, "humidity": 60.0, "last_feed_time": time.time() - 9000
+    }
+
+
+SYSTEM_FIELDS = ('cpu_temp', 'mem_usage', 'load', 'upload_speed', 'download_speed', 'network')
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _status_server(mode, change_interval, sensor_interval, port_queue):
+    """
+    子进程中运行的 /status 服务，便于单独统计服务端 CPU 时间
+    old：每次请求加全局锁读取各变量再 jsonify（连接监控线程每秒也持有该锁）
+    snapshot：读取状态快照，JSON 每个版本只序列化一次，ETag 相同时返回 304，系统指标也在快照中
+    split：同 snapshot，但系统指标不在快照中，快照只随传感器读数变化；与 app.py 相同，
+           响应中合并最近一次的系统指标（弱 ETag），同一版本、同一次采样只序列化一次
+    每 change_interval 秒模拟一次系统指标采样，每 sensor_interval 秒模拟一次传感器读数变化，0 为不变化
+    """
+    rng = random.Random(1)
+    fields = _status_fields(rng)
+    lock = threading.Lock()
+    if mode == 'split':
+        store = StateStore({k: v for k, v in fields.items() if k not in SYSTEM_FIELDS})
+    else:
+        store = StateStore(fields)
+    system = {k: fields[k] for k in SYSTEM_FIELDS}  # split 模式的最近一次采样，整体替换
+    body_cache = [None, None, None]
+    app = Flask('status_bench')
+
+    def monitor():
+        # 连接监控线程每秒持有一次锁（old 模式下 /status 要等待）
+        while True:
+            with lock:
+                time.sleep(0.005)
+            time.sleep(1)
+
+    def sampler():
+        nonlocal system
+        while change_interval > 0:
+            time.sleep(change_interval)
+            cpu_temp = round(rng.uniform(45, 55), 1)
+            with lock:
+                fields['cpu_temp'] = cpu_temp
+            if mode == 'split':
+                system = dict(system, cpu_temp=cpu_temp)
+            else:
+                store.publish(cpu_temp=cpu_temp)
+
+    def sensor():
+        while sensor_interval > 0:
+            time.sleep(sensor_interval)
+            water_temp = round(rng.uniform(27, 29), 1)
+            with lock:
+                fields['water_temp'] = water_temp
+            store.publish(water_temp=water_temp)
+
+    @app.route('/status')
+    def status():
+        if mode == 'old':
+            with lock:
+                return jsonify(dict(fields))
+        snapshot = store.current()
+        if mode == 'split':
+            if request.if_none_match.contains_weak(snapshot.etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.response_class(_split_body(snapshot), mimetype='application/json')
+            response.set_etag(snapshot.etag, weak=True)
+        else:
+            if snapshot.etag in request.if_none_match:
+                response = app.response_class(status=304)
+            else:
+                response = app.response_class(snapshot.body(), mimetype='application/json')
+            response.set_etag(snapshot.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def _split_body(snapshot):
+        sample = system
+        if body_cache[0] == snapshot.version and body_cache[1] is sample:
+            return body_cache[2]
+        data = dict(snapshot.data)
+        data.update(sample)
+        body = json.dumps(data, ensure_ascii=False)
+        body_cache[:] = [snapshot.version, sample, body]
+        return body
+
+    threading.Thread(target=monitor, daemon=True).start()
+    threading.Thread(target=sampler, daemon=True).start()
+    threading.Thread(target=sensor, daemon=True).start()
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _poll_status(port, mode, seconds, interval, latencies, counts):
+    """一个轮询客户端，snapshot 模式下带上次的 ETag"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    etag = None
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        headers = {'If-None-Match': etag} if (mode != 'old' and etag) else {}
+        begin = time.perf_counter()
+        conn.request('GET', '/status', headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append((time.perf_counter() - begin) * 1000)
+        counts[response.status] = counts.get(response.status, 0) + 1
+        etag = response.getheader('ETag') or etag
+        time.sleep(interval)
+    conn.close()
+
+
+def bench_status_poll(args):
+    """
+    多个客户端同时轮询 /status，对比加锁 jsonify、状态快照 + ETag（含系统指标）、
+    系统指标移出快照后的 304 比例、响应时间和服务端 CPU 时间
+    """
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{args.clients} 个客户端，每 {args.interval} 秒轮询一次，持续 {args.seconds} 秒，"
+          f"系统指标每 {args.change} 秒变化一次，传感器读数每 {args.sensor} 秒变化一次")
+    print(f"{'方式':>10} | {'请求数':>7} | {'304':>6} | {'304比例':>7} | {'p50 ms':>7} | {'p95 ms':>7} | "
+          f"{'p99 ms':>7} | {'CPU秒':>6} | {'CPU ms/请求':>10}")
+    print("-" * 96)
+    for mode in ('old', 'snapshot', 'split'):
+        port_queue = ctx.Queue()
+        server = ctx.Process(target=_status_server, args=(mode, args.change, args.sensor, port_queue),
+                             daemon=True)
+        server.start()
+        port = port_queue.get(timeout=30)
+        proc = psutil.Process(server.pid)
+        cpu_before = sum(proc.cpu_times()[:2])
+        latencies, counts = [], {}
+        clients = [threading.Thread(target=_poll_status,
+                                    args=(port, mode, args.seconds, args.interval, latencies, counts))
+                   for _ in range(args.clients)]
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+        cpu = sum(proc.cpu_times()[:2]) - cpu_before
+        server.terminate()
+        server.join()
+        latencies.sort()
+        n = len(latencies)
+        pct = lambda p: latencies[min(n - 1, int(n * p))]
+        print(f"{mode:>10} | {n:>7} | {counts.get(304, 0):>6} | {counts.get(304, 0) / n:>7.1%} | "
+              f"{pct(0.5):>7.2f} | {pct(0.95):>7.2f} | "
+              f"{pct(0.99):>7.2f} | {cpu:>6.2f} | {cpu / n * 1000:>10.3f}")
+
+
+def _count_sse(stream, seconds, counts):
+    """读取 seconds 秒推送内容，按事件名计数（心跳记为 ping）"""
+    deadline = time.monotonic() + seconds
+    for chunk in stream:
+        if chunk.startswith(': ping'):
+            counts['ping'] = counts.get('ping', 0) + 1
+        for line in chunk.splitlines():
+            if line.startswith('event: '):
+                name = line[len('event: '):]
+                counts[name] = counts.get(name, 0) + 1
+        if time.monotonic() >= deadline:
+            break
+    stream.close()
+
+
+def bench_sse_events(args):
+    """
+    一个推送连接 seconds 秒内收到的事件数：
+    系统指标在快照中（每次采样都推送 delta）与系统指标作为附加频道（每 --system 秒一次）对比
+    """
+    print(f"持续 {args.seconds} 秒，系统指标每 {args.change} 秒采样一次，传感器读数每 {args.sensor} 秒变化一次，"
+          f"附加频道每 {args.system} 秒发送一次")
+    print(f"{'方式':>10} | {'snapshot':>8} | {'delta':>6} | {'system':>6} | {'ping':>5} | {'每分钟事件':>8}")
+    print("-" * 60)
+    failed = 0
+    for mode in ('snapshot', 'side'):
+        rng = random.Random(1)
+        fields = _status_fields(rng)
+        if mode == 'side':
+            fields = {k: v for k, v in fields.items() if k not in SYSTEM_FIELDS}
+        store = StateStore(fields)
+        system = {'cpu_temp': None}
+        stop = threading.Event()
+
+        def sampler():
+            while not stop.wait(args.change):
+                system['cpu_temp'] = round(rng.uniform(45, 55), 1)
+                if mode == 'snapshot':
+                    store.publish(cpu_temp=system['cpu_temp'])
+
+        def sensor():
+            while not stop.wait(args.sensor):
+                store.publish(water_temp=round(rng.uniform(27, 29), 1))
+
+        side = ('system', lambda: json.dumps(system)) if mode == 'side' else None
+        stream = sse_stream(store, heartbeat=args.heartbeat, side=side, side_interval=args.system)
+        threads = [threading.Thread(target=sampler, daemon=True), threading.Thread(target=sensor, daemon=True)]
+        for t in threads:
+            t.start()
+        counts = {}
+        _count_sse(stream, args.seconds, counts)
+        stop.set()
+        total = sum(counts.values())
+        print(f"{mode:>10} | {counts.get('snapshot', 0):>8} | {counts.get('delta', 0):>6} | "
+              f"{counts.get('system', 0):>6} | {counts.get('ping', 0):>5} | {total / args.seconds * 60:>8.1f}")
+        if mode == 'side':
+            # delta 只应来自传感器读数变化，附加频道不超过设定频率
+            failed += counts.get('delta', 0) > args.seconds / args.sensor + 1
+            failed += counts.get('system', 0) > args.seconds / args.system + 1
+    if failed:
+        sys.exit(1)
+
+
+# 实际抓取的 /proc/net/tcp 和 /proc/net/tcp6：
+# 8081 有一个 IPv4 连接（另有本机客户端一侧的套接字，远端端口为 8081，不应算入），
+# 8082 双栈监听，有一个 IPv6 连接和一个 IPv4 映射的连接
+PROC_NET_TCP_FIXTURE = '''\
+  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 0100007F:1F91 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 77615 1 000000005fc25517 100 0 0 10 0
+   1: 0100007F:BC8F 00000000:0000 0A 00000000:00000000 00:00000000 00000000 65534        0 915 1 000000000685701d 100 0 0 10 0
+   2: 00000000:07E8 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 662 1 000000009dbbf82c 100 0 0 10 0
+   3: 0100007F:BC8F 0100007F:8FBE 01 00000000:00000000 00:00000000 00000000 65534        0 1216 1 0000000094dd22be 20 4 18 20 -1
+   4: 0100007F:1F91 0100007F:9162 01 00000000:00000000 00:00000000 00000000     0        0 77618 1 000000006cddc270 20 0 0 10 -1
+   5: 0100007F:9162 0100007F:1F91 01 00000000:00000000 00:00000000 00000000     0        0 77617 2 0000000069d4ebc7 20 0 0 10 -1
+   6: 0100007F:8FBE 0100007F:BC8F 01 00000000:00000000 02:000004CC 00000000     0        0 1215 2 00000000841abe09 20 4 0 23 -1
+   7: 0100007F:E2F8 0100007F:1F92 01 00000000:00000000 00:00000000 00000000     0        0 77621 2 000000001f58a481 20 0 0 10 -1
+'''
+
+PROC_NET_TCP6_FIXTURE = '''\
+  sl  local_address                         remote_address                        st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 00000000000000000000000000000000:1F92 00000000000000000000000000000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 77616 1 0000000052a853aa 100 0 0 10 0
+   1: 00000000000000000000000001000000:8DC2 00000000000000000000000001000000:1F92 01 00000000:00000000 00:00000000 00000000     0        0 77619 2 000000001ef2fe4c 20 0 0 10 -1
+   2: 00000000000000000000000001000000:1F92 00000000000000000000000001000000:8DC2 01 00000000:00000000 00:00000000 00000000     0        0 77620 1 00000000cf03725f 20 0 0 10 -1
+   3: 0000000000000000FFFF00000100007F:1F92 0000000000000000FFFF00000100007F:E2F8 01 00000000:00000000 00:00000000 00000000     0        0 77622 1 00000000560223d9 20 0 0 10 -1
+'''
+
+# 抓取时 psutil.net_connections 的结果（远端 "ip:端口"）
+PROC_NET_EXPECTED = {
+    8081: {'127.0.0.1:37218'},
+    8082: {'::1:36290', '::ffff:127.0.0.1:58104'},
+    5000: set(),
+}
+
+
+def bench_conn_watch(args):
+    """
+    用抓取的 /proc/net/tcp 内容检查解析结果与 psutil 一致，
+    再在本机对比读取 /proc/net/tcp 与 psutil.net_connections 的耗时（可额外打开 --extra 个连接）
+    """
+    failed = 0
+    for port, expected in PROC_NET_EXPECTED.items():
+        got = (parse_established(PROC_NET_TCP_FIXTURE, port)
+               | parse_established(PROC_NET_TCP6_FIXTURE, port, ipv6=True))
+        ok = got == expected
+        failed += not ok
+        print(f"端口 {port}: {'一致' if ok else '不一致'} {sorted(got)}")
+
+    # 本机打开若干连接，模拟系统中有较多套接字
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(128)
+    port = listener.getsockname()[1]
+    sockets = []
+    for _ in range(args.extra):
+        client = socket.create_connection(('127.0.0.1', port))
+        sockets.append(client)
+        sockets.append(listener.accept()[0])
+
+    proc_result = read_established(port)
+    psutil_result = psutil_established(port)
+    same = proc_result == psutil_result
+    failed += not same
+    print(f"本机 {len(proc_result)} 个连接，/proc 与 psutil 结果{'一致' if same else '不一致'}")
+
+    proc_ms = _median_ms(lambda: read_established(port), args.repeat)
+    psutil_ms = _median_ms(lambda: psutil_established(port), args.repeat)
+    cpu_begin = time.process_time()
+    for _ in range(args.repeat):
+        read_established(port)
+    proc_cpu = (time.process_time() - cpu_begin) / args.repeat * 1000
+    cpu_begin = time.process_time()
+    for _ in range(args.repeat):
+        psutil_established(port)
+    psutil_cpu = (time.process_time() - cpu_begin) / args.repeat * 1000
+    print(f"{'方式':>16} | {'耗时ms':>8} | {'CPU ms':>8}")
+    print("-" * 40)
+    print(f"{'psutil':>16} | {psutil_ms:>8.2f} | {psutil_cpu:>8.2f}")
+    print(f"{'/proc/net/tcp':>16} | {proc_ms:>8.2f} | {proc_cpu:>8.2f}")
+
+    for sock in sockets:
+        sock.close()
+    listener.close()
+    if failed:
+        sys.exit(1)
+
+
+class FakeStrip:
+    """模拟 PixelStrip：show() 按 WS2812 的传输时间（每灯珠30us + 复位50us）等待，记录同时刷新的次数"""
+
+    def __init__(self, count):
+        self.count = count
+        self.pixels = [0] * count
+        self.shows = 0
+        self.pixels_set = 0
+        self.overlaps = 0
+        self._showing = 0
+        self._lock = threading.Lock()
+
+    def numPixels(self):
+        return self.count
+
+    def setPixelColor(self, i, color):
+        self.pixels[i] = color
+        self.pixels_set += 1
+
+    def show(self):
+        with self._lock:
+            self._showing += 1
+            if self._showing > 1:
+                self.overlaps += 1
+        time.sleep((self.count * 30 + 50) / 1e6)
+        with self._lock:
+            self._showing -= 1
+            self.shows += 1
+
+
+def bench_led_frames(args):
+    """
+    连续 --switches 次激活/关闭灯带（如观看连接反复断开重连），
+    对比每次开线程设置全部灯珠并 show() 与灯带渲染线程的刷新次数、同时刷新次数和最终颜色；
+    再运行 --seconds 秒呼吸效果，统计推送帧数、未变化跳过的帧数和丢帧数
+    """
+    active, idle = (0, 100, 0), (0, 0, 0)
+    color = lambda r, g, b: (r << 16) | (g << 8) | b
+    expected = color(*(active if args.switches % 2 else idle))
+
+    # 旧方法：每次开一个线程设置全部灯珠并 show()
+    strip = FakeStrip(args.pixels)
+
+    def set_all_leds(rgb):
+        for i in range(strip.numPixels()):
+            strip.setPixelColor(i, color(*rgb))
+        strip.show()
+
+    threads = []
+    for i in range(args.switches):
+        t = threading.Thread(target=set_all_leds, args=(active if i % 2 == 0 else idle,), daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    old_ok = all(p == expected for p in strip.pixels)
+
+    # 灯带渲染线程
+    new_strip = FakeStrip(args.pixels)
+    engine = LedEngine(lambda: new_strip, color=color, fps=args.fps)
+    engine.start()
+    for i in range(args.switches):
+        engine.solid(active if i % 2 == 0 else idle)
+    while engine.get_stats()['queue_depth'] or engine.get_stats()['frames'] == 0:
+        time.sleep(0.001)
+    time.sleep(2.0 / args.fps)
+    new_ok = all(p == expected for p in new_strip.pixels)
+    switch_shows = new_strip.shows
+
+    print(f"{args.switches} 次切换，{args.pixels} 个灯珠")
+    print(f"{'方式':>10} | {'show次数':>8} | {'设置灯珠':>8} | {'同时刷新':>8} | 最终颜色")
+    print("-" * 58)
+    print(f"{'每次开线程':>10} | {strip.shows:>8} | {strip.pixels_set:>8} | {strip.overlaps:>8} | "
+          f"{'正确' if old_ok else '错误'}")
+    print(f"{'渲染线程':>10} | {switch_shows:>8} | {new_strip.pixels_set:>8} | {new_strip.overlaps:>8} | "
+          f"{'正确' if new_ok else '错误'}")
+
+    # 呼吸效果
+    before = engine.get_stats()
+    cpu_begin = time.process_time()
+    engine.breathe(active, args.period)
+    time.sleep(args.seconds)
+    cpu_ms = (time.process_time() - cpu_begin) * 1000
+    stats = engine.get_stats()
+    frames = stats['frames'] - before['frames']
+    unchanged = stats['unchanged'] - before['unchanged']
+    print(f"呼吸 {args.seconds} 秒（上限 {args.fps} fps）：推送 {frames} 帧，未变化跳过 {unchanged} 帧，"
+          f"丢帧 {stats['dropped']}，每帧平均 {stats['frame_ms_avg']}ms / 最大 {stats['frame_ms_max']}ms，"
+          f"CPU {cpu_ms:.0f}ms")
+
+    # 静止时不再刷新
+    engine.solid(idle)
+    time.sleep(0.2)
+    idle_frames = engine.get_stats()['frames']
+    time.sleep(1)
+    idle_extra = engine.get_stats()['frames'] - idle_frames
+    print(f"静止画面 1 秒内刷新 {idle_extra} 次")
+    engine.stop()
+    if not new_ok or new_strip.overlaps or idle_extra:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='鱼缸监控系统性能测试')
+    sub = parser.add_subparsers(dest='name')
+
+    p = sub.add_parser('access_write', help='访问记录写入耗时')
+    p.add_argument('--sizes', default='0,100000,300000', help='逗号分隔的表行数')
+    p.add_argument('--requests', type=int, default=200, help='每个表大小下模拟的请求数')
+    p.set_defaults(func=bench_access_write)
+
+    p = sub.add_parser('sensor_range', help='传感器数据范围查询耗时')
+    p.add_argument('--days', type=int, default=90, help='模拟数据天数')
+    p.add_argument('--repeat', type=int, default=5, help='每种查询重复次数')
+    p.set_defaults(func=bench_sensor_range)
+
+    p = sub.add_parser('lttb_check', help='检查 LTTB 降采样的点数、首尾点、尖峰和两种实现的一致性')
+    p.add_argument('--cases', type=int, default=50, help='随机长度的检查组数')
+    p.add_argument('--seed', type=int, default=1, help='随机数种子')
+    p.add_argument('--repeat', type=int, default=5, help='耗时对比重复次数')
+    p.add_argument('--verbose', action='store_true', help='显示每组的结果')
+    p.set_defaults(func=bench_lttb_check)
+
+    p = sub.add_parser('access_search', help='访问记录检索耗时（LIKE 与全文索引对比）')
+    p.add_argument('--rows', type=int, default=300000, help='模拟访问记录条数')
+    p.add_argument('--limit', type=int, default=50, help='每次检索返回条数')
+    p.add_argument('--repeat', type=int, default=5, help='每种检索重复次数')
+    p.set_defaults(func=bench_access_search)
+
+    p = sub.add_parser('access_dict', help='访问记录字典编码前后的大小和查询耗时')
+    p.add_argument('--rows', type=int, default=300000, help='模拟访问记录条数')
+    p.add_argument('--repeat', type=int, default=5, help='每种查询重复次数')
+    p.add_argument('--keep-fts', action='store_true', help='迁移后保留全文索引（默认去掉，只比较字典编码）')
+    p.set_defaults(func=bench_access_dictionary)
+
+    p = sub.add_parser('migrate_lock', help='升级访问记录结构时另一个进程写入的等待时间（分批与一次转换对比）')
+    p.add_argument('--rows', type=int, default=300000, help='模拟访问记录条数')
+    p.add_argument('--busy-timeout', type=float, default=5, help='写入方的 busy_timeout（秒），fishtank.py 为5秒')
+    p.set_defaults(func=bench_migrate_lock)
+
+    p = sub.add_parser('schedule_week', help='模拟时钟运行一周定时计划，检查漏执行和重复执行')
+    p.add_argument('--seed', type=int, default=1, help='随机数种子')
+    p.set_defaults(func=bench_schedule_week)
+
+    p = sub.add_parser('actuator_queue', help='同时到期的各设备动作依次执行与按设备队列执行的等待时间')
+    p.add_argument('--scale', type=float, default=0.1, help='动作耗时缩放比例，1 为实际耗时')
+    p.add_argument('--portions', type=int, default=3, help='每次投喂份数')
+    p.set_defaults(func=bench_actuator_queue)
+
+    p = sub.add_parser('status_poll', help='多客户端轮询 /status 的响应时间和服务端 CPU 时间')
+    p.add_argument('--clients', type=int, default=20, help='轮询客户端数')
+    p.add_argument('--seconds', type=float, default=60, help='每种方式的测试秒数')
+    p.add_argument('--interval', type=float, default=5, help='每个客户端的轮询间隔（秒），与页面相同')
+    p.add_argument('--change', type=float, default=2, help='系统指标变化间隔（秒），0 为不变化')
+    p.add_argument('--sensor', type=float, default=60, help='传感器读数变化间隔（秒），0 为不变化')
+    p.set_defaults(func=bench_status_poll)
+
+    p = sub.add_parser('sse_events', help='推送连接收到的事件数：系统指标在快照中与作为附加频道的对比')
+    p.add_argument('--seconds', type=float, default=30, help='每种方式的测试秒数')
+    p.add_argument('--change', type=float, default=2, help='系统指标采样间隔（秒）')
+    p.add_argument('--sensor', type=float, default=10, help='传感器读数变化间隔（秒）')
+    p.add_argument('--system', type=float, default=10, help='附加频道发送间隔（秒）')
+    p.add_argument('--heartbeat', type=float, default=15, help='心跳间隔（秒）')
+    p.set_defaults(func=bench_sse_events)
+
+    p = sub.add_parser('conn_watch', help='观看连接检测：/proc/net/tcp 解析检查及与 psutil 的耗时对比')
+    p.add_argument('--extra', type=int, default=500, help='额外打开的本机连接数')
+    p.add_argument('--repeat', type=int, default=50, help='每种方式重复次数')
+    p.set_defaults(func=bench_conn_watch)
+
+    p = sub.add_parser('led_frames', help='灯带刷新：每次开线程 show() 与渲染线程的刷新次数、帧率和丢帧')
+    p.add_argument('--pixels', type=int, default=10, help='灯珠数量')
+    p.add_argument('--switches', type=int, default=50, help='连续切换激活/关闭的次数')
+    p.add_argument('--fps', type=int, default=30, help='最高帧率')
+    p.add_argument('--period', type=float, default=3.0, help='呼吸周期（秒）')
+    p.add_argument('--seconds', type=float, default=3, help='呼吸效果运行秒数')
+    p.set_defaults(func=bench_led_frames)
+
+    args = parser.parse_args()
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        sys.exit(1)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
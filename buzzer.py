@@ -0,0 +1,121 @@
+'''
+蜂鸣器播放线程 2026.10
+- 一个线程负责蜂鸣器引脚，按队列依次播放命名的提示音（如 connect 两声、signin 五声），
+  调用方 play() 放入队列后立即返回，签到接口不再等待蜂鸣结束，多个提示音也不会在同一引脚上交错
+- 合并与限速：同一提示音已在队列中等待，或距上次开始播放不足 cooldown 秒时不再播放，
+  一秒内十次签到只响一遍；队列最多 max_queue 个，超出的丢弃
+- 停止时中断正在播放的提示音并关闭蜂鸣器
+'''
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('FishTankMonitor')
+
+
+def beeps(count, duration, interval):
+    """count 声的提示音：[(响的秒数, 停的秒数), ...]"""
+    return [(duration, interval)] * count
+
+
+class BuzzerPlayer:
+    def __init__(self, output, patterns, cooldown=3.0, max_queue=4):
+        """
+        :param output: 设置蜂鸣器引脚 output(True/False)
+        :param patterns: 提示音名称 -> [(响的秒数, 停的秒数), ...]
+        :param cooldown: 同一提示音两次播放的最短间隔（秒）
+        :param max_queue: 队列中最多等待的提示音个数
+        """
+        self.output = output
+        self.patterns = dict(patterns)
+        self.cooldown = float(cooldown)
+        self.max_queue = max(1, int(max_queue))
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._last_start = {}  # 提示音名称 -> 上次开始播放的时间
+        self._thread = None
+        self._stats = {
+            'requested': 0,
+            'played': 0,
+            'coalesced': 0,  # 合并或限速未播放
+            'dropped': 0,    # 队列满丢弃
+            'failed': 0
+        }
+
+    def set_patterns(self, patterns):
+        """更新提示音（如修改了蜂鸣时长配置）"""
+        with self._cond:
+            self.patterns = dict(patterns)
+
+    def start(self):
+        """启动播放线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='BuzzerPlayer', daemon=True)
+        self._thread.start()
+
+    def play(self, name):
+        """
+        请求播放提示音，立即返回
+        :return: 放入队列返回 True，被合并、限速或丢弃返回 False
+        """
+        with self._cond:
+            if name not in self.patterns:
+                raise ValueError(f"未知的提示音: {name}")
+            self._stats['requested'] += 1
+            last = self._last_start.get(name)
+            if name in self._queue or (last is not None and time.monotonic() - last < self.cooldown):
+                self._stats['coalesced'] += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                self._stats['dropped'] += 1
+                return False
+            self._queue.append(name)
+            self._cond.notify()
+            return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._queue and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    break
+                name = self._queue.popleft()
+                steps = self.patterns[name]
+                self._last_start[name] = time.monotonic()
+            try:
+                self._play(steps)
+                self._stats['played'] += 1
+            except Exception as e:
+                self._stats['failed'] += 1
+                logger.error(f"蜂鸣器控制失败: {str(e)}")
+        self.output(False)
+
+    def _play(self, steps):
+        for on, off in steps:
+            self.output(True)
+            stopped = self._stop.wait(on)
+            self.output(False)
+            if stopped or self._stop.wait(off):
+                return
+
+    def stop(self, timeout=5):
+        """停止播放线程，关闭蜂鸣器"""
+        self._stop.set()
+        with self._cond:
+            self._queue.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        """获取统计数据"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._queue)
+        stats['cooldown'] = self.cooldown
+        return stats
@@ -0,0 +1,124 @@
+'''
+视频观看连接检测 2026.10
+- 直接读取 /proc/net/tcp 和 /proc/net/tcp6，只解析本地端口为指定端口（Motion 8081）且
+  状态为 ESTABLISHED 的行，不再每秒调用 psutil.net_connections 枚举所有套接字和所有进程的 fd
+- 远端地址格式与 psutil 相同（IPv4 映射的 IPv6 为 ::ffff:a.b.c.d），新连接 / 断开的判断不变
+- 没有观看连接时轮询间隔逐步加大（最长 max_interval 秒），有连接或连接变化时恢复为 min_interval
+- 没有 /proc/net/tcp 时（非 Linux）改用 psutil
+'''
+import os
+import socket
+import struct
+import logging
+
+import psutil
+
+logger = logging.getLogger('FishTankMonitor')
+
+PROC_NET_TCP = '/proc/net/tcp'
+PROC_NET_TCP6 = '/proc/net/tcp6'
+
+TCP_ESTABLISHED = '01'
+
+
+def decode_address(hex_address, ipv6=False):
+    """
+    /proc/net/tcp 中的地址（按本机字节序存放的每4字节一组）转换为 (ip, 端口)
+    如 0100007F:1F91 -> ('127.0.0.1', 8081)
+    """
+    ip_hex, port_hex = hex_address.split(':')
+    raw = bytes.fromhex(ip_hex)
+    # 每4字节一组按本机字节序读出，再按网络字节序写回
+    words = struct.unpack(f'={len(raw) // 4}I', raw)
+    packed = struct.pack(f'!{len(words)}I', *words)
+    family = socket.AF_INET6 if ipv6 else socket.AF_INET
+    return socket.inet_ntop(family, packed), int(port_hex, 16)
+
+
+def parse_established(text, port, ipv6=False):
+    """
+    从 /proc/net/tcp(6) 内容中找出本地端口为 port 的 ESTABLISHED 连接
+    :return: 远端 "ip:端口" 集合
+    """
+    local_suffix = f':{port:04X}'
+    result = set()
+    for line in text.splitlines()[1:]:
+        # 先用字符串判断端口和状态，只有匹配的行才解码地址
+        fields = line.split(None, 4)
+        if len(fields) < 4 or fields[3] != TCP_ESTABLISHED or not fields[1].endswith(local_suffix):
+            continue
+        ip, remote_port = decode_address(fields[2], ipv6)
+        result.add(f"{ip}:{remote_port}")
+    return result
+
+
+def read_established(port, paths=((PROC_NET_TCP, False), (PROC_NET_TCP6, True))):
+    """读取 /proc/net/tcp 和 /proc/net/tcp6，不存在的文件跳过"""
+    result = set()
+    for path, ipv6 in paths:
+        try:
+            with open(path) as f:
+                text = f.read()
+        except FileNotFoundError:
+            continue
+        result |= parse_established(text, port, ipv6)
+    return result
+
+
+def psutil_established(port):
+    """psutil 枚举所有连接（旧方法，用于不支持 /proc 的系统和性能对比）"""
+    result = set()
+    for conn in psutil.net_connections(kind='inet'):
+        if conn.status == 'ESTABLISHED' and conn.laddr.port == port:
+            result.add(f"{conn.raddr.ip}:{conn.raddr.port}")
+    return result
+
+
+class ConnectionWatcher:
+    def __init__(self, port=8081, min_interval=1.0, max_interval=5.0, backoff=1.5):
+        """
+        :param port: 监视的本地端口
+        :param min_interval: 有连接时的轮询间隔（秒）
+        :param max_interval: 没有连接时轮询间隔的上限（秒）
+        :param backoff: 没有连接时每次轮询间隔乘以该系数
+        """
+        self.port = port
+        self.min_interval = float(min_interval)
+        self.max_interval = max(self.min_interval, float(max_interval))
+        self.backoff = max(1.0, float(backoff))
+        self.interval = self.min_interval
+        self._use_proc = os.path.exists(PROC_NET_TCP)
+        self._previous = set()
+        self._stats = {
+            'polls': 0,
+            'failed': 0
+        }
+
+    def poll(self):
+        """
+        读取当前连接并计算下次轮询间隔
+        :return: 远端 "ip:端口" 集合
+        """
+        self._stats['polls'] += 1
+        try:
+            if self._use_proc:
+                current = read_established(self.port)
+            else:
+                current = psutil_established(self.port)
+        except Exception:
+            self._stats['failed'] += 1
+            self.interval = self.min_interval
+            raise
+        if current or current != self._previous:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        self._previous = current
+        return current
+
+    def get_stats(self):
+        """获取统计数据"""
+        stats = dict(self._stats)
+        stats['interval'] = round(self.interval, 2)
+        stats['source'] = '/proc/net/tcp' if self._use_proc else 'psutil'
+        return stats
@@ -0,0 +1,146 @@
+'''
+数据库在线备份 2026.10
+- 使用 SQLite 在线备份接口，每次复制一批页面后短暂停顿，app.py / fishtank.py 可以继续写入，
+  备份期间数据库有修改时由 SQLite 自动重新复制，得到的是一致的快照（shutil 直接复制文件可能复制到写了一半的页面）
+- 备份完成后对备份文件做 integrity_check，通过后再压缩（有 zstandard 时用 zstd，否则用 gzip），流式压缩不占用额外内存
+- 按保留个数和保留天数删除旧备份
+- 返回页数、字节数和速度（MB/s、页/s）
+'''
+import os
+import gzip
+import time
+import shutil
+import sqlite3
+import logging
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from dbconn import get_connection
+
+logger = logging.getLogger('FishTankMonitor')
+
+BACKUP_PREFIX = 'sensor_data_backup_'
+BACKUP_SUFFIXES = ('.db', '.db.gz', '.db.zst')
+CHUNK_SIZE = 1024 * 1024
+
+
+def choose_compression(compress='auto'):
+    """auto：有 zstandard 用 zstd，否则 gzip；也可以指定 zstd / gzip / none"""
+    if compress == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if compress == 'zstd' and zstandard is None:
+        logger.warning("未安装 zstandard，改用 gzip 压缩")
+        return 'gzip'
+    return compress
+
+
+def _compress_file(src, compress):
+    """流式压缩备份文件，返回压缩后的文件名"""
+    if compress == 'zstd':
+        dest = src + '.zst'
+        with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+            zstandard.ZstdCompressor(level=3).copy_stream(fin, fout, read_size=CHUNK_SIZE)
+    elif compress == 'gzip':
+        dest = src + '.gz'
+        with open(src, 'rb') as fin, gzip.open(dest, 'wb', compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+    else:
+        return src
+    os.remove(src)
+    return dest
+
+
+def list_backups(backup_dir):
+    """备份目录中的备份文件，按文件名（即时间）从新到旧排列"""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [name for name in os.listdir(backup_dir)
+             if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIXES)]
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+
+def rotate_backups(backup_dir, keep=7, max_age_days=30):
+    """
+    删除旧备份：只保留最新的 keep 个，且删除超过 max_age_days 天的（最新一个始终保留）
+    :return: 删除的文件列表
+    """
+    removed = []
+    cutoff = time.time() - max_age_days * 24 * 3600 if max_age_days and max_age_days > 0 else None
+    for i, path in enumerate(list_backups(backup_dir)):
+        if i == 0:
+            continue
+        if (keep and keep > 0 and i >= keep) or (cutoff and os.path.getmtime(path) < cutoff):
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def backup_database(database_path, backup_dir, pages=256, pause=0.005,
+                    compress='auto', keep=7, max_age_days=30):
+    """
+    在线备份数据库
+    :param pages: 每批复制的页数，批之间释放读锁并停顿 pause 秒
+    :return: 备份结果统计，失败时抛出异常
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_file = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}.db")
+    tmp_file = backup_file + '.tmp'
+
+    progress = {'total': 0, 'steps': 0}
+
+    def on_progress(status, remaining, total):
+        progress['total'] = total
+        progress['steps'] += 1
+
+    src = get_connection(database_path)
+    dest = sqlite3.connect(tmp_file)
+    begin = time.perf_counter()
+    try:
+        src.backup(dest, pages=pages, progress=on_progress, sleep=pause)
+        copy_seconds = time.perf_counter() - begin
+
+        # 校验备份文件
+        result = dest.execute('PRAGMA integrity_check').fetchone()[0]
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"备份文件校验失败: {result}")
+        page_size = dest.execute('PRAGMA page_size').fetchone()[0]
+    except Exception:
+        dest.close()
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    dest.close()
+    os.replace(tmp_file, backup_file)
+
+    method = choose_compression(compress)
+    size = os.path.getsize(backup_file)
+    output = _compress_file(backup_file, method)
+    seconds = time.perf_counter() - begin
+    removed = rotate_backups(backup_dir, keep, max_age_days)
+
+    total_pages = progress['total']
+    stats = {
+        'file': output,
+        'pages': total_pages,
+        'steps': progress['steps'],
+        'bytes': size,
+        'compressed_bytes': os.path.getsize(output),
+        'compression': method,
+        'copy_seconds': round(copy_seconds, 3),
+        'seconds': round(seconds, 3),
+        'mb_per_sec': round(size / 1024 / 1024 / copy_seconds, 2) if copy_seconds > 0 else None,
+        'pages_per_sec': round(total_pages / copy_seconds) if copy_seconds > 0 else None,
+        'page_size': page_size,
+        'removed': removed
+    }
+    logger.info(
+        f"数据库备份成功: {output}，{total_pages} 页 {size / 1024 / 1024:.1f}MB，"
+        f"复制 {stats['copy_seconds']} 秒 ({stats['mb_per_sec']} MB/s，{stats['pages_per_sec']} 页/s)，"
+        f"压缩后 {stats['compressed_bytes'] / 1024 / 1024:.1f}MB，删除旧备份 {len(removed)} 个"
+    )
+    return stats
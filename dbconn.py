@@ -0,0 +1,176 @@
+'''
+SQLite 连接管理 2026.10
+app.py / fishtank.py / tools.py 共用
+- 每个线程复用自己的连接，线程用完后归还到空闲池，供其他线程（如 Flask 请求线程）复用
+- 打开连接时设置 WAL 日志模式、busy_timeout、synchronous，并启用语句缓存
+- 统计连接打开/复用次数，以及写事务等待写锁的时间
+'''
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger('FishTankMonitor')
+
+_settings = {
+    'database_path': '/var/lib/fishtank/sensor_data.db',
+    'busy_timeout_ms': 5000,   # 等待写锁的最长时间
+    'synchronous': 'NORMAL',   # WAL 模式下 NORMAL 足够安全，且写入更少
+    'cached_statements': 128,  # 每个连接缓存的预编译语句数
+    'max_idle': 8              # 空闲池最多保留的连接数
+}
+
+_local = threading.local()
+_idle = {}  # 数据库路径 -> 空闲连接列表
+_idle_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'opened': 0,          # 新建连接
+    'reused': 0,          # 复用连接（线程自己的或空闲池的）
+    'released': 0,        # 归还到空闲池
+    'closed': 0,          # 关闭连接
+    'lock_waits': 0,      # 写事务次数
+    'lock_wait_ms_total': 0.0,
+    'lock_wait_ms_max': 0.0,
+    'lock_errors': 0      # 等待超时（database is locked）
+}
+
+
+def _count(key, num=1):
+    with _stats_lock:
+        _stats[key] += num
+
+
+def configure(database_path=None, **settings):
+    """设置默认数据库路径和连接参数，进程启动时调用一次"""
+    if database_path:
+        _settings['database_path'] = database_path
+    for key, value in settings.items():
+        if key in _settings and value is not None:
+            _settings[key] = value
+
+
+def _open(path):
+    conn = sqlite3.connect(
+        path,
+        timeout=_settings['busy_timeout_ms'] / 1000.0,
+        cached_statements=_settings['cached_statements'],
+        check_same_thread=False  # 连接会在线程间归还复用，同一时间只被一个线程使用
+    )
+    conn.execute(f"PRAGMA busy_timeout = {int(_settings['busy_timeout_ms'])}")
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f"PRAGMA synchronous = {_settings['synchronous']}")
+    _count('opened')
+    return conn
+
+
+def get_connection(path=None):
+    """获取当前线程的连接，没有时从空闲池取出或新建"""
+    path = path or _settings['database_path']
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is not None:
+        _count('reused')
+        return conn
+
+    with _idle_lock:
+        pool = _idle.get(path)
+        conn = pool.pop() if pool else None
+    if conn is not None:
+        _count('reused')
+    else:
+        conn = _open(path)
+    conns[path] = conn
+    return conn
+
+
+def release_connection(path=None):
+    """当前线程用完连接后归还到空闲池（Flask 请求结束时调用）"""
+    conns = getattr(_local, 'conns', None)
+    if not conns:
+        return
+    paths = [path] if path else list(conns)
+    for p in paths:
+        conn = conns.pop(p, None)
+        if conn is None:
+            continue
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            _close(conn)
+            continue
+        with _idle_lock:
+            pool = _idle.setdefault(p, [])
+            if len(pool) < _settings['max_idle']:
+                pool.append(conn)
+                conn = None
+        if conn is None:
+            _count('released')
+        else:
+            _close(conn)
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+    _count('closed')
+
+
+def close_all():
+    """关闭当前线程的连接和空闲池中的所有连接（进程退出时调用）"""
+    conns = getattr(_local, 'conns', None) or {}
+    for conn in conns.values():
+        _close(conn)
+    conns.clear()
+    with _idle_lock:
+        for pool in _idle.values():
+            for conn in pool:
+                _close(conn)
+            pool.clear()
+
+
+@contextmanager
+def transaction(conn):
+    """
+    写事务：BEGIN IMMEDIATE 立即获取写锁，记录等待时间，正常结束提交，异常回滚
+    已在事务中时直接复用外层事务
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    begin = time.perf_counter()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+    except sqlite3.OperationalError as e:
+        if 'locked' in str(e):
+            _count('lock_errors')
+        raise
+    waited = (time.perf_counter() - begin) * 1000
+    with _stats_lock:
+        _stats['lock_waits'] += 1
+        _stats['lock_wait_ms_total'] += waited
+        _stats['lock_wait_ms_max'] = max(_stats['lock_wait_ms_max'], waited)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def get_stats():
+    """获取统计数据"""
+    with _stats_lock:
+        stats = dict(_stats)
+    with _idle_lock:
+        stats['idle'] = sum(len(pool) for pool in _idle.values())
+    stats['lock_wait_ms_total'] = round(stats['lock_wait_ms_total'], 2)
+    stats['lock_wait_ms_max'] = round(stats['lock_wait_ms_max'], 2)
+    return stats
@@ -0,0 +1,195 @@
+'''
+数据表流式导出 2026.10
+- 按主键 id 分页读取（WHERE id > 上一页最后的id ORDER BY id LIMIT n），每页都走主键索引，
+  不会因为翻到后面越来越慢，内存中只保留一页数据；没有整数主键的表用 fetchmany 分批读取
+- 输出 CSV 或 NDJSON（每行一个 JSON 对象），可用 zstd / gzip 流式压缩
+- 可按表的时间列过滤时间范围（时间戳，秒），签到时间等本地时间文本列换算为同样格式的文本比较
+- 先写临时文件，完成后再改名，导出中断不会留下不完整的文件
+- 定期回调进度（已导出行数、行/秒）
+'''
+import io
+import os
+import csv
+import gzip
+import json
+import time
+import logging
+from datetime import datetime
+
+import pytz
+
+from dbbackup import choose_compression, zstandard
+
+logger = logging.getLogger('FishTankMonitor')
+
+FORMATS = ('csv', 'ndjson')
+
+# 时间列为本地时间文本（app.py 的 get_local_time()，如 '2026-10-17 12:00:00'）的表，
+# 文本与数值比较时总是大于数值，因此文本按同样格式的时间比较，数值（时间戳）的记录仍按时间戳比较
+LOCAL_TIME_TABLES = {'signin_records'}
+
+# 各表用于时间范围过滤的列（时间戳，秒；LOCAL_TIME_TABLES 中的表为本地时间文本）
+TIME_COLUMNS = {
+    'access_records': 'start_time',
+    'access_records_text': 'start_time',
+    'signin_records': 'signin_time',
+    'sensor_data': 'ts',
+    'feeding_logs': 'feed_time',
+    'access_rollup_hourly': 'bucket',
+    'access_ip_hourly': 'bucket',
+    'sensor_data_15m': 'bucket',
+    'sensor_data_1h': 'bucket',
+}
+
+_SUFFIXES = {'zstd': '.zst', 'gzip': '.gz', 'none': ''}
+
+
+def table_columns(conn, table):
+    """表的列名，以及是否有可用于分页的整数主键 id"""
+    info = conn.execute(f'PRAGMA table_info({table})').fetchall()
+    if not info:
+        raise ValueError(f"表 '{table}' 不存在")
+    columns = [col[1] for col in info]
+    keyset = any(col[1] == 'id' and col[5] == 1 and col[2].upper() == 'INTEGER' for col in info)
+    return columns, keyset
+
+
+def export_filename(table, fmt, compress):
+    """导出文件名，如 access_records_20261017_030000.ndjson.zst"""
+    timestamp = time.strftime('%Y%m%d_%H%M%S')
+    return f"{table}_{timestamp}.{fmt}{_SUFFIXES[compress]}"
+
+
+def _open_output(path, compress):
+    """以文本方式打开输出文件，压缩时边写边压缩"""
+    if compress == 'zstd':
+        raw = open(path, 'wb')
+        writer = zstandard.ZstdCompressor(level=3).stream_writer(raw)
+        return io.TextIOWrapper(writer, encoding='utf-8', newline='')
+    if compress == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def local_time_text(ts, tz_name=None):
+    """时间戳转换为本地时间文本，tz_name 为空时使用系统时区"""
+    if tz_name:
+        return datetime.fromtimestamp(ts, pytz.timezone(tz_name)).strftime('%Y-%m-%d %H:%M:%S')
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+
+
+def _time_condition(table, column, op, ts, tz_name):
+    """时间列与时间戳比较的条件和参数，本地时间文本列的文本值按同样格式的文本比较"""
+    if table not in LOCAL_TIME_TABLES:
+        return f'{column} {op} ?', [ts]
+    return (f"((typeof({column}) = 'text' AND {column} {op} ?) OR "
+            f"(typeof({column}) IN ('integer', 'real') AND {column} {op} ?))",
+            [local_time_text(ts, tz_name), ts])
+
+
+def iter_rows(conn, table, start=None, end=None, chunk_size=5000, tz_name=None):
+    """
+    分批读取表数据，每次产出一批行
+    :param start: 时间范围起点（含），时间戳
+    :param end: 时间范围终点（不含），时间戳
+    :param tz_name: 本地时间文本列所用的时区
+    """
+    columns, keyset = table_columns(conn, table)
+    where, params = [], []
+    if start is not None or end is not None:
+        time_column = TIME_COLUMNS.get(table)
+        if time_column not in columns:
+            raise ValueError(f"表 '{table}' 不支持按时间过滤")
+        for op, ts in (('>=', start), ('<', end)):
+            if ts is not None:
+                condition, args = _time_condition(table, time_column, op, ts, tz_name)
+                where.append(condition)
+                params.extend(args)
+
+    if keyset:
+        id_index = columns.index('id')
+        last_id = None
+        while True:
+            conditions = list(where)
+            args = list(params)
+            if last_id is not None:
+                conditions.append('id > ?')
+                args.append(last_id)
+            sql = f'SELECT * FROM {table}'
+            if conditions:
+                sql += ' WHERE ' + ' AND '.join(conditions)
+            rows = conn.execute(f'{sql} ORDER BY id LIMIT ?', args + [chunk_size]).fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][id_index]
+    else:
+        sql = f'SELECT * FROM {table}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+
+def export_table(conn, table, path, fmt='csv', compress='none', start=None, end=None,
+                 chunk_size=5000, progress=None, progress_interval=2.0, tz_name=None):
+    """
+    导出表数据到文件
+    :param compress: auto / zstd / gzip / none
+    :param tz_name: 本地时间文本列所用的时区
+    :param progress: 进度回调 progress(rows, seconds)，每 progress_interval 秒调用一次
+    :return: 导出结果统计，失败时抛出异常
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    method = choose_compression(compress)
+    columns, _ = table_columns(conn, table)
+    tmp_path = path + '.tmp'
+
+    total = 0
+    begin = time.perf_counter()
+    last_report = begin
+    try:
+        with _open_output(tmp_path, method) as f:
+            if fmt == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(columns)
+            for rows in iter_rows(conn, table, start, end, chunk_size, tz_name):
+                if fmt == 'csv':
+                    writer.writerows(rows)
+                else:
+                    f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                                 for row in rows)
+                total += len(rows)
+                now = time.perf_counter()
+                if progress and now - last_report >= progress_interval:
+                    progress(total, now - begin)
+                    last_report = now
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+    seconds = time.perf_counter() - begin
+    stats = {
+        'file': path,
+        'table': table,
+        'format': fmt,
+        'compression': method,
+        'rows': total,
+        'bytes': os.path.getsize(path),
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(total / seconds) if seconds > 0 else None
+    }
+    logger.info(
+        f"表 '{table}' 导出完成: {path}，{total} 行，{stats['bytes'] / 1024 / 1024:.1f}MB，"
+        f"耗时 {stats['seconds']} 秒 ({stats['rows_per_sec']} 行/s)"
+    )
+    return stats
@@ -0,0 +1,127 @@
+'''
+曲线降采样 2026.10
+Largest-Triangle-Three-Buckets (LTTB)：每个分段保留与前后点构成三角形面积最大的点，
+点数大幅减少的同时保留尖峰（如水温突变）和曲线形状
+有 NumPy 时按分段向量化计算，没有时使用纯 Python 实现
+'''
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _bucket_bounds(length, threshold):
+    """
+    第 i 个中间分段的选点范围 [start, end) 和用于求平均的下一个分段 [avg_start, avg_end)
+    首尾两个点固定保留
+    """
+    every = (length - 2) / (threshold - 2)
+    bounds = []
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        avg_start = end
+        avg_end = min(int((i + 2) * every) + 1, length)
+        if avg_start >= avg_end:
+            # 最后一个分段，下一个分段只有末尾的点
+            avg_start, avg_end = length - 1, length
+        bounds.append((start, end, avg_start, avg_end))
+    return bounds
+
+
+def _lttb_python(xs, ys, threshold):
+    length = len(xs)
+    # 与 NumPy 实现相同，用前缀和求平均点，两种实现的浮点结果一致
+    cx = [0.0] + list(accumulate(float(x) for x in xs))
+    cy = [0.0] + list(accumulate(float(y) for y in ys))
+    selected = [0]
+    a = 0
+    for start, end, avg_start, avg_end in _bucket_bounds(length, threshold):
+        count = avg_end - avg_start
+        avg_x = (cx[avg_end] - cx[avg_start]) / count
+        avg_y = (cy[avg_end] - cy[avg_start]) / count
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(length - 1)
+    return selected
+
+
+def _lttb_numpy(xs, ys, threshold):
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    length = len(xs)
+    bounds = np.array(_bucket_bounds(length, threshold), dtype=np.int64)
+
+    # 用前缀和一次算出所有分段的平均点
+    cx = np.concatenate(([0.0], np.cumsum(xs)))
+    cy = np.concatenate(([0.0], np.cumsum(ys)))
+    counts = bounds[:, 3] - bounds[:, 2]
+    avg_xs = (cx[bounds[:, 3]] - cx[bounds[:, 2]]) / counts
+    avg_ys = (cy[bounds[:, 3]] - cy[bounds[:, 2]]) / counts
+
+    selected = [0]
+    a = 0
+    for i, (start, end, _, _) in enumerate(bounds):
+        ax, ay = xs[a], ys[a]
+        areas = np.abs((ax - avg_xs[i]) * (ys[start:end] - ay)
+                       - (ax - xs[start:end]) * (avg_ys[i] - ay))
+        a = int(start + np.argmax(areas))
+        selected.append(a)
+    selected.append(length - 1)
+    return selected
+
+
+def lttb_indices(xs, ys, threshold):
+    """
+    LTTB 降采样
+    :param xs: 递增的横坐标（时间戳）
+    :param ys: 纵坐标，不能包含 None
+    :param threshold: 保留的点数
+    :return: 保留的点的下标列表
+    """
+    length = len(xs)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+    if np is not None:
+        return _lttb_numpy(xs, ys, threshold)
+    return _lttb_python(xs, ys, threshold)
+
+
+def lttb_rows(rows, max_points):
+    """
+    对多条共用时间轴的曲线降采样
+    :param rows: [(时间戳, 值1, 值2, ...), ...]，值可以为 None（传感器读取失败）
+    :param max_points: 返回的最大行数
+    :return: 降采样后的行，保持原有顺序
+
+    每条曲线分到 max_points / 曲线数 的点数，只在非空的值上做 LTTB，
+    各曲线选中的行合并返回，因此每条曲线自己的尖峰都会被保留，总行数不超过 max_points
+    """
+    if not rows or len(rows) <= max_points:
+        return rows
+    series_count = len(rows[0]) - 1
+    budget = max_points // max(1, series_count)
+    if budget < 3:
+        # 点数不够每条曲线各保留首尾和一个中间点，按行均匀抽取
+        if max_points < 2:
+            return rows[:max_points]
+        step = (len(rows) - 1) / (max_points - 1)
+        return [rows[round(i * step)] for i in range(max_points)]
+    keep = set()
+    for col in range(1, series_count + 1):
+        valid = [i for i, row in enumerate(rows) if row[col] is not None]
+        if len(valid) <= budget:
+            keep.update(valid)
+            continue
+        xs = [rows[i][0] for i in valid]
+        ys = [rows[i][col] for i in valid]
+        keep.update(valid[k] for k in lttb_indices(xs, ys, budget))
+    return [rows[i] for i in sorted(keep)]
@@ -6,6 +6,7 @@
    - 每分钟记录空气温湿度(DHT11传感器)
    - 每分钟记录水温(DS18B20传感器)
    - 数据存储到SQLite数据库
+   - 同时累加到15分钟/每小时汇总表，原始数据可按 sensor_raw_retention_days 天数过期删除
    
 2. 水位监控：
    - 实时监测两个水位传感器状态(顶部和底部)
@@ -37,7 +38,8 @@
      "email_password": "your_password",
      "email_receiver": "alert@email.com",
      "smtp_server": "smtp.example.com",
-     "smtp_port": 465
+     "smtp_port": 465,
+     "sensor_raw_retention_days": 0
    }
 
 3. 设置系统服务(可选)：
@@ -69,7 +71,6 @@
 - 配置文件：同目录下的config.json
 """
 
-import sqlite3
 import time
 import logging
 from datetime import datetime
@@ -84,6 +85,10 @@ from email.mime.text import MIMEText
 from email.header import Header
 import threading
 
+from dbconn import configure as configure_db, get_connection
+from opendb import migrate_until_current as migrate_db
+from sensorstore import record_reading, expire_raw, migrate_epoch
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -115,10 +120,12 @@ def load_config():
             "email_password": "########",
             "email_receiver": "7740840@qq.com",
             "smtp_server": "smtp.qiye.aliyun.com",
-            "smtp_port": 465
+            "smtp_port": 465,
+            "sensor_raw_retention_days": 0  # 原始数据保留天数，0为永久保留
         }
 
 config = load_config()
+configure_db(config.get('database_path', '/var/lib/fishtank/sensor_data.db'))
 
 # 确保数据库目录存在
 database_dir = os.path.dirname(config.get('database_path', '/var/lib/fishtank/sensor_data.db'))
@@ -161,6 +168,8 @@ def get_local_time():
 # 记录传感器数据
 def record_sensor_data():
     logger.info("启动传感器数据记录服务...")
+    retention_days = config.get('sensor_raw_retention_days', 0)
+    last_expire_time = 0
     
     while True:
         try:
@@ -168,16 +177,15 @@ def record_sensor_data():
             water_temp = get_water_temp()
             local_time = get_local_time()
             
-            conn = sqlite3.connect(config.get('database_path', '/var/lib/fishtank/sensor_data.db'))
-            c = conn.cursor()
+            conn = get_connection()
             
-            c.execute('''
-                INSERT INTO sensor_data (timestamp, air_temp, humidity, water_temp)
-                VALUES (?, ?, ?, ?)
-            ''', (local_time, air_temp, humidity, water_temp))
+            # 写入原始数据并更新汇总表
+            record_reading(conn, time.time(), air_temp, humidity, water_temp)
             
-            conn.commit()
-            conn.close()
+            # 每小时清理一次过期的原始数据
+            if retention_days and time.time() - last_expire_time > 3600:
+                expire_raw(conn, retention_days)
+                last_expire_time = time.time()
             
             logger.info(f"记录数据 [{local_time}]: 气温={air_temp}°C, 湿度={humidity}%, 水温={water_temp}°C")
         except Exception as e:
@@ -185,6 +193,13 @@ def record_sensor_data():
         
         time.sleep(300)
 
+# 旧数据时间戳迁移（后台分批执行，不影响数据记录）
+def migrate_sensor_timestamps():
+    try:
+        migrate_epoch(get_connection(), config.get('timezone', 'Asia/Shanghai'))
+    except Exception as e:
+        logger.error(f"传感器数据时间戳迁移失败: {str(e)}")
+
 # 水位监控部分
 def send_email(subject, content):
     try:
@@ -288,8 +303,8 @@ class WaterMonitor:
             logger.info("GPIO资源已清理")
 
 def main():
-    # 初始化数据库
-    #init_database()
+    # 初始化数据库（只执行尚未执行的迁移，app.py 正在迁移时等待后重试）
+    migrate_db()
     
     # 确保时区正确
     try:
@@ -306,6 +321,10 @@ def main():
     sensor_thread = threading.Thread(target=record_sensor_data, daemon=True)
     sensor_thread.start()
     
+    # 启动旧数据时间戳迁移线程
+    migrate_thread = threading.Thread(target=migrate_sensor_timestamps, daemon=True)
+    migrate_thread.start()
+    
     # 启动水位监控（主线程）
     water_monitor.monitor_water_level()
 
@@ -0,0 +1,133 @@
+'''
+后台任务表 2026.10
+- 投喂、水泵定时运行等耗时动作由接口创建任务后立即返回任务ID，动作在执行器队列中执行，
+  客户端通过 /api/jobs/<任务ID> 查询状态和结果，不用一直占着请求等待
+- 状态：queued 排队中 / running 执行中 / succeeded 成功 / failed 失败 / cancelled 已取消
+- 只保存在内存中，最多保留 max_jobs 个，超出时先删除最早结束的任务，未结束的任务不删除
+'''
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobTable:
+    def __init__(self, max_jobs=200):
+        self.max_jobs = max(1, int(max_jobs))
+        self._jobs = OrderedDict()  # 任务ID -> 任务，按创建顺序
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'evicted': 0  # 超出数量被删除的已结束任务
+        }
+
+    def create(self, kind, params=None):
+        """
+        创建任务
+        :param kind: 任务类型，如 feed / water_pump_timer
+        :return: 任务（副本）
+        """
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'kind': kind,
+            'params': dict(params or {}),
+            'status': QUEUED,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._stats['created'] += 1
+            self._evict()
+            return dict(job)
+
+    def _evict(self):
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [i for i, job in self._jobs.items() if job['status'] in FINISHED][:excess]:
+            del self._jobs[job_id]
+            self._stats['evicted'] += 1
+
+    def mark_running(self, job_id):
+        """任务开始执行"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job['status'] == QUEUED:
+                job['status'] = RUNNING
+                job['started'] = time.time()
+
+    def finish(self, job_id, result=None, error=None, status=None):
+        """
+        任务结束，已结束的任务不再修改
+        :param status: 为空时按 error 判断成功或失败
+        """
+        if status is None:
+            status = FAILED if error is not None else SUCCEEDED
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return
+            job['status'] = status
+            job['finished'] = time.time()
+            if job['started'] is None:
+                job['started'] = job['finished']
+            job['result'] = result
+            job['error'] = str(error) if error is not None else None
+            self._stats[status] += 1
+            self._evict()
+
+    def run(self, job_id, func, *args, **kwargs):
+        """
+        执行 func 并记录结果，用于提交到执行器队列
+        func 出错时任务记为失败，异常继续抛出（执行器记录失败次数）
+        """
+        self.mark_running(job_id)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.finish(job_id, error=e)
+            raise
+        self.finish(job_id, result=result)
+        return result
+
+    def get(self, job_id):
+        """查询任务，不存在（或已被删除）时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def recent(self, limit=20, kind=None):
+        """最近创建的任务，新的在前"""
+        result = []
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if kind and job['kind'] != kind:
+                    continue
+                result.append(dict(job))
+                if len(result) >= limit:
+                    break
+        return result
+
+    def get_stats(self):
+        """获取统计数据"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._jobs)
+            stats['pending'] = sum(1 for job in self._jobs.values() if job['status'] not in FINISHED)
+        stats['max_jobs'] = self.max_jobs
+        return stats
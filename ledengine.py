@@ -0,0 +1,285 @@
+'''
+LED 灯带渲染线程 2026.10
+- 一个渲染线程独占 PixelStrip，其他线程通过队列发送命令：
+  solid 纯色 / fade 渐变到某个颜色 / breathe 呼吸 / pixels 逐个设置颜色 / reinit 重新初始化，
+  调用方立即返回，不再每次开新线程调用 strip.show()，也不会在重新初始化时并发写灯带
+- 按不超过 fps 的帧率渲染；与上一帧相比只设置变化的灯珠，整帧没有变化时不调用 show()，
+  静止画面（纯色、渐变结束）渲染一帧后等待下一条命令，不占用 CPU
+- 统计推送帧数、跳过的未变化帧数、丢帧数（渲染耗时超过帧间隔）、每帧耗时
+'''
+import logging
+import math
+import queue
+import threading
+import time
+
+logger = logging.getLogger('FishTankMonitor')
+
+BLACK = (0, 0, 0)
+
+
+def _rgb(color):
+    r, g, b = (max(0, min(255, int(c))) for c in color[:3])
+    return r, g, b
+
+
+def _scale(color, factor):
+    return tuple(int(round(c * factor)) for c in color)
+
+
+def _mix(start, end, t):
+    return tuple(int(round(a + (b - a) * t)) for a, b in zip(start, end))
+
+
+class _Solid:
+    name = 'solid'
+
+    def __init__(self, color):
+        self.color = color
+
+    def frame(self, now, previous, count):
+        return [self.color] * count
+
+    def done(self, now):
+        return True
+
+
+class _Pixels:
+    name = 'pixels'
+
+    def __init__(self, colors):
+        self.colors = colors
+
+    def frame(self, now, previous, count):
+        # 未指定的灯珠保持原来的颜色
+        frame = list(previous)
+        for i, color in enumerate(self.colors[:count]):
+            if color is not None:
+                frame[i] = color
+        return frame
+
+    def done(self, now):
+        return True
+
+
+class _Fade:
+    name = 'fade'
+
+    def __init__(self, color, duration, start_time):
+        self.color = color
+        self.duration = max(0.0, duration)
+        self.start_time = start_time
+        self.start = None  # 开始渐变时各灯珠的颜色（首帧时取上一帧）
+
+    def frame(self, now, previous, count):
+        if self.start is None:
+            self.start = list(previous)
+        if self.duration <= 0:
+            t = 1.0
+        else:
+            t = min(1.0, (now - self.start_time) / self.duration)
+        return [_mix(c, self.color, t) for c in self.start]
+
+    def done(self, now):
+        return now - self.start_time >= self.duration
+
+
+class _Breathe:
+    name = 'breathe'
+
+    def __init__(self, color, period, start_time, floor=0.05):
+        self.color = color
+        self.period = max(0.2, period)
+        self.start_time = start_time
+        self.floor = floor  # 最暗时的亮度比例
+
+    def frame(self, now, previous, count):
+        phase = (now - self.start_time) / self.period * 2 * math.pi
+        level = self.floor + (1 - self.floor) * (1 - math.cos(phase)) / 2
+        return [_scale(self.color, level)] * count
+
+    def done(self, now):
+        return False
+
+
+class LedEngine:
+    def __init__(self, create_strip, color=None, fps=30):
+        """
+        :param create_strip: 创建并 begin() 灯带，返回 PixelStrip，失败时抛出异常
+        :param color: (r, g, b) 转换为灯带颜色值，默认为 rpi_ws281x.Color 的编码
+        :param fps: 最高帧率
+        """
+        self.create_strip = create_strip
+        self.color = color or (lambda r, g, b: (r << 16) | (g << 8) | b)
+        self.fps = max(1, int(fps))
+        self.interval = 1.0 / self.fps
+        self._queue = queue.Queue()
+        self._strip = None
+        self._count = 0
+        self._frame = None    # 上一帧推送到灯带的颜色 [(r, g, b), ...]
+        self._effect = None
+        self._pending = False  # 收到命令后还未渲染
+        self._thread = None
+        self._stats = {
+            'commands': 0,
+            'frames': 0,          # 推送到灯带的帧数
+            'unchanged': 0,       # 与上一帧相同、未推送的帧数
+            'dropped': 0,         # 渲染耗时超过帧间隔而跳过的帧数
+            'pixels_set': 0,      # 设置的灯珠次数
+            'frame_ms_total': 0.0,
+            'frame_ms_max': 0.0,
+            'strip_errors': 0
+        }
+
+    # ---- 命令，均立即返回 ----
+
+    def solid(self, color):
+        """所有灯珠设为 color (r, g, b)"""
+        self._send('solid', _rgb(color))
+
+    def fade(self, color, duration=0.5):
+        """从当前颜色渐变到 color，duration 秒完成"""
+        self._send('fade', _rgb(color), float(duration))
+
+    def breathe(self, color, period=3.0):
+        """以 color 呼吸闪烁，period 为一次明暗周期的秒数，直到下一条命令"""
+        self._send('breathe', _rgb(color), float(period))
+
+    def set_pixels(self, colors):
+        """逐个设置灯珠颜色，列表中为 None 或超出长度的灯珠保持不变"""
+        self._send('pixels', [None if c is None else _rgb(c) for c in colors])
+
+    def reinit(self):
+        """重新创建灯带（修改灯珠数量、亮度后）"""
+        self._send('reinit')
+
+    def _send(self, *command):
+        self._queue.put(command)
+
+    # ---- 渲染线程 ----
+
+    def start(self):
+        """启动渲染线程（在渲染线程中创建灯带）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='LedEngine', daemon=True)
+        self._thread.start()
+
+    def _open_strip(self):
+        old, self._strip = self._strip, None
+        if old is not None:
+            try:
+                old._cleanup()
+            except Exception:
+                pass
+        try:
+            self._strip = self.create_strip()
+            self._count = self._strip.numPixels()
+        except Exception as e:
+            self._stats['strip_errors'] += 1
+            self._count = 0
+            logger.error(f"LED灯带初始化失败: {str(e)}")
+        self._frame = None  # 下一帧全部重新设置
+
+    def _apply(self, command, now):
+        self._stats['commands'] += 1
+        kind = command[0]
+        if kind == 'solid':
+            self._effect = _Solid(command[1])
+        elif kind == 'fade':
+            self._effect = _Fade(command[1], command[2], now)
+        elif kind == 'breathe':
+            self._effect = _Breathe(command[1], command[2], now)
+        elif kind == 'pixels':
+            self._effect = _Pixels(command[1])
+        elif kind == 'reinit':
+            self._open_strip()
+        self._pending = True
+
+    def _render(self, now):
+        if self._effect is None or self._strip is None:
+            return
+        previous = self._frame or [BLACK] * self._count
+        frame = self._effect.frame(now, previous, self._count)
+        if self._frame is None:
+            changed = range(self._count)
+        else:
+            changed = [i for i in range(self._count) if frame[i] != self._frame[i]]
+        if not changed:
+            self._stats['unchanged'] += 1
+            return
+        begin = time.perf_counter()
+        try:
+            for i in changed:
+                self._strip.setPixelColor(i, self.color(*frame[i]))
+            self._strip.show()
+        except Exception as e:
+            self._stats['strip_errors'] += 1
+            logger.error(f"设置LED时出错: {str(e)}")
+            return
+        elapsed = (time.perf_counter() - begin) * 1000
+        self._frame = frame
+        self._stats['frames'] += 1
+        self._stats['pixels_set'] += len(changed)
+        self._stats['frame_ms_total'] += elapsed
+        self._stats['frame_ms_max'] = max(self._stats['frame_ms_max'], elapsed)
+
+    def _run(self):
+        self._open_strip()
+        deadline = time.monotonic()
+        while True:
+            now = time.monotonic()
+            animating = self._effect is not None and not self._effect.done(now)
+            if self._pending or animating:
+                wait = max(0.0, deadline - now)
+            else:
+                wait = None  # 静止画面，等待下一条命令
+            try:
+                command = self._queue.get(timeout=wait)
+            except queue.Empty:
+                command = None
+            if command is not None:
+                if wait is None:
+                    # 空闲后的第一条命令立即渲染，空闲时间不算丢帧
+                    deadline = time.monotonic()
+                while command is not None:
+                    if command[0] == 'stop':
+                        self._effect = _Solid(BLACK)
+                        self._render(time.monotonic())
+                        return
+                    self._apply(command, time.monotonic())
+                    try:
+                        command = self._queue.get_nowait()
+                    except queue.Empty:
+                        command = None
+                continue
+
+            # 到达帧时间，渲染一帧
+            self._render(time.monotonic())
+            self._pending = False
+            deadline += self.interval
+            now = time.monotonic()
+            if now > deadline:
+                # 渲染太慢，跳过已错过的帧
+                missed = int((now - deadline) / self.interval) + 1
+                if animating:
+                    self._stats['dropped'] += missed
+                deadline += missed * self.interval
+
+    def stop(self, timeout=5):
+        """熄灭灯带并停止渲染线程"""
+        self._send('stop')
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        """获取统计数据"""
+        stats = dict(self._stats)
+        total = stats.pop('frame_ms_total')
+        stats['frame_ms_avg'] = round(total / (stats['frames'] or 1), 3)
+        stats['frame_ms_max'] = round(stats['frame_ms_max'], 3)
+        stats['fps'] = self.fps
+        stats['pixels'] = self._count
+        stats['effect'] = self._effect.name if self._effect is not None else None
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
@@ -1,26 +1,25 @@
 '''
-启动时初始化数据库和表
-1. 创建传感器数据表
-2. 创建喂食计划表
+数据库结构版本管理 2026.10
+用 PRAGMA user_version 记录当前结构版本，app.py / fishtank.py 启动时调用 migrate_until_current() 一次，
+只执行尚未执行过的迁移，每个迁移一个事务，完成后更新版本号
+大表的数据转换在版本号事务之前分批执行（每批一个短事务，可中断后继续），不长时间占用写锁
+所有表和索引只在这里定义，请求处理和定时任务中不再执行建表语句
+
+也可以单独运行: python3 opendb.py [数据库路径]
 '''
-import sqlite3
 import os
+import sys
 import json
+import sqlite3
 import logging
+import time
 
+from dbconn import get_connection, transaction
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/fishtank_monitor.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger('FishTankMonitor')
 
-
+# 配置文件路径
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
 
 # 加载配置
 def load_config():
@@ -33,18 +32,86 @@ def load_config():
             "database_path": "/var/lib/fishtank/sensor_data.db"           
         }
 
-#config = load_config()
-database_path = '/var/lib/fishtank/sensor_data.db'
-# 确保数据库目录存在
-#database_dir = os.path.dirname("/var/lib/fishtank/sensor_data.db", '/var/lib/fishtank/sensor_data.db')
-#os.makedirs(database_dir, exist_ok=True)
-
-# 初始化数据库
-def init_database():
-    #初始化数据库，创建传感器数据表'''
-    conn = sqlite3.connect(database_path)
-    c = conn.cursor()
+
+def _columns(c, table):
+    c.execute(f'PRAGMA table_info({table})')
+    return [col[1] for col in c.fetchall()]
     
+
+def _add_column(c, table, column, definition):
+    """旧版本建的表可能缺少列，缺少时补上"""
+    if column not in _columns(c, table):
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"{table} 已增加 {column} 列")
+
+
+# 大表的数据转换不放在版本号事务中一次完成（会长时间占用写锁，另一个进程启动时等待超时），
+# 由迁移的 prepare 函数分批执行：每批一个短事务，进度记录在 schema_backfill 表，
+# 中断后从上次的位置继续，app.py 和 fishtank.py 同时执行时也不会重复处理
+BACKFILL_BATCH = 5000
+BACKFILL_PAUSE = 0.05  # 每批之间让出写锁的时间（秒）
+
+
+def _batch_end(c, last_id, limit):
+    """access_records 中 id 大于 last_id 的前 limit 条的最大 id，没有时返回 None"""
+    return c.execute('''
+        SELECT MAX(id) FROM (
+            SELECT id FROM access_records WHERE id > ? ORDER BY id LIMIT ?
+        )
+    ''', (last_id, limit)).fetchone()[0]
+
+
+def _backfill_position(c, name):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS schema_backfill (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    ''')
+    row = c.execute('SELECT last_id FROM schema_backfill WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _run_batches(conn, target, name, copy_batch, batch_size=None, pause=None):
+    """
+    分批执行 copy_batch(cursor, last_id, batch_size)，返回本批最后一条的 id，没有更多数据时返回 None
+    其他进程已完成版本 target 的迁移时停止
+    """
+    batch_size = batch_size or BACKFILL_BATCH
+    pause = BACKFILL_PAUSE if pause is None else pause
+    batches = 0
+    while True:
+        with transaction(conn):
+            if get_version(conn) >= target:
+                return
+            c = conn.cursor()
+            last_id = _backfill_position(c, name)
+            end_id = copy_batch(c, last_id, batch_size)
+            if end_id is None:
+                break
+            c.execute('INSERT OR REPLACE INTO schema_backfill (name, last_id) VALUES (?, ?)', (name, end_id))
+        batches += 1
+        if batches % 100 == 0:
+            logger.info(f"{name}: 已处理到 id {end_id}")
+        time.sleep(pause)
+    if batches:
+        logger.info(f"{name}: 分批处理完成，共 {batches} 批")
+
+
+def _finish_batches(c, name, copy_batch):
+    """在版本号事务中处理分批完成后新增的记录，并清除进度"""
+    last_id = _backfill_position(c, name)
+    while True:
+        end_id = copy_batch(c, last_id, BACKFILL_BATCH)
+        if end_id is None:
+            break
+        last_id = end_id
+    c.execute('DELETE FROM schema_backfill WHERE name = ?', (name,))
+
+
+# 版本1：基础表（传感器数据、定时计划、执行记录、访问记录、签到记录）
+# 旧数据库中这些表可能已由旧代码创建，因此使用 IF NOT EXISTS，并补齐旧版本缺少的列
+def _v1_base_tables(c):
     c.execute('''CREATE TABLE IF NOT EXISTS sensor_data (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         timestamp DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
@@ -52,65 +119,39 @@ def init_database():
         humidity REAL,
         water_temp REAL
     )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_data (timestamp)')
     
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_data (timestamp)''')
-    
-    conn.commit()
-    conn.close()
-    logger.info("数据库初始化完成")
-
-# 在 main() 函数前添加数据库初始化代码
-def feed_db():
-    conn = sqlite3.connect(database_path)
-    c = conn.cursor()
-    
-    # 创建计划表
+    # 定时计划表
     c.execute('''
         CREATE TABLE IF NOT EXISTS feeding_schedules (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            enabled BOOLEAN DEFAULT 1,
-            schedule_name TEXT,
-            feed_time TEXT,  -- HH:MM
-            feed_days TEXT,  -- 逗号分隔的数字 0-6 (0=周日)
+            enabled INTEGER DEFAULT 1,
+            schedule_name TEXT NOT NULL,
+            feed_time TEXT NOT NULL,  -- HH:MM
+            feed_days TEXT NOT NULL,  -- 逗号分隔的数字 0-6 (0=周日)
             portion_size INTEGER DEFAULT 1,  -- 投喂量(1-3)
             last_feed_time INTEGER,  -- 时间戳
-            next_feed_time INTEGER,   -- 时间戳
+            next_feed_time INTEGER,  -- 时间戳
             typeid INTEGER DEFAULT 0  -- 计划类型,0=喂食,1=风扇,2=气泵,3=灌溉蓄水
-              
         )
     ''')
+    _add_column(c, 'feeding_schedules', 'next_feed_time', 'INTEGER')
+    _add_column(c, 'feeding_schedules', 'typeid', 'INTEGER DEFAULT 0')
     
-    # 创建自动化执行记录表
+    # 执行记录表，手动喂食时 schedule_id 为空
     c.execute('''
         CREATE TABLE IF NOT EXISTS feeding_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             schedule_id INTEGER,
-            feed_time INTEGER,  -- 时间戳
-            portion_size INTEGER,
-            typeid INTEGER DEFAULT 0 -- 记录类型,0=喂食,1=风扇,2=气泵,3=灌溉蓄水
+            feed_time INTEGER NOT NULL,  -- 时间戳
+            portion_size INTEGER NOT NULL,
+            typeid INTEGER DEFAULT 0,  -- 记录类型,0=喂食,1=风扇,2=气泵,3=灌溉蓄水
             FOREIGN KEY(schedule_id) REFERENCES feeding_schedules(id)
         )
     ''')
+    _add_column(c, 'feeding_logs', 'typeid', 'INTEGER DEFAULT 0')
 
-    #创建网络访问记录表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS access_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
-            ip_address TEXT,
-            action TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-# 在 main() 函数前添加数据库初始化代码
-def net_db():
-    conn = sqlite3.connect(database_path)
-    c = conn.cursor()
-    
-   # 创建访问记录表（新增）
+    # 访问记录表
     c.execute('''
         CREATE TABLE IF NOT EXISTS access_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -127,7 +168,7 @@ def net_db():
         )
     ''')
     
-    # 创建签到记录表（新增）
+    # 签到记录表
     c.execute('''
         CREATE TABLE IF NOT EXISTS signin_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -138,20 +179,432 @@ def net_db():
         )
     ''')
     
-    # 创建索引以提高查询性能
     c.execute('CREATE INDEX IF NOT EXISTS idx_access_ip ON access_records(ip_address)')
     c.execute('CREATE INDEX IF NOT EXISTS idx_access_time ON access_records(start_time)')
     c.execute('CREATE INDEX IF NOT EXISTS idx_signin_time ON signin_records(signin_time)')
     c.execute('CREATE INDEX IF NOT EXISTS idx_signin_ip ON signin_records(ip_address)')
     
-    conn.commit()
-    conn.close()
 
+# 版本2：访问记录改为请求结束时一次写入完整记录，旧版本先 INSERT 再按 request_id UPDATE，
+# 进程中断时会遗留 end_time 为空的半条记录（统计查询本来就不会用到）
+# 由 _v2_prepare 按 id 范围分批删除，版本号事务只处理最后一批之后新增的记录
+def _v2_delete_batch(c, last_id, limit):
+    end_id = _batch_end(c, last_id, limit)
+    if end_id is None:
+        return None
+    c.execute('DELETE FROM access_records WHERE id > ? AND id <= ? AND end_time IS NULL', (last_id, end_id))
+    return end_id
+
+
+def _v2_prepare(conn):
+    _run_batches(conn, 2, 'v2_clean_access_records', _v2_delete_batch)
 
 
-# 确保数据库和表已初始化
-#feed_db()
-net_db()
+def _v2_clean_access_records(c):
+    _finish_batches(c, 'v2_clean_access_records', _v2_delete_batch)
+    logger.info("访问记录未完成记录已分批清理")
+
+
+# 版本3：访问统计汇总表，由访问记录写线程增量维护，已有数据用 tools.py 的【重建访问统计】补齐
+def _v3_access_rollups(c):
+    # 每小时请求数，bucket 为本地整点时间戳
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS access_rollup_hourly (
+            bucket INTEGER PRIMARY KEY,
+            requests INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    # 每天请求数，bucket 为本地日期 YYYY-MM-DD
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS access_rollup_daily (
+            bucket TEXT PRIMARY KEY,
+            requests INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    # 每小时各IP访问次数，用于统计独立IP
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS access_ip_hourly (
+            bucket INTEGER NOT NULL,
+            ip_address TEXT NOT NULL,
+            requests INTEGER NOT NULL DEFAULT 0,
+            last_visit REAL,
+            PRIMARY KEY (bucket, ip_address)
+        ) WITHOUT ROWID
+    ''')
+    
+    # 每天各IP访问次数
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS access_ip_daily (
+            bucket TEXT NOT NULL,
+            ip_address TEXT NOT NULL,
+            requests INTEGER NOT NULL DEFAULT 0,
+            last_visit REAL,
+            PRIMARY KEY (bucket, ip_address)
+        ) WITHOUT ROWID
+    ''')
+
+
+# 版本4：传感器数据汇总表，bucket 为本地时段起点时间戳，平均值 = sum / count
+# 已有数据用 tools.py 的【重建传感器汇总】补齐
+def _v4_sensor_tiers(c):
+    for table in ('sensor_data_15m', 'sensor_data_1h'):
+        c.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket INTEGER PRIMARY KEY,
+                air_temp_min REAL,
+                air_temp_max REAL,
+                air_temp_sum REAL,
+                air_temp_count INTEGER NOT NULL DEFAULT 0,
+                humidity_min REAL,
+                humidity_max REAL,
+                humidity_sum REAL,
+                humidity_count INTEGER NOT NULL DEFAULT 0,
+                water_temp_min REAL,
+                water_temp_max REAL,
+                water_temp_sum REAL,
+                water_temp_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+
+# 版本5：sensor_data 增加整数时间戳列 ts（秒），旧数据由 fishtank.py 启动后在后台分批换算
+def _v5_sensor_epoch(c):
+    _add_column(c, 'sensor_data', 'ts', 'INTEGER')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sensor_ts ON sensor_data (ts)')
+
+
+# 版本6：访问记录路径和 User-Agent 的全文索引（FTS5 外部内容表，trigram 分词支持子串检索），
+# 由触发器与 access_records 同步；已有记录由 _v6_prepare 在版本号事务之外分批建立索引
+# SQLite 未编译 FTS5 时跳过，检索改用 LIKE 扫描（见 accesssearch.py）
+def _create_v6_fts(c):
+    """创建全文索引表，不支持 FTS5 时返回 False"""
+    try:
+        c.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS access_fts USING fts5(
+                path, user_agent,
+                content='access_records', content_rowid='id',
+                tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"SQLite 不支持 FTS5 trigram 全文索引，跳过: {str(e)}")
+        return False
+    return True
+
+
+def _v6_fts_batch(c, last_id, limit):
+    end_id = _batch_end(c, last_id, limit)
+    if end_id is not None:
+        c.execute('''
+            INSERT INTO access_fts (rowid, path, user_agent)
+            SELECT id, path, user_agent FROM access_records WHERE id > ? AND id <= ?
+        ''', (last_id, end_id))
+    return end_id
+
+
+def _v6_prepare(conn):
+    with transaction(conn):
+        if get_version(conn) >= 6 or not _create_v6_fts(conn.cursor()):
+            return
+    _run_batches(conn, 6, 'access_fts', _v6_fts_batch)
+
+
+def _v6_access_fts(c):
+    if not _create_v6_fts(c):
+        return
+    # 分批建立索引之后新增的记录
+    _finish_batches(c, 'access_fts', _v6_fts_batch)
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS access_fts_insert AFTER INSERT ON access_records BEGIN
+            INSERT INTO access_fts (rowid, path, user_agent) VALUES (new.id, new.path, new.user_agent);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS access_fts_delete AFTER DELETE ON access_records BEGIN
+            INSERT INTO access_fts (access_fts, rowid, path, user_agent)
+            VALUES ('delete', old.id, old.path, old.user_agent);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS access_fts_update AFTER UPDATE OF path, user_agent ON access_records BEGIN
+            INSERT INTO access_fts (access_fts, rowid, path, user_agent)
+            VALUES ('delete', old.id, old.path, old.user_agent);
+            INSERT INTO access_fts (rowid, path, user_agent) VALUES (new.id, new.path, new.user_agent);
+        END
+    ''')
+
+
+def _used_bytes(c):
+    """数据库已使用的空间（不含空闲页）"""
+    page_count = c.execute('PRAGMA page_count').fetchone()[0]
+    freelist = c.execute('PRAGMA freelist_count').fetchone()[0]
+    page_size = c.execute('PRAGMA page_size').fetchone()[0]
+    return (page_count - freelist) * page_size
+
+
+def _table_exists(c, name):
+    return c.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (name,)).fetchone() is not None
+
+
+# 版本7：access_records 的 path、user_agent 改为字典表的整数ID（path_id、ua_id），
+# 仪表盘轮询产生的大量重复字符串只保存一次；已有数据由 _v7_prepare 在版本号事务之外
+# 分批移到 access_records_new（同时写入新的全文索引 access_fts_new），
+# 版本号事务内只移动剩余的记录并替换表，查询文本时使用视图 access_records_text
+# 转换过程中已移动的记录只在新表中，中断后再次启动时继续转换
+# 释放的空间在执行 VACUUM 后归还给文件系统
+def _v7_copy_batch(c, last_id, limit):
+    end_id = _batch_end(c, last_id, limit)
+    if end_id is None:
+        return None
+    c.execute('''
+        INSERT OR IGNORE INTO access_paths (path)
+        SELECT DISTINCT path FROM access_records WHERE id > ? AND id <= ?
+    ''', (last_id, end_id))
+    c.execute('''
+        INSERT OR IGNORE INTO access_user_agents (user_agent)
+        SELECT DISTINCT user_agent FROM access_records
+        WHERE id > ? AND id <= ? AND user_agent IS NOT NULL
+    ''', (last_id, end_id))
+    c.execute('''
+        INSERT INTO access_records_new
+        (id, request_id, ip_address, path_id, method, ua_id,
+         start_time, end_time, duration, status_code, created_at)
+        SELECT a.id, a.request_id, a.ip_address, p.id, a.method, u.id,
+               a.start_time, a.end_time, a.duration, a.status_code, a.created_at
+        FROM access_records a
+        JOIN access_paths p ON p.path = a.path
+        LEFT JOIN access_user_agents u ON u.user_agent = a.user_agent
+        WHERE a.id > ? AND a.id <= ?
+        ORDER BY a.id
+    ''', (last_id, end_id))
+    if _table_exists(c, 'access_fts_new'):
+        c.execute('''
+            INSERT INTO access_fts_new (rowid, path, user_agent)
+            SELECT id, path, user_agent FROM access_records WHERE id > ? AND id <= ?
+        ''', (last_id, end_id))
+    # 已复制的记录从旧表删除，替换表时只需删除空表
+    c.execute('DELETE FROM access_records WHERE id > ? AND id <= ?', (last_id, end_id))
+    return end_id
+
+
+def _v7_prepare(conn):
+    with transaction(conn):
+        if get_version(conn) >= 7:
+            return
+        c = conn.cursor()
+        logger.info(f"访问记录开始转换，数据库已用空间 {_used_bytes(c) / 1024 / 1024:.1f}MB")
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS access_paths (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS access_user_agents (
+                id INTEGER PRIMARY KEY,
+                user_agent TEXT NOT NULL UNIQUE
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS access_records_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id TEXT NOT NULL,
+                ip_address TEXT NOT NULL,
+                path_id INTEGER NOT NULL REFERENCES access_paths(id),
+                method TEXT NOT NULL,
+                ua_id INTEGER REFERENCES access_user_agents(id),
+                start_time REAL NOT NULL,
+                end_time REAL,
+                duration REAL,
+                status_code INTEGER,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # 索引随分批写入维护，不在替换表时一次建立（旧表的索引名还在使用，新表用新的索引名）
+        c.execute('CREATE INDEX IF NOT EXISTS idx_access_records_ip ON access_records_new(ip_address)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_access_records_time ON access_records_new(start_time)')
+        # 旧的全文索引和触发器引用了 path、user_agent 列：删除触发器（移动记录时不再逐条更新索引），
+        # 旧索引改名为 access_fts_old，记录移动完成后分批清空再删除；按新结构重新建立索引，内容从视图读取
+        for trigger in ('access_fts_insert', 'access_fts_delete', 'access_fts_update'):
+            c.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        if _table_exists(c, 'access_fts'):
+            c.execute('ALTER TABLE access_fts RENAME TO access_fts_old')
+        if _table_exists(c, 'access_fts_old'):
+            c.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS access_fts_new USING fts5(
+                    path, user_agent,
+                    content='access_records_text', content_rowid='id',
+                    tokenize='trigram'
+                )
+            ''')
+    _run_batches(conn, 7, 'access_records_new', _v7_copy_batch)
+    _clear_old_fts(conn)
+
+
+def _clear_old_fts(conn):
+    """
+    分批清空旧全文索引的数据表（索引已不再使用），删除 access_fts_old 时不需要一次释放大量页
+    _data 中 id 不大于10的是索引结构记录，保留到删除时
+    """
+    for table, condition in (('access_fts_old_docsize', ''), ('access_fts_old_data', 'WHERE id > 10')):
+        while True:
+            with transaction(conn):
+                if get_version(conn) >= 7 or not _table_exists(conn, table):
+                    return
+                deleted = conn.execute(f'''
+                    DELETE FROM {table} WHERE id IN (
+                        SELECT id FROM {table} {condition} LIMIT ?
+                    )
+                ''', (BACKFILL_BATCH,)).rowcount
+            if not deleted:
+                break
+            time.sleep(BACKFILL_PAUSE)
+
+
+def _v7_access_dictionary(c):
+    # 新表由 _v7_prepare 创建并复制了已有数据
+    if not _table_exists(c, 'access_records_new'):
+        raise RuntimeError('access_records_new 不存在，请通过 migrate() 执行迁移')
+    
+    # 分批移动之后新增的记录，旧表和旧的全文索引此时已为空
+    _finish_batches(c, 'access_records_new', _v7_copy_batch)
+    total = c.execute('SELECT COUNT(*) FROM access_records_new').fetchone()[0]
+    
+    c.execute('DROP TABLE IF EXISTS access_fts_old')
+    c.execute('DROP TABLE access_records')
+    c.execute('ALTER TABLE access_records_new RENAME TO access_records')
+    
+    c.execute('''
+        CREATE VIEW IF NOT EXISTS access_records_text AS
+        SELECT a.id, a.request_id, a.ip_address, p.path, a.method, u.user_agent,
+               a.start_time, a.end_time, a.duration, a.status_code, a.created_at,
+               a.path_id, a.ua_id
+        FROM access_records a
+        JOIN access_paths p ON p.id = a.path_id
+        LEFT JOIN access_user_agents u ON u.id = a.ua_id
+    ''')
+    
+    if _table_exists(c, 'access_fts_new'):
+        c.execute('ALTER TABLE access_fts_new RENAME TO access_fts')
+        c.execute('''
+            CREATE TRIGGER access_fts_insert AFTER INSERT ON access_records BEGIN
+                INSERT INTO access_fts (rowid, path, user_agent) VALUES (
+                    new.id,
+                    (SELECT path FROM access_paths WHERE id = new.path_id),
+                    (SELECT user_agent FROM access_user_agents WHERE id = new.ua_id));
+            END
+        ''')
+        c.execute('''
+            CREATE TRIGGER access_fts_delete AFTER DELETE ON access_records BEGIN
+                INSERT INTO access_fts (access_fts, rowid, path, user_agent) VALUES (
+                    'delete', old.id,
+                    (SELECT path FROM access_paths WHERE id = old.path_id),
+                    (SELECT user_agent FROM access_user_agents WHERE id = old.ua_id));
+            END
+        ''')
+        c.execute('''
+            CREATE TRIGGER access_fts_update AFTER UPDATE OF path_id, ua_id ON access_records BEGIN
+                INSERT INTO access_fts (access_fts, rowid, path, user_agent) VALUES (
+                    'delete', old.id,
+                    (SELECT path FROM access_paths WHERE id = old.path_id),
+                    (SELECT user_agent FROM access_user_agents WHERE id = old.ua_id));
+                INSERT INTO access_fts (rowid, path, user_agent) VALUES (
+                    new.id,
+                    (SELECT path FROM access_paths WHERE id = new.path_id),
+                    (SELECT user_agent FROM access_user_agents WHERE id = new.ua_id));
+            END
+        ''')
+    
+    after = _used_bytes(c)
+    paths = c.execute('SELECT COUNT(*) FROM access_paths').fetchone()[0]
+    agents = c.execute('SELECT COUNT(*) FROM access_user_agents').fetchone()[0]
+    logger.info(
+        f"访问记录转换完成: {total} 条，{paths} 个路径，{agents} 个 User-Agent，"
+        f"数据库已用空间 {after / 1024 / 1024:.1f}MB（执行 VACUUM 后释放空闲页）"
+    )
+
+
+# 迁移列表，只能在末尾追加，已发布的迁移不要修改
+# (版本号, 名称, 版本号事务内执行的函数, 事务之前分批执行的 prepare 函数或 None)
+MIGRATIONS = [
+    (1, '基础表', _v1_base_tables, None),
+    (2, '清理未完成的访问记录', _v2_clean_access_records, _v2_prepare),
+    (3, '访问统计汇总表', _v3_access_rollups, None),
+    (4, '传感器数据汇总表', _v4_sensor_tiers, None),
+    (5, '传感器数据整数时间戳', _v5_sensor_epoch, None),
+    (6, '访问记录全文索引', _v6_access_fts, _v6_prepare),
+    (7, '访问记录路径和 User-Agent 字典', _v7_access_dictionary, _v7_prepare),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(path=None):
+    """
+    执行尚未执行的迁移，app.py 和 fishtank.py 可能同时启动，
+    每个迁移在 BEGIN IMMEDIATE 事务内重新检查版本号，不会重复执行；
+    有 prepare 函数的迁移先在事务之外分批转换数据，版本号事务只处理剩余的少量记录
+    :return: 迁移后的版本号
+    """
+    conn = get_connection(path)
+    version = get_version(conn)
+    if version > SCHEMA_VERSION:
+        logger.warning(f"数据库结构版本 {version} 高于程序版本 {SCHEMA_VERSION}，请更新程序")
+        return version
+    for target, name, func, prepare in MIGRATIONS:
+        if target <= version:
+            continue
+        if prepare is not None:
+            prepare(conn)
+        with transaction(conn):
+            version = get_version(conn)
+            if target <= version:
+                continue
+            func(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {int(target)}')
+            version = target
+        logger.info(f"数据库结构已升级到版本 {target}: {name}")
+    return version
+
+
+
+def migrate_until_current(path=None, max_delay=60):
+    """
+    执行迁移直到结构版本为最新：另一个进程正在执行迁移、写锁等待超时（database is locked）时
+    等待后重试（间隔逐次加倍，最长 max_delay 秒），不因启动时的锁冲突退出
+    :return: 迁移后的版本号
+    """
+    delay = 1
+    while True:
+        try:
+            return migrate(path)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            logger.warning(f"数据库结构升级等待写锁超时（{str(e)}），{delay} 秒后重试")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+if __name__ == '__main__':
+    # 配置日志
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('/var/log/fishtank_monitor.log'),
+            logging.StreamHandler()
+        ]
+    )
+    database_path = sys.argv[1] if len(sys.argv) > 1 else load_config().get(
+        'database_path', '/var/lib/fishtank/sensor_data.db')
+    os.makedirs(os.path.dirname(database_path), exist_ok=True)
+    logger.info(f"数据库初始化完成，结构版本 {migrate(database_path)}")
 
 '''
 字段详细说明：
@@ -164,11 +617,11 @@ request_id: 使用UUID生成的请求唯一标识，用于跟踪单个请求
 
 ip_address: 客户端的IP地址，用于识别访问来源
 
-path: 请求的URL路径，记录访问的具体页面或API
+path_id: 请求的URL路径，access_paths 表的ID
 
 method: HTTP请求方法（GET、POST、PUT、DELETE等）
 
-user_agent: 客户端浏览器或设备的标识信息
+ua_id: 客户端浏览器或设备的标识信息，access_user_agents 表的ID，没有 User-Agent 时为空
 
 start_time: 请求开始处理的时间（Unix时间戳格式）
 
@@ -180,6 +633,12 @@ status_code: HTTP响应状态码（200成功、404未找到、500错误等）
 
 created_at: 记录创建时间，使用数据库的当前时间
 
+access_paths / access_user_agents 表（路径和 User-Agent 字典表）：
+
+id, path / user_agent: 每个不同的值只保存一次，由访问记录写线程写入（进程内 LRU 缓存ID）
+
+access_records_text 视图：access_records 关联字典表，带 path、user_agent 文本列，查询时使用
+
 signin_records 表（签到记录表）：
 
 id: 主键，自动递增的唯一标识
@@ -191,4 +650,26 @@ user_agent: 签到时的浏览器或设备信息
 signin_time: 签到发生的时间（Unix时间戳格式）
 
 created_at: 记录创建时间，使用数据库的当前时间
+
+access_rollup_hourly / access_rollup_daily 表（访问汇总表）：
+
+bucket: 本地整点时间戳 / 本地日期
+
+requests: 该时段的请求数
+
+access_ip_hourly / access_ip_daily 表（按IP访问汇总表）：
+
+bucket, ip_address: 时段和IP，一个时段内的行数即独立IP数
+
+requests: 该IP在该时段的请求数
+
+last_visit: 该IP在该时段最后访问时间（Unix时间戳格式）
+
+汇总表由 app.py 的访问记录写线程增量维护，已有数据可用 tools.py 的【重建访问统计】补齐
+
+access_fts 表（访问记录全文索引）：
+
+FTS5 外部内容表，rowid 对应 access_records.id，索引 path、user_agent 两列，内容从 access_records_text 视图读取
+
+由 access_records 上的触发器同步，可用 tools.py 的【重建访问记录全文索引】重建
 '''
\ No newline at end of file
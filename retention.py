@@ -0,0 +1,223 @@
+'''
+数据保留与空间回收 2026.10
+- 按表设置保留天数，定期删除过期的访问记录、签到记录、执行记录（0 为永久保留），
+  汇总表（access_rollup_* / access_ip_*）不在此处理，一直保留，访问统计不受影响
+- 分小批删除，每批一个短事务并稍作停顿，不会长时间占用写锁
+- 数据库为增量回收模式（auto_vacuum = INCREMENTAL）时，删除后分批执行 incremental_vacuum
+  把空闲页归还给文件系统；旧数据库需要先用 tools.py 的【压缩数据库】执行一次 VACUUM 切换模式
+- 路径 / User-Agent 字典表不清理（访问记录写线程缓存了其中的ID）
+- 统计删除行数、耗时、回收前后的数据库大小
+'''
+import time
+import threading
+import logging
+
+from dbconn import get_connection, release_connection, transaction
+from dbexport import LOCAL_TIME_TABLES, local_time_text
+
+logger = logging.getLogger('FishTankMonitor')
+
+# 可设置保留天数的表及其时间列（时间戳，秒）
+RETENTION_TABLES = {
+    'access_records': 'start_time',
+    'signin_records': 'signin_time',
+    'feeding_logs': 'feed_time',
+}
+
+# 默认保留天数，0 为永久保留
+DEFAULT_POLICIES = {
+    'access_records': 30,
+    'signin_records': 0,
+    'feeding_logs': 0,
+}
+
+
+def db_size(conn):
+    """数据库大小：(文件总字节数, 空闲页字节数)"""
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return page_count * page_size, freelist * page_size
+
+
+def expire_table(conn, table, days, chunk_size=500, pause=0.05, tz_name=None):
+    """
+    删除 table 中超过 days 天的记录
+    :param tz_name: 本地时间文本列所用的时区
+    :return: 删除的记录数
+    """
+    if table not in RETENTION_TABLES:
+        raise ValueError(f"表 '{table}' 不支持按保留天数清理")
+    if not days or days <= 0:
+        return 0
+    column = RETENTION_TABLES[table]
+    cutoff = time.time() - days * 24 * 3600
+    if table in LOCAL_TIME_TABLES:
+        condition = (f"(typeof({column}) = 'text' AND {column} < ?) OR "
+                     f"(typeof({column}) IN ('integer', 'real') AND {column} < ?)")
+        params = (local_time_text(cutoff, tz_name), cutoff)
+    else:
+        condition = f'{column} < ?'
+        params = (cutoff,)
+    total = 0
+    while True:
+        with transaction(conn):
+            cur = conn.execute(f'''
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE {condition} ORDER BY id LIMIT ?
+                )
+            ''', params + (chunk_size,))
+        total += cur.rowcount
+        if cur.rowcount < chunk_size:
+            break
+        time.sleep(pause)
+    return total
+
+
+def incremental_vacuum(conn, pages=256, pause=0.05):
+    """
+    增量回收空闲页，每次最多 pages 页，数据库不是增量回收模式时不执行
+    :return: 回收的页数
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 0
+    total = 0
+    while True:
+        freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if freelist <= 0:
+            break
+        # execute() 只执行一步（回收一页），executescript 会执行到结束，自身为一个短事务
+        conn.executescript(f'PRAGMA incremental_vacuum({int(min(freelist, pages))})')
+        freed = freelist - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if freed <= 0:
+            break
+        total += freed
+        time.sleep(pause)
+    return total
+
+
+def run_retention(conn, policies, chunk_size=500, pause=0.05, vacuum_pages=256, tz_name=None):
+    """
+    执行一次清理和空间回收
+    :param policies: 表名 -> 保留天数
+    :return: 本次结果统计
+    """
+    begin = time.perf_counter()
+    size_before, free_before = db_size(conn)
+    deleted = {}
+    for table, days in policies.items():
+        if table in RETENTION_TABLES and days and days > 0:
+            deleted[table] = expire_table(conn, table, days, chunk_size, pause, tz_name)
+    vacuumed = incremental_vacuum(conn, vacuum_pages, pause)
+    size_after, free_after = db_size(conn)
+    result = {
+        'time': time.time(),
+        'deleted': deleted,
+        'vacuumed_pages': vacuumed,
+        'size_before': size_before,
+        'size_after': size_after,
+        'free_before': free_before,
+        'free_after': free_after,
+        'seconds': round(time.perf_counter() - begin, 3)
+    }
+    if any(deleted.values()) or vacuumed:
+        logger.info(
+            f"数据清理完成: 删除 {deleted}，回收 {vacuumed} 页，"
+            f"数据库 {size_before / 1024 / 1024:.1f}MB -> {size_after / 1024 / 1024:.1f}MB"
+            f"（空闲 {free_after / 1024 / 1024:.1f}MB），耗时 {result['seconds']} 秒"
+        )
+    return result
+
+
+class RetentionManager:
+    def __init__(self, database_path, policies=None, interval=3600, chunk_size=500,
+                 pause=0.05, vacuum_pages=256, tz_name=None):
+        """
+        :param policies: 表名 -> 保留天数，未设置的表使用 DEFAULT_POLICIES
+        :param interval: 每隔多少秒执行一次
+        :param chunk_size: 每个删除事务最多删除的记录数
+        :param pause: 每批之间停顿的秒数
+        :param vacuum_pages: 每个回收事务最多回收的页数
+        :param tz_name: 本地时间文本列（签到时间）所用的时区
+        """
+        self.database_path = database_path
+        self.policies = dict(DEFAULT_POLICIES)
+        for table, days in (policies or {}).items():
+            if table not in RETENTION_TABLES:
+                logger.warning(f"不支持按保留天数清理的表: {table}")
+                continue
+            self.policies[table] = days
+        self.interval = max(60, float(interval))
+        self.chunk_size = max(1, int(chunk_size))
+        self.pause = pause
+        self.vacuum_pages = max(1, int(vacuum_pages))
+        self.tz_name = tz_name
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'runs': 0,            # 执行次数
+            'failed': 0,          # 执行失败次数
+            'deleted': {},        # 各表累计删除的记录数
+            'vacuumed_pages': 0,  # 累计回收的页数
+            'seconds_total': 0.0,
+            'last_run': None      # 最近一次的结果
+        }
+
+    def start(self):
+        """启动清理线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='RetentionWorker', daemon=True)
+        self._thread.start()
+        logger.info(f"数据清理线程已启动: 保留天数 {self.policies}，每 {self.interval:.0f} 秒执行")
+
+    def _run(self):
+        conn = get_connection(self.database_path)
+        try:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                logger.info("数据库未启用增量回收，删除后的空间只在库内复用，"
+                            "可用 tools.py 的【压缩数据库】启用")
+            # 启动后稍等再执行，避开启动时的数据库操作
+            wait = min(60, self.interval)
+            while not self._stop.wait(wait):
+                self.run_once(conn)
+                wait = self.interval
+        finally:
+            release_connection(self.database_path)
+
+    def run_once(self, conn=None):
+        """执行一次清理，返回本次结果，失败时返回 None"""
+        conn = conn or get_connection(self.database_path)
+        try:
+            result = run_retention(conn, self.policies, self.chunk_size, self.pause, self.vacuum_pages,
+                                   self.tz_name)
+        except Exception as e:
+            with self._stats_lock:
+                self._stats['failed'] += 1
+            logger.error(f"数据清理失败: {str(e)}")
+            return None
+        with self._stats_lock:
+            self._stats['runs'] += 1
+            for table, count in result['deleted'].items():
+                self._stats['deleted'][table] = self._stats['deleted'].get(table, 0) + count
+            self._stats['vacuumed_pages'] += result['vacuumed_pages']
+            self._stats['seconds_total'] += result['seconds']
+            self._stats['last_run'] = result
+        return result
+
+    def stop(self, timeout=5):
+        """停止清理线程，正在执行清理时最多等待 timeout 秒"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        """获取统计数据"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['deleted'] = dict(self._stats['deleted'])
+        stats['seconds_total'] = round(stats['seconds_total'], 3)
+        stats['policies'] = dict(self.policies)
+        return stats
@@ -0,0 +1,111 @@
+'''
+最近传感器读数环形缓冲区 2026.10
+启动时从数据库加载一次，之后由传感器读取线程追加，
+24小时曲线和最近N条读数直接从内存读取，不访问数据库
+使用 array('d') 预分配定长存储，内存占用固定；读取失败的值以 NaN 存储
+'''
+import math
+import threading
+from array import array
+
+NAN = float('nan')
+
+
+def _to_float(value):
+    return NAN if value is None else float(value)
+
+
+def _from_float(value):
+    return None if math.isnan(value) else value
+
+
+class ReadingRing:
+    def __init__(self, capacity):
+        """
+        :param capacity: 最多保存的读数条数
+        """
+        self.capacity = max(1, int(capacity))
+        self._ts = array('d', [0.0]) * self.capacity
+        self._air = array('d', [NAN]) * self.capacity
+        self._humidity = array('d', [NAN]) * self.capacity
+        self._water = array('d', [NAN]) * self.capacity
+        self._start = 0  # 最早一条的位置
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, ts, air_temp, humidity, water_temp):
+        """追加一条读数，时间戳必须递增，早于最新一条的读数会被忽略"""
+        with self._lock:
+            if self._size and ts < self._ts[(self._start + self._size - 1) % self.capacity]:
+                return False
+            if self._size < self.capacity:
+                pos = (self._start + self._size) % self.capacity
+                self._size += 1
+            else:
+                # 已满，覆盖最早的一条
+                pos = self._start
+                self._start = (self._start + 1) % self.capacity
+            self._ts[pos] = ts
+            self._air[pos] = _to_float(air_temp)
+            self._humidity[pos] = _to_float(humidity)
+            self._water[pos] = _to_float(water_temp)
+            return True
+
+    def extend(self, rows):
+        """批量追加 [(时间戳, 气温, 湿度, 水温), ...]"""
+        for row in rows:
+            self.append(*row)
+
+    def _row(self, i):
+        pos = (self._start + i) % self.capacity
+        return (self._ts[pos], _from_float(self._air[pos]),
+                _from_float(self._humidity[pos]), _from_float(self._water[pos]))
+
+    def _first_after(self, ts, inclusive):
+        """二分查找第一条时间戳 >= ts（inclusive）或 > ts 的位置"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._ts[(self._start + mid) % self.capacity]
+            if value < ts or (not inclusive and value == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def since(self, start_ts, inclusive=True):
+        """返回时间戳不早于 start_ts 的读数"""
+        with self._lock:
+            first = self._first_after(start_ts, inclusive)
+            return [self._row(i) for i in range(first, self._size)]
+
+    def latest(self, n):
+        """返回最近 n 条读数"""
+        with self._lock:
+            first = max(0, self._size - max(0, int(n)))
+            return [self._row(i) for i in range(first, self._size)]
+
+    def oldest_ts(self):
+        with self._lock:
+            return self._ts[self._start] if self._size else None
+
+    def memory_bytes(self):
+        """四个数组占用的字节数"""
+        return sum(a.itemsize * len(a) for a in (self._ts, self._air, self._humidity, self._water))
+
+    def get_stats(self):
+        """获取统计数据"""
+        with self._lock:
+            size = self._size
+            oldest = self._ts[self._start] if size else None
+            newest = self._ts[(self._start + size - 1) % self.capacity] if size else None
+        return {
+            'size': size,
+            'capacity': self.capacity,
+            'memory_bytes': self.memory_bytes(),
+            'oldest': oldest,
+            'newest': newest
+        }
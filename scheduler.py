@@ -0,0 +1,205 @@
+'''
+定时计划调度 2026.10
+- 计算每个启用计划的下次执行时间，放入最小堆，线程一直睡到最早的执行时间（最长 max_sleep 秒）
+- 计划通过接口修改后调用 reload()，下次唤醒时从数据库重新加载并重建堆，平时不查询数据库
+- 不会漏执行：已处理到的时间记为 horizon，每次唤醒执行 (horizon, now] 内到期的所有计划，
+  前一个计划执行耗时较长（如舵机投喂）时，后面到期的计划稍后补执行，而不是跳过
+- 不会重复执行：执行后下次时间从本次计划时间往后算，重建堆时也从 horizon 往后算
+- 超过 misfire_grace 秒仍未执行的（如系统休眠、时钟跳变）记录日志后跳过
+- 重新加载失败（如数据库被锁）时继续使用原来的堆，间隔从 reload_retry 秒起加倍（最长 max_sleep 秒）重试
+- 时钟和等待函数可替换，便于用模拟时钟验证（见 bench.py schedule_week）
+'''
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('FishTankMonitor')
+
+
+def parse_days(feed_days):
+    """'0,1,6' -> {0, 1, 6}，0=周日"""
+    if isinstance(feed_days, (list, tuple, set)):
+        return {int(d) for d in feed_days}
+    return {int(d) for d in str(feed_days or '').split(',') if d.strip().isdigit()}
+
+
+def next_fire_time(feed_time, feed_days, after):
+    """
+    计划在 after（时间戳）之后的下一次执行时间（本地时间）
+    :param feed_time: HH:MM
+    :param feed_days: 星期集合，0=周日, 6=周六
+    :return: 时间戳，没有可执行的星期时返回 None
+    """
+    days = parse_days(feed_days)
+    if not days:
+        return None
+    hour, minute = (int(part) for part in feed_time.split(':')[:2])
+    start = datetime.fromtimestamp(after)
+    for offset in range(8):
+        day = start.date() + timedelta(days=offset)
+        weekday = (day.weekday() + 1) % 7  # 转换为 0=周日
+        if weekday not in days:
+            continue
+        fire = datetime(day.year, day.month, day.day, hour, minute).timestamp()
+        if fire > after:
+            return fire
+    return None
+
+
+class Scheduler:
+    def __init__(self, load_schedules, execute, save_next=None, clock=time.time,
+                 misfire_grace=600, max_sleep=60, reload_retry=1):
+        """
+        :param load_schedules: 返回启用的计划列表 [{'id', 'feed_time', 'feed_days', ...}, ...]
+        :param execute: 执行计划 execute(schedule, fire_time)
+        :param save_next: 保存下次执行时间 save_next({计划ID: 时间戳})，可为空
+        :param clock: 当前时间函数
+        :param misfire_grace: 超过该秒数仍未执行的计划跳过
+        :param max_sleep: 最长睡眠秒数，时钟被调整（如开机后 NTP 校时）时也能及时发现
+        :param reload_retry: 重新加载失败后首次重试的间隔秒数
+        """
+        self.load_schedules = load_schedules
+        self.execute = execute
+        self.save_next = save_next
+        self.clock = clock
+        self.misfire_grace = misfire_grace
+        self.max_sleep = max_sleep
+        self.reload_retry = reload_retry
+        self._heap = []         # (执行时间, 计划ID)
+        self._schedules = {}    # 计划ID -> 计划
+        self._horizon = None    # 该时间及之前到期的计划都已处理
+        self._dirty = True
+        self._retry_delay = 0   # 重新加载失败后的重试间隔
+        self._retry_at = 0      # 该时间之前不重试重新加载
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._stats = {
+            'fired': 0,        # 已执行
+            'failed': 0,       # 执行出错
+            'misfired': 0,     # 超时跳过
+            'reloads': 0,      # 重建堆次数
+            'reload_errors': 0,  # 重新加载失败次数
+            'max_delay': 0.0   # 最大延迟执行秒数
+        }
+
+    def reload(self):
+        """计划有变化，下次唤醒时重新加载（立即唤醒调度线程）"""
+        with self._lock:
+            self._dirty = True
+            self._retry_at = 0
+        self._wakeup.set()
+
+    def _rebuild(self):
+        schedules = self.load_schedules()
+        heap = []
+        for schedule in schedules:
+            fire = next_fire_time(schedule['feed_time'], schedule['feed_days'], self._horizon)
+            if fire is not None:
+                heap.append((fire, schedule['id']))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._schedules = {schedule['id']: schedule for schedule in schedules}
+        self._stats['reloads'] += 1
+        if self.save_next:
+            self.save_next({schedule_id: fire for fire, schedule_id in heap})
+        logger.info(f"定时计划已加载: {len(heap)} 个")
+
+    def run_pending(self):
+        """
+        执行所有到期的计划
+        :return: 距下一个计划的秒数（不超过 max_sleep）
+        """
+        if self._horizon is None:
+            self._horizon = self.clock()
+        with self._lock:
+            dirty = self._dirty and self.clock() >= self._retry_at
+            if dirty:
+                self._dirty = False
+        if dirty:
+            try:
+                self._rebuild()
+                self._retry_delay = 0
+            except Exception as e:
+                # 保留原来的堆继续执行，稍后重试
+                self._retry_delay = min(max(self._retry_delay * 2, self.reload_retry), self.max_sleep)
+                with self._lock:
+                    self._dirty = True
+                    self._retry_at = self.clock() + self._retry_delay
+                self._stats['reload_errors'] += 1
+                logger.error(f"加载定时计划失败，{self._retry_delay:.0f} 秒后重试: {str(e)}")
+
+        while self._heap and self._heap[0][0] <= self.clock():
+            fire, schedule_id = heapq.heappop(self._heap)
+            schedule = self._schedules[schedule_id]
+            delay = self.clock() - fire
+            if delay > self.misfire_grace:
+                self._stats['misfired'] += 1
+                logger.warning(f"计划 {schedule.get('schedule_name')} 超时 {delay:.0f} 秒未执行，跳过")
+            else:
+                self._stats['max_delay'] = max(self._stats['max_delay'], delay)
+                try:
+                    self.execute(schedule, fire)
+                    self._stats['fired'] += 1
+                except Exception as e:
+                    self._stats['failed'] += 1
+                    logger.error(f"执行计划失败 {schedule.get('schedule_name')}: {str(e)}")
+            # 下次时间从本次计划时间往后算，执行耗时不影响
+            next_fire = next_fire_time(schedule['feed_time'], schedule['feed_days'], fire)
+            if next_fire is not None:
+                heapq.heappush(self._heap, (next_fire, schedule_id))
+                if self.save_next:
+                    self.save_next({schedule_id: next_fire})
+            self._horizon = max(self._horizon, fire)
+
+        now = self.clock()
+        if not self._dirty:
+            # 等待重新加载时不推进，加载成功后补执行期间到期的计划
+            self._horizon = max(self._horizon, now)
+        timeout = self.max_sleep
+        if self._heap:
+            timeout = min(self._heap[0][0] - now, timeout)
+        if self._dirty:
+            timeout = min(self._retry_at - now, timeout)
+        return max(0.0, timeout)
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                timeout = self.run_pending()
+            except Exception as e:
+                logger.error(f"计划调度出错: {str(e)}")
+                timeout = self.max_sleep
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def start(self):
+        """启动调度线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='Scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """停止调度线程"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def upcoming(self, n=10):
+        """最近要执行的计划 [(时间戳, 计划ID), ...]"""
+        return heapq.nsmallest(n, self._heap)
+
+    def get_stats(self):
+        """获取统计数据"""
+        stats = dict(self._stats)
+        stats['max_delay'] = round(stats['max_delay'], 3)
+        stats['scheduled'] = len(self._heap)
+        upcoming = self.upcoming(1)
+        stats['next_fire'] = upcoming[0][0] if upcoming else None
+        return stats
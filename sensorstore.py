@@ -0,0 +1,230 @@
+'''
+传感器数据分级存储 2026.10
+- sensor_data      原始数据，ts 为整数时间戳（秒），timestamp 文本列仅为兼容旧数据保留
+- sensor_data_15m  每15分钟汇总（最小/最大/合计/条数，平均值=合计/条数）
+- sensor_data_1h   每小时汇总
+写入原始数据时在同一事务内累加到汇总表，查询时按时间跨度选择合适的级别，
+原始数据可按保留天数过期删除，汇总数据一直保留
+时间只在接口返回时格式化为本地时间
+'''
+import time
+import logging
+from datetime import datetime
+
+import pytz
+
+from dbconn import transaction
+
+logger = logging.getLogger('FishTankMonitor')
+
+METRICS = ('air_temp', 'humidity', 'water_temp')
+
+# 汇总级别：表名 -> 时段长度(秒)
+TIERS = (
+    ('sensor_data_15m', 15 * 60),
+    ('sensor_data_1h', 3600),
+)
+
+# 时间跨度不超过该值时使用对应的数据级别
+RAW_MAX_SPAN = 2 * 24 * 3600
+TIER_15M_MAX_SPAN = 10 * 24 * 3600
+
+
+def bucket_start(ts, size):
+    """时间戳所在的本地时段起点"""
+    offset = time.localtime(ts).tm_gmtoff
+    return int(ts) - (int(ts) + offset) % size
+
+
+def _upsert_sql(table):
+    columns = ['bucket']
+    updates = []
+    for m in METRICS:
+        columns += [f'{m}_min', f'{m}_max', f'{m}_sum', f'{m}_count']
+        updates += [
+            f'{m}_min = MIN(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min))',
+            f'{m}_max = MAX(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))',
+            f'{m}_sum = COALESCE({m}_sum, 0) + COALESCE(excluded.{m}_sum, 0)',
+            f'{m}_count = {m}_count + excluded.{m}_count',
+        ]
+    return f'''
+        INSERT INTO {table} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT(bucket) DO UPDATE SET {', '.join(updates)}
+    '''
+
+
+_UPSERT_SQL = {table: _upsert_sql(table) for table, _ in TIERS}
+
+
+def _tier_row(bucket, values):
+    row = [bucket]
+    for value in values:
+        if value is None:
+            row += [None, None, None, 0]
+        else:
+            row += [value, value, value, 1]
+    return row
+
+
+def update_tiers(conn, readings):
+    """
+    把读数累加到各级汇总表
+    :param readings: [(时间戳, 气温, 湿度, 水温), ...]
+    """
+    for table, size in TIERS:
+        conn.executemany(_UPSERT_SQL[table], [
+            _tier_row(bucket_start(ts, size), values)
+            for ts, *values in readings
+        ])
+
+
+def record_reading(conn, ts, air_temp, humidity, water_temp):
+    """写入一条原始数据并更新汇总表（同一事务）"""
+    with transaction(conn):
+        conn.execute('''
+            INSERT INTO sensor_data (ts, air_temp, humidity, water_temp)
+            VALUES (?, ?, ?, ?)
+        ''', (int(ts), air_temp, humidity, water_temp))
+        update_tiers(conn, [(ts, air_temp, humidity, water_temp)])
+
+
+def parse_local_time(text, tz_name):
+    """把本地时间字符串（旧数据的 timestamp 列）转换为时间戳"""
+    tz = pytz.timezone(tz_name)
+    return int(tz.localize(datetime.strptime(text[:19], '%Y-%m-%d %H:%M:%S')).timestamp())
+
+
+def choose_tier(span):
+    """根据时间跨度选择数据级别，返回表名，None 表示原始数据"""
+    if span <= RAW_MAX_SPAN:
+        return None
+    if span <= TIER_15M_MAX_SPAN:
+        return TIERS[0][0]
+    return TIERS[1][0]
+
+
+def query_raw(conn, start_ts, end_ts):
+    """按 idx_sensor_ts 索引查询时间范围内的原始数据 [(时间戳, 气温, 湿度, 水温), ...]"""
+    return conn.execute('''
+        SELECT ts, air_temp, humidity, water_temp
+        FROM sensor_data
+        WHERE ts >= ? AND ts <= ?
+        ORDER BY ts
+    ''', (int(start_ts), int(end_ts))).fetchall()
+
+
+def query_series(conn, start_ts, end_ts):
+    """
+    查询时间范围内的数据，按跨度自动选择原始数据或汇总数据
+    :return: (级别, [(时间戳, 气温, 湿度, 水温), ...])，汇总数据取平均值
+    """
+    table = choose_tier(end_ts - start_ts)
+    if table is None:
+        return 'raw', query_raw(conn, start_ts, end_ts)
+    return table, query_tier(conn, table, start_ts, end_ts)
+
+
+def query_tier(conn, table, start_ts, end_ts):
+    """
+    查询汇总表中时间范围内的时段平均值 [(时段起点, 气温, 湿度, 水温), ...]
+    start_ts 所在的时段也包含在内
+    """
+    avgs = ', '.join(
+        f'CASE WHEN {m}_count > 0 THEN {m}_sum / {m}_count END' for m in METRICS
+    )
+    return conn.execute(f'''
+        SELECT bucket, {avgs}
+        FROM {table}
+        WHERE bucket >= ? AND bucket <= ?
+        ORDER BY bucket
+    ''', (bucket_start(start_ts, dict(TIERS)[table]), end_ts)).fetchall()
+
+
+def rebuild_tiers(conn, tz_name, chunk_size=5000):
+    """
+    根据原始数据重建汇总表（首次启用或数据修复时使用）
+    :return: 处理的记录数
+    """
+    with transaction(conn):
+        for table, _ in TIERS:
+            conn.execute(f'DELETE FROM {table}')
+        max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM sensor_data').fetchone()[0]
+
+    last_id = 0
+    total = 0
+    while last_id < max_id:
+        rows = conn.execute('''
+            SELECT id, ts, timestamp, air_temp, humidity, water_temp FROM sensor_data
+            WHERE id > ? AND id <= ?
+            ORDER BY id LIMIT ?
+        ''', (last_id, max_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        # 尚未迁移的旧数据 ts 为空，按文本时间换算
+        readings = [(row[1] if row[1] is not None else parse_local_time(row[2], tz_name),
+                     row[3], row[4], row[5]) for row in rows]
+        with transaction(conn):
+            update_tiers(conn, readings)
+        total += len(rows)
+    return total
+
+
+def expire_raw(conn, retention_days, chunk_size=1000):
+    """
+    删除超过保留天数的原始数据，汇总数据不受影响
+    分小批删除，每批一个短事务，避免长时间占用写锁
+    :return: 删除的记录数
+    """
+    if not retention_days or retention_days <= 0:
+        return 0
+    cutoff = int(time.time() - retention_days * 24 * 3600)
+    total = 0
+    while True:
+        with transaction(conn):
+            cur = conn.execute('''
+                DELETE FROM sensor_data WHERE id IN (
+                    SELECT id FROM sensor_data WHERE ts < ? LIMIT ?
+                )
+            ''', (cutoff, chunk_size))
+        total += cur.rowcount
+        if cur.rowcount < chunk_size:
+            break
+        time.sleep(0.05)
+    if total:
+        logger.info(f"已删除 {total} 条超过 {retention_days} 天的原始传感器数据")
+    return total
+
+
+def migrate_epoch(conn, tz_name, batch_size=2000, pause=0.1):
+    """
+    在线迁移：把旧数据 timestamp 文本列换算为 ts 整数时间戳
+    从最新的数据往前按 id 分批处理，每批一个短事务并稍作停顿，不阻塞写入进程，
+    最近的数据最先可用；可重复执行，已迁移的行会跳过
+    :return: 迁移的记录数
+    """
+    upper = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM sensor_data').fetchone()[0]
+    total = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, timestamp FROM sensor_data
+            WHERE id < ? AND ts IS NULL
+            ORDER BY id DESC LIMIT ?
+        ''', (upper, batch_size)).fetchall()
+        if not rows:
+            break
+        upper = rows[-1][0]
+        updates = []
+        for row_id, text in rows:
+            try:
+                updates.append((parse_local_time(text, tz_name), row_id))
+            except (TypeError, ValueError):
+                logger.warning(f"无法转换的时间 id={row_id}: {text}")
+        with transaction(conn):
+            conn.executemany('UPDATE sensor_data SET ts = ? WHERE id = ?', updates)
+        total += len(updates)
+        time.sleep(pause)
+    if total:
+        logger.info(f"传感器数据时间戳迁移完成: {total} 条")
+    return total
@@ -0,0 +1,213 @@
+'''
+系统状态快照 2026.10
+- 传感器线程、执行器、连接监控等写入方调用 publish() 发布变化的字段，
+  生成带版本号的新快照整体替换；值没有变化时不生成新版本
+- 只放随事件变化的字段；每隔几秒就变化的系统指标不放入快照，否则几乎每次轮询都是新版本
+- 读取方 current() 直接取当前快照的引用，不加锁，快照内容只读（MappingProxyType）
+- 快照的 JSON 内容每个版本只序列化一次，ETag 由启动标识和版本号组成，
+  /status 收到相同的 If-None-Match 时返回 304
+- 推送：sse_stream() 生成 Server-Sent Events，连接后先发完整快照，之后只发变化的字段，
+  定时发心跳；重连时按 Last-Event-ID 补发期间的变化（超出保留的版本数时发完整快照）
+  所有订阅者等待同一个条件变量，发布时每个版本的变化只序列化一次，各连接直接复用
+- 推送只在快照有变化时发送 delta；系统指标等不在快照中的数据可作为附加频道，
+  按固定间隔发送（事件不带 id，不影响 Last-Event-ID 和版本）
+'''
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from types import MappingProxyType
+
+
+class Snapshot:
+    """某个版本的状态，创建后不再修改"""
+    __slots__ = ('version', 'data', 'changes', 'time', 'etag', '_body', '_delta')
+
+    def __init__(self, version, data, changes, boot_id):
+        self.version = version
+        self.data = MappingProxyType(data)
+        self.changes = MappingProxyType(changes)  # 相对上一版本变化的字段
+        self.time = time.time()
+        self.etag = f'{boot_id}-{version}'
+        self._body = None
+        self._delta = None
+
+    def body(self):
+        """JSON 内容（首次调用时序列化，之后复用）"""
+        body = self._body
+        if body is None:
+            body = json.dumps(dict(self.data), ensure_ascii=False)
+            self._body = body
+        return body
+
+    def delta(self):
+        """相对上一版本变化字段的 JSON 内容（首次调用时序列化，之后复用）"""
+        delta = self._delta
+        if delta is None:
+            delta = json.dumps(dict(self.changes), ensure_ascii=False)
+            self._delta = delta
+        return delta
+
+
+class StateStore:
+    def __init__(self, initial=None, history=64):
+        """
+        :param history: 保留最近多少个版本，用于重连时补发变化
+        """
+        # 启动标识，重启后版本号从头计数，ETag 也不会与重启前的相同
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()  # 写入方之间、写入方与等待的订阅者之间，读取不用
+        self._changed = threading.Condition(self._lock)
+        data = dict(initial or {})
+        self._current = Snapshot(1, data, data, self._boot_id)
+        self._history = deque([self._current], maxlen=max(1, int(history)))
+        self._subscribers = 0
+        self._stats = {
+            'published': 0,  # 生成新版本的次数
+            'unchanged': 0,  # 值没有变化、未生成新版本的次数
+            'resumed': 0,    # 按 Last-Event-ID 补发变化的重连次数
+            'resynced': 0    # 重连时只能发完整快照的次数
+        }
+
+    def current(self):
+        """当前快照"""
+        return self._current
+
+    def get(self, key, default=None):
+        """当前快照中的一个字段"""
+        return self._current.data.get(key, default)
+
+    def publish(self, **changes):
+        """
+        发布变化的字段，有变化时生成新版本并唤醒等待的订阅者
+        :return: 发布后的当前快照
+        """
+        with self._lock:
+            current = self._current
+            changed = {k: v for k, v in changes.items()
+                       if k not in current.data or current.data[k] != v}
+            if not changed:
+                self._stats['unchanged'] += 1
+                return current
+            data = dict(current.data)
+            data.update(changed)
+            self._current = Snapshot(current.version + 1, data, changed, self._boot_id)
+            self._history.append(self._current)
+            self._stats['published'] += 1
+            self._changed.notify_all()
+            return self._current
+
+    def wait(self, version, timeout=None):
+        """等待版本号大于 version 的快照，超时返回当前快照"""
+        with self._lock:
+            self._changed.wait_for(lambda: self._current.version > version, timeout)
+            return self._current
+
+    def parse_event_id(self, event_id):
+        """Last-Event-ID（即 ETag）转换为版本号，不是本次启动的返回 None"""
+        boot_id, _, version = (event_id or '').partition('-')
+        if boot_id != self._boot_id or not version.isdigit():
+            return None
+        return int(version)
+
+    def changes_since(self, version, until):
+        """
+        version 之后到 until 版本变化的字段（合并后的 JSON），
+        version 已不在保留的版本中时返回 None
+        """
+        with self._lock:
+            history = list(self._history)
+        if version >= until:
+            return '{}'
+        if version < history[0].version - 1:
+            return None
+        later = [s for s in history if version < s.version <= until]
+        if len(later) == 1:
+            return later[0].delta()
+        merged = {}
+        for snapshot in later:
+            merged.update(snapshot.changes)
+        return json.dumps(merged, ensure_ascii=False)
+
+    def get_stats(self):
+        """获取统计数据"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = self._subscribers
+        stats['version'] = self._current.version
+        stats['fields'] = len(self._current.data)
+        return stats
+
+    def subscribe(self, max_subscribers=None):
+        """登记一个订阅者，超过 max_subscribers 时返回 False"""
+        with self._lock:
+            if max_subscribers is not None and self._subscribers >= max_subscribers:
+                return False
+            self._subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._lock:
+            self._subscribers -= 1
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+def _event(snapshot, event, data):
+    return f'id: {snapshot.etag}\nevent: {event}\ndata: {data}\n\n'
+
+
+def sse_stream(store, last_event_id=None, heartbeat=15, retry=3000, side=None, side_interval=10):
+    """
+    Server-Sent Events 内容，调用方需先 subscribe()，连接关闭时 unsubscribe()
+    （生成器可能还未开始就被关闭，不能在生成器内 unsubscribe）
+    事件：snapshot（完整状态）/ delta（变化的字段），id 为快照的 ETag
+    :param heartbeat: 没有发送任何事件时每隔多少秒发送一次注释行，保持连接并及时发现断开
+    :param retry: 建议浏览器断开后多少毫秒重连
+    :param side: 附加频道 (事件名, 返回 JSON 内容的函数)，连接后立即发送一次，之后每 side_interval 秒发送一次
+    """
+    yield f'retry: {int(retry)}\n\n'
+    snapshot = store.current()
+    version = store.parse_event_id(last_event_id)
+    changes = store.changes_since(version, snapshot.version) if version is not None else None
+    if changes is None:
+        if last_event_id:
+            store._count('resynced')
+        yield _event(snapshot, 'snapshot', snapshot.body())
+    else:
+        store._count('resumed')
+        if snapshot.version > version:
+            yield _event(snapshot, 'delta', changes)
+    version = snapshot.version
+
+    next_side = time.monotonic()
+    last_sent = time.monotonic()
+    while True:
+        if side is not None and time.monotonic() >= next_side:
+            yield f'event: {side[0]}\ndata: {side[1]()}\n\n'
+            next_side = time.monotonic() + side_interval
+            last_sent = time.monotonic()
+        timeout = heartbeat - (time.monotonic() - last_sent)
+        if side is not None:
+            timeout = min(timeout, next_side - time.monotonic())
+        snapshot = store.wait(version, max(0.0, timeout))
+        if snapshot.version == version:
+            if time.monotonic() - last_sent >= heartbeat:
+                yield ': ping\n\n'
+                last_sent = time.monotonic()
+            continue
+        if snapshot.version == version + 1:
+            data = snapshot.delta()
+        else:
+            # 等待期间有多个版本，合并变化
+            data = store.changes_since(version, snapshot.version)
+            if data is None:
+                yield _event(snapshot, 'snapshot', snapshot.body())
+                version = snapshot.version
+                continue
+        yield _event(snapshot, 'delta', data)
+        last_sent = time.monotonic()
+        version = snapshot.version
@@ -0,0 +1,175 @@
+'''
+系统指标后台采样 2026.10
+- 后台线程每 interval 秒采样一次：各网卡收发字节数、CPU 温度、内存使用率、系统负载，
+  /api/system 直接读取最近一次的结果，不再每次请求 sleep 1 秒计算网速、启动 vcgencmd 进程
+- 网速为最近 window 次采样的滑动平均（KB/s），网卡计数器回绕或重置时重新计算
+- CPU 温度从 /sys/class/thermal/thermal_zone*/temp 读取（优先 cpu-thermal），
+  没有 thermal zone 时才调用 vcgencmd（都没有时为空）
+- 每次采样生成新的结果字典整体替换，读取方不加锁，拿到的结果不会被修改
+'''
+import glob
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+import psutil
+
+logger = logging.getLogger('FishTankMonitor')
+
+THERMAL_ZONES = '/sys/class/thermal/thermal_zone*'
+
+
+def find_cpu_thermal_zone(pattern=THERMAL_ZONES):
+    """CPU 温度文件路径，优先 type 为 cpu-thermal / cpu_thermal 的 zone，都没有时用第一个"""
+    zones = sorted(glob.glob(pattern))
+    for zone in zones:
+        try:
+            with open(os.path.join(zone, 'type')) as f:
+                if 'cpu' in f.read().strip().lower():
+                    return os.path.join(zone, 'temp')
+        except OSError:
+            continue
+    return os.path.join(zones[0], 'temp') if zones else None
+
+
+def read_thermal_zone(path):
+    """读取温度文件（毫摄氏度），返回摄氏度"""
+    with open(path) as f:
+        return round(int(f.read().strip()) / 1000.0, 1)
+
+
+def read_vcgencmd_temp():
+    """vcgencmd measure_temp 读取 CPU 温度"""
+    temp = os.popen("vcgencmd measure_temp").readline()
+    return float(temp.replace("temp=", "").replace("'C\n", ""))
+
+
+class SystemSampler:
+    def __init__(self, interfaces=('eth0',), interval=2, window=3, on_sample=None):
+        """
+        :param interfaces: 计算网速的网卡
+        :param interval: 采样间隔（秒）
+        :param window: 网速按最近几次采样平均
+        :param on_sample: 每次采样后调用 on_sample(结果)，可为空
+        """
+        self.interfaces = list(interfaces)
+        self.interval = max(0.5, float(interval))
+        self.window = max(1, int(window))
+        self.on_sample = on_sample
+        self._counters = {name: deque(maxlen=self.window + 1) for name in self.interfaces}
+        self._thermal_path = find_cpu_thermal_zone()
+        self._vcgencmd = None if self._thermal_path else shutil.which('vcgencmd')
+        self._snapshot = {'time': None, 'network': {}, 'cpu_temp': None,
+                          'mem_usage': None, 'load': None}
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {
+            'samples': 0,
+            'failed': 0,
+            'sample_ms_total': 0.0,
+            'sample_ms_max': 0.0
+        }
+
+    def start(self):
+        """启动采样线程，先同步采样一次，启动后立即有数据"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='SystemSampler', daemon=True)
+        self._thread.start()
+        logger.info(f"系统指标采样线程已启动: 网卡 {self.interfaces}，每 {self.interval} 秒采样，"
+                    f"CPU 温度 {self._thermal_path or self._vcgencmd or '无'}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def _read_cpu_temp(self):
+        try:
+            if self._thermal_path:
+                return read_thermal_zone(self._thermal_path)
+            if self._vcgencmd:
+                return read_vcgencmd_temp()
+            return None
+        except Exception:
+            return None
+
+    def _network_rates(self, now):
+        counters = psutil.net_io_counters(pernic=True)
+        network = {}
+        for name in self.interfaces:
+            history = self._counters[name]
+            io = counters.get(name)
+            if io is None:
+                history.clear()
+                network[name] = None
+                continue
+            if history and (io.bytes_sent < history[-1][1] or io.bytes_recv < history[-1][2]):
+                history.clear()  # 计数器回绕或网卡重启
+            history.append((now, io.bytes_sent, io.bytes_recv))
+            first, last = history[0], history[-1]
+            elapsed = last[0] - first[0]
+            if elapsed <= 0:
+                network[name] = {'upload_speed': 0.0, 'download_speed': 0.0}
+                continue
+            network[name] = {
+                'upload_speed': round((last[1] - first[1]) / elapsed / 1024, 2),    # KB/s
+                'download_speed': round((last[2] - first[2]) / elapsed / 1024, 2)   # KB/s
+            }
+        return network
+
+    def sample(self):
+        """采样一次并发布新的结果"""
+        begin = time.perf_counter()
+        now = time.monotonic()
+        try:
+            snapshot = {
+                'time': time.time(),
+                'network': self._network_rates(now),
+                'cpu_temp': self._read_cpu_temp(),
+                'mem_usage': psutil.virtual_memory().percent,
+                'load': [round(x, 2) for x in os.getloadavg()]
+            }
+        except Exception as e:
+            self._stats['failed'] += 1
+            logger.error(f"系统指标采样失败: {str(e)}")
+            return
+        self._snapshot = snapshot
+        if self.on_sample:
+            try:
+                self.on_sample(snapshot)
+            except Exception as e:
+                logger.error(f"系统指标发布失败: {str(e)}")
+        elapsed = (time.perf_counter() - begin) * 1000
+        self._stats['samples'] += 1
+        self._stats['sample_ms_total'] += elapsed
+        self._stats['sample_ms_max'] = max(self._stats['sample_ms_max'], elapsed)
+
+    def snapshot(self):
+        """最近一次采样结果（不要修改）"""
+        return self._snapshot
+
+    def network(self, interface):
+        """网卡的上传、下载速度 {'upload_speed', 'download_speed'}，没有数据时返回 None"""
+        return self._snapshot['network'].get(interface)
+
+    def stop(self, timeout=5):
+        """停止采样线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        """获取统计数据"""
+        stats = dict(self._stats)
+        samples = stats.pop('sample_ms_total')
+        stats['sample_ms_avg'] = round(samples / (stats['samples'] or 1), 3)
+        stats['sample_ms_max'] = round(stats['sample_ms_max'], 3)
+        stats['interval'] = self.interval
+        stats['interfaces'] = self.interfaces
+        stats['thermal_zone'] = self._thermal_path
+        return stats
@@ -0,0 +1,142 @@
+'''
+数据表分页浏览 2026.10
+- 键集分页：按主键（或 时间列+主键）排序，翻页条件为 (键) > (本页最后一行的键)，
+  每页都从索引直接定位，百万行的表翻到最后一页也和第一页一样快，不用 OFFSET
+- 可向前、向后翻页，跳到第一页 / 最后一页，按时间跳转（时间列见 dbexport.TIME_COLUMNS）
+- 查询只用有索引的列：= 精确匹配，或 值* 前缀匹配（转换为索引范围查询）
+- 执行前用 EXPLAIN QUERY PLAN 检查，会全表扫描时先返回查询计划，由调用方确认
+'''
+from dbexport import TIME_COLUMNS
+
+# 前缀匹配的上界，比任何正常字符都大
+_PREFIX_END = '\U0010ffff'
+
+
+def primary_key(conn, table):
+    """表的主键列，没有声明主键时使用 rowid"""
+    info = conn.execute(f'PRAGMA table_info({table})').fetchall()
+    if not info:
+        raise ValueError(f"表 '{table}' 不存在")
+    pk = [col[1] for col in sorted(info, key=lambda col: col[5]) if col[5] > 0]
+    return [col[1] for col in info], pk or ['rowid']
+
+
+def indexed_columns(conn, table):
+    """可以用索引查找的列（主键列和各索引的第一列）"""
+    columns, pk = primary_key(conn, table)
+    result = {pk[0]} if pk[0] != 'rowid' else set()
+    for index in conn.execute(f'PRAGMA index_list({table})').fetchall():
+        info = conn.execute(f"PRAGMA index_info('{index[1]}')").fetchall()
+        for seqno, _, name in info:
+            if seqno == 0 and name:
+                result.add(name)
+    return [c for c in columns if c in result]
+
+
+def query_plan(conn, sql, params=()):
+    """
+    查询计划，返回 (计划说明列表, 是否全表扫描)
+    SCAN 表示逐行扫描整个表或整个索引（SEARCH 才是按索引定位），带过滤条件时即为全表扫描
+    """
+    details = [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+    full_scan = any(d.startswith('SCAN') for d in details)
+    return details, full_scan
+
+
+def search_condition(column, value):
+    """
+    查询条件：值以 * 结尾时为前缀匹配（索引范围查询），否则精确匹配
+    :return: (条件语句, 参数)
+    """
+    if value.endswith('*') and len(value) > 1:
+        prefix = value[:-1]
+        return f'{column} >= ? AND {column} < ?', [prefix, prefix + _PREFIX_END]
+    return f'{column} = ?', [value]
+
+
+class TablePager:
+    def __init__(self, conn, table, page_size=20, order='key', where=None, params=()):
+        """
+        :param order: key 按主键排序 / time 按时间列排序
+        :param where: 额外的过滤条件（查询时使用）
+        """
+        self.conn = conn
+        self.table = table
+        self.page_size = max(1, int(page_size))
+        self.columns, pk = primary_key(conn, table)
+        self.time_column = TIME_COLUMNS.get(table)
+        if self.time_column not in self.columns:
+            self.time_column = None
+        if order == 'time':
+            if self.time_column is None:
+                raise ValueError(f"表 '{table}' 没有时间列")
+            # 时间列加主键保证排序唯一
+            self.key = [self.time_column] + [c for c in pk if c != self.time_column]
+        else:
+            self.key = pk
+        self.where = where
+        self.params = list(params)
+        self._select = ', '.join(self.key + ['*'])
+        self._first = None  # 当前页第一行的键
+        self._last = None   # 当前页最后一行的键
+
+    def _key_tuple(self, columns):
+        return f"({', '.join(columns)})" if len(columns) > 1 else columns[0]
+
+    def _query(self, condition=None, params=(), descending=False):
+        conditions = [c for c in (self.where, condition) if c]
+        sql = f'SELECT {self._select} FROM {self.table}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(f'({c})' for c in conditions)
+        direction = ' DESC' if descending else ''
+        sql += ' ORDER BY ' + ', '.join(c + direction for c in self.key)
+        return sql + ' LIMIT ?', self.params + list(params) + [self.page_size]
+
+    def _fetch(self, condition=None, params=(), descending=False):
+        sql, args = self._query(condition, params, descending)
+        rows = self.conn.execute(sql, args).fetchall()
+        if descending:
+            rows.reverse()
+        if not rows:
+            return []
+        n = len(self.key)
+        self._first, self._last = rows[0][:n], rows[-1][:n]
+        return [row[n:] for row in rows]
+
+    def _compare(self, op, key):
+        """键与指定行比较的条件，多列主键用行值比较 (a, b) > (?, ?)"""
+        placeholders = ', '.join('?' * len(key))
+        if len(key) > 1:
+            placeholders = f'({placeholders})'
+        return f'{self._key_tuple(self.key)} {op} {placeholders}', list(key)
+
+    def plan(self):
+        """第一页查询的查询计划，返回 (计划说明列表, 是否全表扫描)"""
+        sql, args = self._query()
+        return query_plan(self.conn, sql, args)
+
+    def first(self):
+        """第一页"""
+        return self._fetch()
+
+    def last(self):
+        """最后一页"""
+        return self._fetch(descending=True)
+
+    def next(self):
+        """下一页，已经是最后一页时返回空列表，当前位置不变"""
+        if self._last is None:
+            return self.first()
+        return self._fetch(*self._compare('>', self._last))
+
+    def prev(self):
+        """上一页，已经是第一页时返回空列表，当前位置不变"""
+        if self._first is None:
+            return self.last()
+        return self._fetch(*self._compare('<', self._first), descending=True)
+
+    def seek(self, ts):
+        """跳到时间 ts（时间戳）开始的一页，需按时间排序"""
+        if self.key[0] != self.time_column:
+            raise ValueError("按时间跳转需要按时间排序")
+        return self._fetch(f'{self.time_column} >= ?', [ts])
@@ -2,22 +2,51 @@
 # -*- coding: utf-8 -*-
 """
 鱼缸监控系统维护工具
-功能：备份数据库 / 清空日志 / 数据库管理
+功能：备份数据库 / 导出表数据 / 清空日志 / 数据库管理 / 重建访问统计 / 重建传感器汇总 / 检索访问记录 /
+      清理过期数据 / 压缩数据库
+用法：
+sudo python3 tools.py                  # 交互菜单
+sudo python3 tools.py backup [--compress auto|zstd|gzip|none] [--keep 7] [--days 30]
+                                       # 非交互备份，可放入 cron，失败时返回非0
+sudo python3 tools.py export access_records [--format csv|ndjson] [--since 2026-09-01] [--until 2026-10-01]
+                     [--compress auto|zstd|gzip|none] [--output 文件]
+                                       # 流式导出表数据，内存占用与表大小无关
+                                       # 访问记录导出 access_records_text 视图可得到路径和 User-Agent 文本
+sudo python3 tools.py search 关键词 [--field path|user_agent] [--limit 50]
+                                       # 按路径和 User-Agent 检索访问记录（全文索引）
+sudo python3 tools.py retention [--access-days 30] [--signin-days 0] [--feeding-days 0]
+                                       # 立即清理过期数据并回收空间
+sudo python3 tools.py vacuum           # 压缩数据库并启用增量回收（执行期间占用数据库）
 日志文件：/var/log/fishtank_monitor.log
 数据库文件：/var/lib/fishtank/sensor_data.db
 """
 
 import os
 import sys
-import shutil
 import logging
-import sqlite3
+import time
+import argparse
 from datetime import datetime
 
+import pytz
+
+from dbconn import get_connection
+from dbbackup import backup_database as online_backup, choose_compression
+from dbexport import export_table as stream_export, export_filename, FORMATS, TIME_COLUMNS
+from tablepager import TablePager, primary_key, indexed_columns, search_condition
+from accesslog import rebuild_rollups
+from accesssearch import search_access, rebuild_fts
+from retention import run_retention, db_size, DEFAULT_POLICIES
+from sensorstore import rebuild_tiers
+
 # 配置常量
 LOG_FILE = "/var/log/fishtank_monitor.log"
 DB_FILE = "/var/lib/fishtank/sensor_data.db"
 DB_BACKUP_DIR = "/home/miaoking/mycode/YuGang/backup"
+DB_BACKUP_KEEP = 7  # 保留最近的备份个数
+DB_BACKUP_DAYS = 30  # 备份保留天数
+DB_EXPORT_DIR = "/home/miaoking/mycode/YuGang/export"
+TIMEZONE = "Asia/Shanghai"
 
 # 配置日志
 logging.basicConfig(
@@ -33,53 +62,76 @@ logger = logging.getLogger(__name__)
 def get_table_list():
     """获取数据库中的所有表名"""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection(DB_FILE)
         cursor = conn.cursor()
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
         tables = [table[0] for table in cursor.fetchall()]
-        conn.close()
         return tables
     except Exception as e:
         logger.error(f"获取表列表失败: {str(e)}")
         return []
 
-def show_table_data(table_name, limit=10):
-    """显示指定表的数据"""
+def print_rows(columns, rows, title):
+    """按列显示记录"""
+    print(f"\n{title}")
+    print("-" * 80)
+    print(" | ".join(columns))
+    print("-" * 80)
+    for row in rows:
+        print(" | ".join(str(item) for item in row))
+    print("-" * 80)
+
+def browse_pages(pager, title):
+    """
+    分页浏览，翻页用键集分页，不受表大小影响
+    n 下一页 / p 上一页 / f 第一页 / l 最后一页 / t 跳转到时间（按时间排序时）/ q 返回
+    """
+    rows = pager.first()
+    while True:
+        if rows:
+            print_rows(pager.columns, rows, title)
+        else:
+            print("没有更多记录")
+        commands = "n 下一页 / p 上一页 / f 第一页 / l 最后一页"
+        if pager.key[0] == pager.time_column:
+            commands += " / t 跳转到时间"
+        choice = input(f"{commands} / q 返回: ").strip().lower()
+        if choice in ('', 'n'):
+            rows = pager.next()
+        elif choice == 'p':
+            rows = pager.prev()
+        elif choice == 'f':
+            rows = pager.first()
+        elif choice == 'l':
+            rows = pager.last()
+        elif choice == 't' and pager.key[0] == pager.time_column:
+            try:
+                ts = parse_time_arg(input("跳转到时间 YYYY-MM-DD [HH:MM[:SS]]: "))
+                rows = pager.seek(ts) if ts is not None else rows
+            except ValueError as e:
+                print(e)
+        elif choice == 'q':
+            return
+        else:
+            print("无效的选择")
+
+def show_table_data(table_name, page_size=10, order='key'):
+    """分页浏览指定表的数据，order 为 key 按主键 / time 按时间"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # 获取表结构
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        # 获取数据
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT {limit}")
-        rows = cursor.fetchall()
-        
-        conn.close()
-        
-        # 显示结果
-        print(f"\n表 '{table_name}' 的前 {limit} 条记录:")
-        print("-" * 80)
-        print(" | ".join(columns))
-        print("-" * 80)
-        for row in rows:
-            print(" | ".join(str(item) for item in row))
-        print("-" * 80)
-        print(f"共显示 {len(rows)} 条记录")
-        
+        conn = get_connection(DB_FILE)
+        pager = TablePager(conn, table_name, page_size, order)
+        by = "时间" if order == 'time' else "主键"
+        browse_pages(pager, f"表 '{table_name}' 的记录（按{by}排序，每页 {pager.page_size} 条）:")
     except Exception as e:
         logger.error(f"显示表数据失败: {str(e)}")
 
 def clear_table(table_name):
     """清空指定表"""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection(DB_FILE)
         cursor = conn.cursor()
         cursor.execute(f"DELETE FROM {table_name}")
         conn.commit()
-        conn.close()
         logger.info(f"表 '{table_name}' 已清空")
         print(f"表 '{table_name}' 已成功清空")
     except Exception as e:
@@ -88,7 +140,7 @@ def clear_table(table_name):
 def delete_record(table_name, record_id):
     """删除指定表的指定记录"""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection(DB_FILE)
         cursor = conn.cursor()
         
         # 先检查记录是否存在
@@ -100,7 +152,6 @@ def delete_record(table_name, record_id):
         # 删除记录
         cursor.execute(f"DELETE FROM {table_name} WHERE id = ?", (record_id,))
         conn.commit()
-        conn.close()
         
         logger.info(f"已从表 '{table_name}' 删除 ID 为 {record_id} 的记录")
         print(f"已成功删除记录 (ID: {record_id})")
@@ -110,34 +161,93 @@ def delete_record(table_name, record_id):
         logger.error(f"删除记录失败: {str(e)}")
         return False
 
-def search_records(table_name, search_column, search_value, limit=20):
-    """查询指定表的记录"""
+def search_records(table_name, search_column, search_value, page_size=20):
+    """
+    查询指定表的记录：精确匹配，值以 * 结尾时为前缀匹配
+    查询会全表扫描时（列上没有索引）先显示查询计划，确认后再执行
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        conn = get_connection(DB_FILE)
+        columns, _ = primary_key(conn, table_name)
+        if search_column not in columns:
+            print(f"错误: 表 '{table_name}' 没有列 '{search_column}'")
+            return
         
-        # 获取表结构
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [col[1] for col in cursor.fetchall()]
+        where, params = search_condition(search_column, search_value)
+        pager = TablePager(conn, table_name, page_size, where=where, params=params)
+        details, full_scan = pager.plan()
+        if full_scan:
+            print(f"警告：列 '{search_column}' 没有可用的索引，查询将扫描整个表")
+            print("查询计划:")
+            for detail in details:
+                print(f"  {detail}")
+            indexed = indexed_columns(conn, table_name)
+            if indexed:
+                print(f"有索引的列: {', '.join(indexed)}")
+            confirm = input("确认继续？(y/N): ")
+            if confirm.lower() != 'y':
+                print("操作已取消")
+                return
         
-        # 构建查询语句
-        query = f"SELECT * FROM {table_name} WHERE {search_column} LIKE ? LIMIT {limit}"
-        cursor.execute(query, (f"%{search_value}%",))
-        rows = cursor.fetchall()
+        browse_pages(pager, f"表 '{table_name}' 中 {search_column} 为 '{search_value}' 的记录:")
         
-        conn.close()
+    except Exception as e:
+        logger.error(f"查询记录失败: {str(e)}")
+
+def parse_time_arg(text):
+    """
+    把时间参数转换为时间戳，支持时间戳或本地时间 YYYY-MM-DD [HH:MM[:SS]]
+    :return: 时间戳，空字符串返回 None
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            dt = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return pytz.timezone(TIMEZONE).localize(dt).timestamp()
+    raise ValueError(f"无法识别的时间: {text}")
+
+def export_table(table_name, fmt='csv', since=None, until=None, compress='auto', output=None):
+    """
+    流式导出表数据为 CSV / NDJSON，按主键分页读取，边读边写，定期显示进度
+    :param since: 时间范围起点（含）
+    :param until: 时间范围终点（不含）
+    :return: 成功返回 True
+    """
+    try:
+        conn = get_connection(DB_FILE)
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (table_name,)
+        ).fetchone()
+        if not exists:
+            print(f"错误: 表 '{table_name}' 不存在")
+            return False
+        start, end = parse_time_arg(since), parse_time_arg(until)
+        method = choose_compression(compress)
+        if not output:
+            os.makedirs(DB_EXPORT_DIR, exist_ok=True)
+            output = os.path.join(DB_EXPORT_DIR, export_filename(table_name, fmt, method))
         
-        # 显示结果
-        print(f"\n表 '{table_name}' 的查询结果 (共 {len(rows)} 条记录):")
-        print("-" * 80)
-        print(" | ".join(columns))
-        print("-" * 80)
-        for row in rows:
-            print(" | ".join(str(item) for item in row))
-        print("-" * 80)
+        def show_progress(rows, seconds):
+            print(f"\r已导出 {rows} 行，{rows / seconds:.0f} 行/s", end='', flush=True)
         
+        stats = stream_export(conn, table_name, output, fmt=fmt, compress=method,
+                              start=start, end=end, progress=show_progress, tz_name=TIMEZONE)
+        print(f"\r导出文件: {stats['file']}")
+        print(f"共 {stats['rows']} 行，{stats['bytes'] / 1024 / 1024:.1f}MB，"
+              f"耗时 {stats['seconds']} 秒，{stats['rows_per_sec']} 行/s")
+        return True
     except Exception as e:
-        logger.error(f"查询记录失败: {str(e)}")
+        print()
+        logger.error(f"导出表数据失败: {str(e)}")
+        return False
 
 def manage_database():
     """数据库管理功能"""
@@ -175,20 +285,25 @@ def table_operations(table_name):
     """对指定表进行操作"""
     while True:
         print(f"\n=== 操作表: {table_name} ===")
-        print("1. 查看表数据")
+        print("1. 分页浏览表数据")
         print("2. 清空表")
         print("3. 删除指定记录")
         print("4. 查询记录")
+        print("5. 导出表数据")
         print("0. 返回上一级")
         print("=" * 30)
         
         try:
-            choice = input("请选择操作 (0-4): ").strip()
+            choice = input("请选择操作 (0-5): ").strip()
             
             if choice == '1':
                 try:
-                    limit = int(input("显示多少条记录? (默认10): ") or "10")
-                    show_table_data(table_name, limit)
+                    page_size = int(input("每页显示多少条记录? (默认10): ") or "10")
+                    order = 'key'
+                    if table_name in TIME_COLUMNS:
+                        if input("按时间排序并可跳转到指定时间？(y/N): ").strip().lower() == 'y':
+                            order = 'time'
+                    show_table_data(table_name, page_size, order)
                 except ValueError:
                     print("请输入有效的数字")
                     
@@ -211,11 +326,13 @@ def table_operations(table_name):
                     
             elif choice == '4':
                 try:
+                    indexed = indexed_columns(get_connection(DB_FILE), table_name)
+                    print(f"有索引的列（查询快）: {', '.join(indexed) or '无'}")
                     search_column = input("请输入要查询的列名: ").strip()
-                    search_value = input("请输入要查询的值: ").strip()
+                    search_value = input("请输入要查询的值（精确匹配，以 * 结尾为前缀匹配）: ").strip()
                     if search_column and search_value:
-                        limit = int(input("最多显示多少条记录? (默认20): ") or "20")
-                        search_records(table_name, search_column, search_value, limit)
+                        page_size = int(input("每页显示多少条记录? (默认20): ") or "20")
+                        search_records(table_name, search_column, search_value, page_size)
                     else:
                         print("列名和查询值不能为空")
                 except ValueError:
@@ -223,6 +340,15 @@ def table_operations(table_name):
                 except Exception as e:
                     print(f"查询记录时出错: {e}")
                     
+            elif choice == '5':
+                fmt = input(f"导出格式 {'/'.join(FORMATS)} (默认csv): ").strip() or 'csv'
+                if fmt not in FORMATS:
+                    print("无效的导出格式")
+                    continue
+                since = input("开始时间 YYYY-MM-DD [HH:MM] (留空不限): ").strip()
+                until = input("结束时间 YYYY-MM-DD [HH:MM] (留空不限): ").strip()
+                export_table(table_name, fmt, since, until)
+                    
             elif choice == '0':
                 return
                 
@@ -232,23 +358,132 @@ def table_operations(table_name):
         except ValueError:
             print("请输入有效的数字")
 
-def backup_database():
+def backup_database(compress='auto', keep=DB_BACKUP_KEEP, max_age_days=DB_BACKUP_DAYS):
     """
-    备份数据库文件到指定目录
+    在线备份数据库到指定目录（SQLite 备份接口，不影响正在运行的程序写入）
+    :return: 成功返回 True
     """
     try:
-        # 确保备份目录存在
-        os.makedirs(DB_BACKUP_DIR, exist_ok=True)
-        
-        # 构建带时间戳的备份文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = os.path.join(DB_BACKUP_DIR, f"sensor_data_backup_{timestamp}.db")
-        
-        # 执行文件复制
-        shutil.copy2(DB_FILE, backup_file)
-        logger.info(f"数据库备份成功: {backup_file}")
+        stats = online_backup(DB_FILE, DB_BACKUP_DIR, compress=compress,
+                              keep=keep, max_age_days=max_age_days)
+        print(f"备份文件: {stats['file']}")
+        print(f"复制 {stats['pages']} 页 ({stats['bytes'] / 1024 / 1024:.1f}MB)，"
+              f"{stats['mb_per_sec']} MB/s，{stats['pages_per_sec']} 页/s")
+        print(f"压缩方式 {stats['compression']}，压缩后 {stats['compressed_bytes'] / 1024 / 1024:.1f}MB，"
+              f"总耗时 {stats['seconds']} 秒，删除旧备份 {len(stats['removed'])} 个")
+        return True
     except Exception as e:
         logger.error(f"数据库备份失败: {str(e)}")
+        return False
+
+def rebuild_access_rollups():
+    """
+    根据访问记录重建按小时/按天的访问汇总表（首次升级或数据修复时使用）
+    """
+    try:
+        conn = get_connection(DB_FILE)
+        begin = time.time()
+        total = rebuild_rollups(conn)
+        logger.info(f"访问统计汇总表重建完成: {total} 条记录，耗时 {time.time() - begin:.1f} 秒")
+    except Exception as e:
+        logger.error(f"重建访问统计汇总表失败: {str(e)}")
+
+def rebuild_sensor_tiers():
+    """
+    根据原始传感器数据重建15分钟/每小时汇总表（首次升级或数据修复时使用）
+    """
+    try:
+        conn = get_connection(DB_FILE)
+        begin = time.time()
+        total = rebuild_tiers(conn, TIMEZONE)
+        logger.info(f"传感器汇总表重建完成: {total} 条记录，耗时 {time.time() - begin:.1f} 秒")
+    except Exception as e:
+        logger.error(f"重建传感器汇总表失败: {str(e)}")
+
+def rebuild_access_fts():
+    """
+    重建访问记录全文索引（数据修复时使用，期间会占用写锁）
+    """
+    try:
+        conn = get_connection(DB_FILE)
+        begin = time.time()
+        total = rebuild_fts(conn)
+        logger.info(f"访问记录全文索引重建完成: {total} 条记录，耗时 {time.time() - begin:.1f} 秒")
+    except Exception as e:
+        logger.error(f"重建访问记录全文索引失败: {str(e)}")
+
+def print_access_records(records):
+    """显示访问记录检索结果"""
+    print("-" * 80)
+    for r in records:
+        print(f"{r['id']} | {r['time']} | {r['ip']} | {r['method']} {r['path']} | {r['status_code']}")
+        print(f"    {r['user_agent']}")
+    print("-" * 80)
+
+def search_access_records(term, field=None, limit=20, interactive=True):
+    """
+    按路径和 User-Agent 检索访问记录，有全文索引时使用索引，否则 LIKE 扫描
+    :return: 成功返回 True
+    """
+    try:
+        conn = get_connection(DB_FILE)
+        before_id = None
+        while True:
+            begin = time.perf_counter()
+            records, engine = search_access(conn, term, field, limit, before_id)
+            elapsed = (time.perf_counter() - begin) * 1000
+            print(f"\n检索 '{term}'：{len(records)} 条，{'全文索引' if engine == 'fts' else 'LIKE 扫描'}，"
+                  f"耗时 {elapsed:.1f} ms")
+            if records:
+                print_access_records(records)
+            if not interactive or len(records) < limit:
+                return True
+            if input("n 下一页 / q 返回: ").strip().lower() not in ('', 'n'):
+                return True
+            before_id = records[-1]['id']
+    except Exception as e:
+        logger.error(f"检索访问记录失败: {str(e)}")
+        return False
+
+def expire_old_records(policies=None):
+    """
+    按保留天数分批删除过期记录并回收空间（app.py 也会每小时自动执行）
+    :param policies: 表名 -> 保留天数，默认使用 DEFAULT_POLICIES
+    :return: 成功返回 True
+    """
+    try:
+        conn = get_connection(DB_FILE)
+        result = run_retention(conn, policies or DEFAULT_POLICIES, tz_name=TIMEZONE)
+        for table, count in result['deleted'].items():
+            print(f"{table}: 删除 {count} 条")
+        print(f"回收 {result['vacuumed_pages']} 页，数据库 {result['size_before'] / 1024 / 1024:.1f}MB -> "
+              f"{result['size_after'] / 1024 / 1024:.1f}MB（空闲 {result['free_after'] / 1024 / 1024:.1f}MB），"
+              f"耗时 {result['seconds']} 秒")
+        return True
+    except Exception as e:
+        logger.error(f"清理过期数据失败: {str(e)}")
+        return False
+
+def vacuum_database():
+    """
+    执行 VACUUM 压缩数据库文件，同时切换为增量回收模式（auto_vacuum = INCREMENTAL），
+    之后过期数据清理释放的空间会自动归还给文件系统
+    执行期间占用数据库，需要与数据库大小相当的临时空间
+    :return: 成功返回 True
+    """
+    try:
+        conn = get_connection(DB_FILE)
+        before, _ = db_size(conn)
+        begin = time.time()
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        after, _ = db_size(conn)
+        logger.info(f"数据库压缩完成: {before / 1024 / 1024:.1f}MB -> {after / 1024 / 1024:.1f}MB，"
+                    f"耗时 {time.time() - begin:.1f} 秒")
+        return True
+    except Exception as e:
+        logger.error(f"数据库压缩失败: {str(e)}")
+        return False
 
 def clear_log():
     """
@@ -269,14 +504,20 @@ def show_menu():
     print("1. 备份数据库")
     print("2. 清空日志")
     print("3. 数据库管理")
+    print("4. 重建访问统计汇总表")
+    print("5. 重建传感器汇总表")
+    print("6. 检索访问记录（路径 / User-Agent）")
+    print("7. 重建访问记录全文索引")
+    print("8. 清理过期数据")
+    print("9. 压缩数据库（启用增量回收）")
     print("0. 退出")
     print("=" * 30)
     
     try:
-        choice = input("请选择操作 (0-3): ").strip()
+        choice = input("请选择操作 (0-9): ").strip()
         return int(choice)
     except ValueError:
-        logger.warning("无效的输入，请输入数字 0-3")
+        logger.warning("无效的输入，请输入数字 0-9")
         return -1
 
 def main():
@@ -301,6 +542,45 @@ def main():
         elif choice == 3:
             manage_database()
             
+        elif choice == 4:
+            rebuild_access_rollups()
+            
+        elif choice == 5:
+            rebuild_sensor_tiers()
+            
+        elif choice == 6:
+            term = input("请输入检索词（路径或 User-Agent 的一部分）: ").strip()
+            field = input("检索字段 path / user_agent (留空两列都检索): ").strip() or None
+            if term:
+                search_access_records(term, field)
+            else:
+                print("检索词不能为空")
+            
+        elif choice == 7:
+            confirm = input("重建期间会占用数据库写锁，确认继续？(y/N): ")
+            if confirm.lower() == 'y':
+                rebuild_access_fts()
+            else:
+                print("操作已取消")
+            
+        elif choice == 8:
+            policies = {}
+            try:
+                for table, days in DEFAULT_POLICIES.items():
+                    value = input(f"{table} 保留天数 (默认{days}，0为永久保留): ").strip()
+                    policies[table] = int(value) if value else days
+            except ValueError:
+                print("请输入有效的数字")
+                continue
+            expire_old_records(policies)
+            
+        elif choice == 9:
+            confirm = input("压缩期间数据库会被占用，确认继续？(y/N): ")
+            if confirm.lower() == 'y':
+                vacuum_database()
+            else:
+                print("操作已取消")
+            
         elif choice == 0:
             logger.info("维护工具退出")
             print("再见！")
@@ -310,6 +590,63 @@ def main():
             if choice != -1:  # 避免重复打印无效输入的日志
                 logger.warning(f"无效选择: {choice}")
 
+def run_command(argv):
+    """
+    非交互命令，返回进程退出码
+    """
+    parser = argparse.ArgumentParser(description='鱼缸监控系统维护工具')
+    sub = parser.add_subparsers(dest='command')
+    
+    p = sub.add_parser('backup', help='在线备份数据库')
+    p.add_argument('--compress', default='auto', choices=['auto', 'zstd', 'gzip', 'none'],
+                   help='压缩方式，auto 为有 zstandard 时用 zstd，否则 gzip')
+    p.add_argument('--keep', type=int, default=DB_BACKUP_KEEP, help='保留最近的备份个数，0为不限')
+    p.add_argument('--days', type=int, default=DB_BACKUP_DAYS, help='备份保留天数，0为不限')
+    
+    p = sub.add_parser('export', help='流式导出表数据')
+    p.add_argument('table', help='表名')
+    p.add_argument('--format', default='csv', choices=FORMATS, help='导出格式')
+    p.add_argument('--since', help='开始时间（含），YYYY-MM-DD [HH:MM[:SS]] 或时间戳')
+    p.add_argument('--until', help='结束时间（不含），YYYY-MM-DD [HH:MM[:SS]] 或时间戳')
+    p.add_argument('--compress', default='auto', choices=['auto', 'zstd', 'gzip', 'none'],
+                   help='压缩方式，auto 为有 zstandard 时用 zstd，否则 gzip')
+    p.add_argument('--output', help=f'输出文件，默认保存到 {DB_EXPORT_DIR}')
+    
+    p = sub.add_parser('search', help='按路径和 User-Agent 检索访问记录')
+    p.add_argument('term', help='检索词（子串）')
+    p.add_argument('--field', choices=['path', 'user_agent'], help='只检索指定字段')
+    p.add_argument('--limit', type=int, default=50, help='最多显示多少条')
+    
+    p = sub.add_parser('retention', help='清理过期数据并回收空间')
+    p.add_argument('--access-days', type=int, default=DEFAULT_POLICIES['access_records'],
+                   help='访问记录保留天数，0为永久保留')
+    p.add_argument('--signin-days', type=int, default=DEFAULT_POLICIES['signin_records'],
+                   help='签到记录保留天数，0为永久保留')
+    p.add_argument('--feeding-days', type=int, default=DEFAULT_POLICIES['feeding_logs'],
+                   help='执行记录保留天数，0为永久保留')
+    
+    sub.add_parser('vacuum', help='压缩数据库并启用增量回收')
+    
+    args = parser.parse_args(argv)
+    if args.command == 'backup':
+        return 0 if backup_database(args.compress, args.keep, args.days) else 1
+    if args.command == 'export':
+        ok = export_table(args.table, args.format, args.since, args.until, args.compress, args.output)
+        return 0 if ok else 1
+    if args.command == 'retention':
+        ok = expire_old_records({
+            'access_records': args.access_days,
+            'signin_records': args.signin_days,
+            'feeding_logs': args.feeding_days
+        })
+        return 0 if ok else 1
+    if args.command == 'vacuum':
+        return 0 if vacuum_database() else 1
+    if args.command == 'search':
+        return 0 if search_access_records(args.term, args.field, args.limit, interactive=False) else 1
+    parser.print_help()
+    return 2
+
 if __name__ == "__main__":
     # 检查必要目录权限
     if not os.access("/var/log", os.W_OK):
@@ -318,5 +655,9 @@ if __name__ == "__main__":
     if not os.access("/var/lib/fishtank", os.W_OK):
         print("错误：没有写入数据目录的权限，请以sudo运行")
         sys.exit(1)
+    
+    # 带参数时非交互执行（用于 cron）
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
         
     main()
\ No newline at end of file